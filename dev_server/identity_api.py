@@ -0,0 +1,37 @@
+import uuid
+
+import bottle
+
+app = bottle.Bottle()
+identities = {}
+
+
+@app.post('/')
+def create():
+    identity_id = str(uuid.uuid4())
+    identities[identity_id] = {
+        '@context': '<URL to identity context>',
+        '@type': 'Identity',
+        '@id': identity_id,
+        'name': 'code-examples-validator',
+    }
+    return identities[identity_id]
+
+
+@app.get('/')
+def list_identities():
+    return {'count': len(identities)}
+
+
+@app.get('/<identity>')
+def get(identity):
+    if identity not in identities:
+        bottle.abort(404, f'Identity {identity} not found')
+    return identities[identity]
+
+
+@app.delete('/<identity>')
+def delete(identity):
+    if identities.pop(identity, None) is None:
+        bottle.abort(404, f'Identity {identity} not found')
+    return {}
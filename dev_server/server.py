@@ -1,9 +1,12 @@
 import json
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIServer
 
 import bottle
 
 from dev_server.product_api import app as products_app
 from dev_server.context_api import app as contexts_app
+from dev_server.identity_api import app as identities_app
 from dev_server.messages_api import app as messages_app
 
 app = bottle.Bottle()
@@ -11,6 +14,7 @@ mounts = {
     '/products/v1': products_app,
     '/contexts/v1': contexts_app,
     '/messages/v1': messages_app,
+    '/identities/v1': identities_app,
 }
 for api_prefix, new_app in mounts.items():
     app.mount(api_prefix, new_app)
@@ -32,12 +36,18 @@ for application in mounts.values():
 app.default_error_handler = custom_error_handler
 
 
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    """Serve requests in threads, samples may run concurrently in load mode"""
+    daemon_threads = True
+
+
 def main(reload=False):
     app.run(
         host='localhost',
         port='8888',
         debug=True,
         reloader=reload,
+        server_class=ThreadingWSGIServer,
     )
 
 
@@ -1,10 +1,16 @@
+import os
+import signal
 import subprocess
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, field, fields
 from enum import Enum
 from pathlib import Path
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Optional, Type, TypeVar, cast
 
 from samples_validator.conf import conf
+from samples_validator.profiling import CHILD_WAITS
+
+T = TypeVar('T')
 
 
 class Language(Enum):
@@ -20,15 +26,48 @@ class HttpMethod(Enum):
     delete = 'DELETE'
 
 
+class Phase(Enum):
+    prerequisites = 'prerequisites'
+    prepare = 'prepare'
+    execute = 'execute'
+    parse = 'parse'
+    cleanup = 'cleanup'
+
+
+def add_slots(cls: Type[T]) -> Type[T]:
+    """
+    Recreate a dataclass with `__slots__` instead of the instance `__dict__`.
+    Records are created for every sample on every run, so they should be
+    small and fast to access
+    """
+    field_names = tuple(item.name for item in fields(cls))  # type: ignore
+    cls_dict = dict(cls.__dict__)
+    cls_dict['__slots__'] = field_names
+    for name in field_names:
+        # defaults are already captured by the generated __init__
+        cls_dict.pop(name, None)
+    cls_dict.pop('__dict__', None)
+    cls_dict.pop('__weakref__', None)
+    slotted_cls = cast(Type[T], type(cls.__name__, cls.__bases__, cls_dict))
+    slotted_cls.__qualname__ = cls.__qualname__
+    return slotted_cls
+
+
+@add_slots
 @dataclass
 class CodeSample(object):
     path: Path
     name: str
     http_method: HttpMethod
+    # derived from the path once, it's used everywhere
+    lang: Language = field(init=False, repr=False, compare=False)
 
-    @property
-    def lang(self) -> Language:
-        filename = str(self.path)
+    def __post_init__(self):
+        self.lang = self._detect_lang(self.path)
+
+    @staticmethod
+    def _detect_lang(path: Path) -> Language:
+        filename = str(path)
         if filename.endswith('.js'):
             return Language.js
         elif filename.endswith('.py'):
@@ -38,6 +77,7 @@ class CodeSample(object):
         raise ValueError(f'Unknown language provided: {filename}')
 
 
+@add_slots
 @dataclass
 class SystemCmdResult:
     exit_code: int
@@ -45,6 +85,35 @@ class SystemCmdResult:
     stderr: str
 
 
+@add_slots
+@dataclass
+class HttpTimings:
+    """
+    Seconds spent in the phases of HTTP requests made by a sample, summed
+    up if there were several requests. Phases follow each other, the ones a
+    reused connection skips are zero
+    """
+    dns: float = 0.0
+    connect: float = 0.0
+    tls: float = 0.0
+    # from sending the request until the first byte of the response
+    ttfb: float = 0.0
+    # the rest of the request: reading the body, mostly
+    transfer: float = 0.0
+    total: float = 0.0
+    requests: int = 1
+
+    def __add__(self, other: 'HttpTimings') -> 'HttpTimings':
+        return HttpTimings(*(
+            getattr(self, name) + getattr(other, name)
+            for name in HTTP_PHASES + ('total', 'requests')
+        ))
+
+
+HTTP_PHASES = ('dns', 'connect', 'tls', 'ttfb', 'transfer')
+
+
+@add_slots
 @dataclass
 class ApiTestResult(object):
     sample: CodeSample
@@ -56,9 +125,29 @@ class ApiTestResult(object):
     reason: Any = None  # add typing
     source_code: Optional[str] = None
     duration: float = 0.0
+    timeout: Optional[float] = None
+    # seconds spent in every phase of the sample run
+    phases: Dict[Phase, float] = field(default_factory=dict)
+    # None unless `http_timings` is enabled
+    http: Optional[HttpTimings] = None
+    # failed POST sample up the path, the sample wasn't run because of it
+    blocked_by: Optional[CodeSample] = None
+
+    @property
+    def skipped(self):
+        return self.blocked_by is not None
+
+    @property
+    def unfinished(self):
+        """The sample didn't fit into the time budget of the session"""
+        from samples_validator import errors
+
+        return self.reason is errors.DeadlineExceeded
 
     @property
     def ignored(self):
+        if self.skipped or self.unfinished:
+            return False
         if not self.passed and self.sample.name in conf.ignore_failures:
             ignored_methods = conf.ignore_failures[self.sample.name]
             return self.sample.http_method.value in ignored_methods
@@ -66,23 +155,64 @@ class ApiTestResult(object):
 
     @property
     def failed(self):
+        if self.skipped:
+            # the failure is already counted for the blocking sample
+            return conf.fail_on_skipped
         return not self.passed and not self.ignored
 
+    def compact(self) -> 'ApiTestResult':
+        """
+        Drop the details which are needed only to explain a failure.
+        Passed result keeps the summary, and the response body only if it's
+        a POST one, because children take substitutions from it
+        """
+        if self.passed and not conf.debug:
+            self.source_code = None
+            self.cmd_result = None
+            if self.sample.http_method is not HttpMethod.post:
+                self.json_body = None
+        return self
+
 
 def run_shell_command(
         args: List[str],
-        timeout: int = None,
-        cwd: Path = None) -> SystemCmdResult:
+        timeout: Optional[float] = None,
+        cwd: Optional[Path] = None,
+        input: Optional[str] = None,
+        env: Optional[Dict[str, str]] = None) -> SystemCmdResult:
+    """
+    :param env: Variables added to the environment of the command
+    """
     from samples_validator import errors
 
+    # spawning the process is a part of waiting for it
+    start_time = time.time()
     proc = subprocess.Popen(
-        args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd,
+        args,
+        stdin=subprocess.PIPE if input is not None else None,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=cwd,
+        env={**os.environ, **env} if env else None,
+        # processes the sample starts are killed along with it
+        start_new_session=True,
     )
     timeout = timeout or conf.sample_timeout
     try:
-        stdout, stderr = proc.communicate(timeout=timeout)
+        stdout, stderr = proc.communicate(
+            input=input.encode('utf8') if input is not None else None,
+            timeout=timeout,
+        )
     except subprocess.TimeoutExpired:
+        # the sample mustn't keep running after its result is known
+        _kill_process_group(proc)
         raise errors.ExecutionTimeout
+    except BaseException:
+        # e.g. Ctrl-C, which doesn't reach the own session of the sample
+        _kill_process_group(proc)
+        raise
+    finally:
+        CHILD_WAITS.add(Path(args[0]).name, time.time() - start_time)
     return SystemCmdResult(
         exit_code=proc.returncode,
         stdout=str(stdout, 'utf8'),
@@ -90,4 +220,12 @@ def run_shell_command(
     )
 
 
+def _kill_process_group(proc: subprocess.Popen):
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    proc.communicate()
+
+
 ALL_LANGUAGES = [Language.python, Language.js, Language.shell]
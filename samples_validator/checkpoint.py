@@ -0,0 +1,182 @@
+import hashlib
+import json
+import tempfile
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+
+from samples_validator.base import ApiTestResult, CodeSample, HttpMethod
+from samples_validator.conf import conf
+from samples_validator.sharding import (
+    result_from_dict, result_to_dict, split_units,
+)
+from samples_validator.stats import sample_key
+from samples_validator.utils import CodeSamplesTree
+
+if TYPE_CHECKING:
+    from samples_validator.prerequisites.base import Resource  # noqa
+
+# class name, collection url and id of a prerequisite resource
+ResourceKey = Tuple[str, str, Optional[str]]
+
+
+def checkpoint_path() -> Path:
+    return Path(tempfile.gettempdir(), conf.checkpoint_file)
+
+
+def fingerprint(samples: List[CodeSample]) -> str:
+    keys = sorted(sample_key(sample) for sample in samples)
+    return hashlib.sha1(json.dumps(keys).encode()).hexdigest()[:12]
+
+
+class Checkpoint:
+    """
+    Journal of a session, a JSON object per line appended as samples finish:
+    results with the response bodies their children need, and resources
+    created and removed for prerequisites. The journal is removed when all
+    the samples have results
+
+    When a session is resumed, results of the top level subtrees (see
+    `split_units`) finished by the interrupted session are restored, the
+    other subtrees are run from their beginning. Resources which weren't
+    removed are adopted by the new session and removed on its cleanup.
+    What POST samples of the unfinished subtrees created is removed by their
+    DELETE samples before the subtrees are run again
+    """
+
+    def __init__(
+            self,
+            path: Path,
+            samples: List[CodeSample],
+            resume: bool = False):
+        """
+        :param resume: Continue the session from the journal, if it's there
+        :raise ValueError: The journal is of different samples
+        """
+        self.path = path
+        self.fingerprint = fingerprint(samples)
+        self.restored: Dict[str, ApiTestResult] = {}
+        self.leftover_resources: List[ResourceKey] = []
+        # passed POST results of the unfinished subtrees, and DELETE samples
+        # which didn't run after them
+        self.unremoved: List[ApiTestResult] = []
+        self.pending_removals: List[CodeSample] = []
+        self._entries: List[dict] = []
+        self._lock = threading.Lock()
+        if resume and path.exists():
+            self._load(samples)
+
+    def begin(self):
+        """Start the journal with what is left from the interrupted one"""
+        with self._lock:
+            self.path.write_text(''.join(
+                f'{json.dumps(entry)}\n'
+                for entry in [
+                    {'type': 'session', 'fingerprint': self.fingerprint},
+                    *self._entries,
+                ]
+            ))
+
+    def record_result(self, test_result: ApiTestResult):
+        self._append({
+            'type': 'result',
+            'result': result_to_dict(test_result),
+            # compacted, only bodies of POST samples are kept
+            'json_body': test_result.json_body,
+        })
+
+    def record_resource(self, resource: 'Resource', deleted: bool):
+        self._append({
+            'type': 'resource',
+            'name': resource.__class__.__name__,
+            'url': resource.base_url,
+            'id': resource.id_field,
+            'deleted': deleted,
+        })
+
+    def finish(self):
+        with self._lock:
+            if self.path.exists():
+                self.path.unlink()
+
+    def _append(self, entry: dict):
+        line = f'{json.dumps(entry)}\n'
+        with self._lock:
+            # reopened every time, so the journal survives a killed process
+            with self.path.open('a') as journal:
+                journal.write(line)
+
+    def _load(self, samples: List[CodeSample]):
+        results, resources = self._read_journal()
+        for unit in split_units(samples):
+            keys = [sample_key(sample) for sample in unit.samples]
+            if not all(key in results for key in keys):
+                self._find_unremoved(unit.samples, results)
+                continue
+            for sample, key in zip(unit.samples, keys):
+                test_result, entry = results[key]
+                # samples of the session are looked up by identity
+                test_result.sample = sample
+                self.restored[key] = test_result
+                self._entries.append(entry)
+        for resource_key, entry in resources.items():
+            if not entry['deleted']:
+                self.leftover_resources.append(resource_key)
+                self._entries.append(entry)
+
+    def _find_unremoved(
+            self,
+            samples: List[CodeSample],
+            results: Dict[str, Tuple[ApiTestResult, dict]]):
+        tree = CodeSamplesTree()
+        for sample in samples:
+            tree.put(sample)
+        removers: Set[int] = set()
+        for sample in samples:
+            test_result, _ = results.get(sample_key(sample), (None, None))
+            if (test_result is None or not test_result.passed
+                    or sample.http_method != HttpMethod.post):
+                continue
+            test_result.sample = sample
+            self.unremoved.append(test_result)
+            removers.update(
+                id(remover) for remover in tree.get_removers(sample)
+                if sample_key(remover) not in results
+            )
+        # children are removed before their parents, as in the session
+        self.pending_removals.extend(
+            sample for sample in samples if id(sample) in removers
+        )
+
+    def _read_journal(self) -> Tuple[
+            Dict[str, Tuple[ApiTestResult, dict]], Dict[ResourceKey, dict]]:
+        """
+        :return: The last result of every sample, by `sample_key`, and the
+            last state of every resource
+        """
+        results: Dict[str, Tuple[ApiTestResult, dict]] = {}
+        resources: Dict[ResourceKey, dict] = {}
+        with self.path.open() as journal:
+            for line in journal:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # the last line is cut if the process was killed
+                    continue
+                if entry['type'] == 'session':
+                    if entry['fingerprint'] != self.fingerprint:
+                        raise ValueError(
+                            f'Checkpoint {self.path.as_posix()} is of other '
+                            f'samples, remove it to start anew',
+                        )
+                elif entry['type'] == 'result':
+                    test_result = result_from_dict(entry['result'])
+                    test_result.json_body = entry['json_body']
+                    results[sample_key(test_result.sample)] = (
+                        test_result, entry,
+                    )
+                elif entry['type'] == 'resource':
+                    resources[(entry['name'], entry['url'], entry['id'])] = (
+                        entry
+                    )
+        return results, resources
@@ -1,14 +1,55 @@
+import os
 import sys
+import tempfile
+import time
 from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
 
 import click
-from loguru import logger
 
-from samples_validator.base import Language
-from samples_validator.conf import conf
-from samples_validator.loader import load_code_samples
-from samples_validator.runner.base import APP_LOG_HANDLER
-from samples_validator.session import TestSession
+if TYPE_CHECKING:
+    from samples_validator.base import ApiTestResult, CodeSample  # noqa
+    from samples_validator.deadline import Deadline  # noqa
+    from samples_validator.load import LoadSession  # noqa
+    from samples_validator.proxy import RecordingProxy  # noqa
+    from samples_validator.readonly import Capture  # noqa
+    from samples_validator.selection import Selector  # noqa
+    from samples_validator.session import TestSession  # noqa
+    from samples_validator.sharding import Shard, ShardPlan  # noqa
+    from samples_validator.targets import TargetSession  # noqa
+
+# Modules of the application, as well as heavy dependencies, are imported
+# inside of commands: `--help` or a typo in options mustn't wait for them
+
+
+def default_socket_path() -> str:
+    return os.path.join(tempfile.gettempdir(), 'samples-validator.sock')
+
+
+def parse_shard(
+        ctx: click.Context,
+        param: click.Parameter,
+        value: Optional[str]) -> Optional['Shard']:
+    from samples_validator.sharding import Shard  # noqa: F811
+
+    if value is None:
+        return None
+    try:
+        return Shard.parse(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+
+def parse_selectors(
+        ctx: click.Context,
+        param: click.Parameter,
+        value: Tuple[str, ...]) -> List['Selector']:
+    from samples_validator.selection import Selector  # noqa: F811
+
+    try:
+        return [Selector(pattern) for pattern in value]
+    except ValueError as e:
+        raise click.BadParameter(str(e))
 
 
 @click.command()
@@ -31,25 +72,620 @@ from samples_validator.session import TestSession
 @click.option(
     '-k', '--keyword', help='Sample name filter',
 )
-def run_tests(samples_dir: str, config: str, lang: str, keyword: str):
+@click.option(
+    '--select', 'selectors', multiple=True, callback=parse_selectors,
+    metavar='PATTERN',
+    help='Run samples matching a glob, or a regular expression after "re:", '
+         'optionally preceded by an HTTP method, e.g. "GET */{id}". POST '
+         'samples the selected ones need, and DELETE samples of them, are '
+         'run as well. Can be repeated',
+)
+@click.option(
+    '--explain-selection', is_flag=True,
+    help='Show why samples which are not selected are run',
+)
+@click.option(
+    '--baseline',
+    type=click.Path(file_okay=True, dir_okay=False),
+    help='Save latencies of the run as a baseline to this file',
+)
+@click.option(
+    '--compare',
+    type=click.Path(exists=True, file_okay=True, dir_okay=False),
+    help='Compare latencies of the run with a baseline from this file',
+)
+@click.option(
+    '--repeat', type=click.IntRange(min=1),
+    help='Load mode: run the selected samples this many times',
+)
+@click.option(
+    '--concurrency', type=click.IntRange(min=1), default=1,
+    help='Load mode: number of iterations running simultaneously. '
+         'Iterations of samples creating the same resources run one after '
+         'another',
+)
+@click.option(
+    '--target', multiple=True,
+    help='Run against this target from the `targets` configuration section. '
+         'Can be repeated, targets are validated simultaneously',
+)
+@click.option(
+    '--plan', is_flag=True,
+    help='Print dependencies between the samples, critical path and '
+         'maximum parallelism instead of running them',
+)
+@click.option(
+    '--profile', type=click.Path(file_okay=False, dir_okay=True),
+    help='Profile the validator itself and write the reports to this '
+         'directory',
+)
+@click.option(
+    '--profile-sampling', type=click.IntRange(min=1),
+    help='With --profile, also sample stacks of all threads every this '
+         'many milliseconds',
+)
+@click.option(
+    '--record', type=click.Path(file_okay=True, dir_okay=False),
+    help='Send requests of the samples through a local proxy and save them '
+         'with the responses of the API to this HAR file',
+)
+@click.option(
+    '--replay',
+    type=click.Path(exists=True, file_okay=True, dir_okay=False),
+    help='Answer requests of the samples with the responses recorded to '
+         'this HAR file, the API is not used',
+)
+@click.option(
+    '--shard', callback=parse_shard, metavar='I/N',
+    help='Run only the I-th of N parts of the samples, e.g. on one of N CI '
+         'nodes. Subtrees of the samples are not split, parts are balanced '
+         'by latencies from --compare baseline or by number of samples',
+)
+@click.option(
+    '--report', type=click.Path(file_okay=True, dir_okay=False),
+    help='Save results of the run to this JSON file, reports of shards are '
+         'combined by merge-reports',
+)
+@click.option(
+    '--resume', is_flag=True,
+    help='Continue the interrupted run: results of the resources it has '
+         'finished are taken from its checkpoint, prerequisites it left are '
+         'removed',
+)
+@click.option(
+    '--capture', type=click.Path(file_okay=True, dir_okay=False),
+    help='Save substitutions of GET samples to this file for --read-only '
+         'runs. DELETE samples are not run and prerequisites are not '
+         'removed, the resources are left in place until the next capture '
+         'to this file',
+)
+@click.option(
+    '--read-only',
+    type=click.Path(exists=True, file_okay=True, dir_okay=False),
+    help='Run only GET samples, with the substitutions saved by --capture '
+         'to this file. Nothing is created or removed',
+)
+@click.option(
+    '--deadline', type=click.FloatRange(min=1), metavar='SECONDS',
+    help='Time budget of the run. Samples which do not fit into it are not '
+         'run and are reported as unfinished, the last deadline_margin '
+         'seconds are left to remove the created resources',
+)
+@click.option(
+    '--preflight', is_flag=True,
+    help='Check syntax of all the samples before running any of them, the '
+         'run is stopped at the first broken sample',
+)
+@click.option(
+    '--metrics', type=click.Path(file_okay=True, dir_okay=False),
+    help='Write metrics of the run to this OpenMetrics text file, e.g. for '
+         'the textfile collector of Prometheus node_exporter',
+)
+@click.option(
+    '--metrics-port', type=int,
+    help='Serve metrics of --daemon runs to Prometheus on this local port',
+)
+@click.option(
+    '--daemon', is_flag=True,
+    help='Keep running: validate changed samples again as soon as they '
+         'change, and take run requests of samples-validator-client',
+)
+@click.option(
+    '--socket', 'socket_path', type=click.Path(dir_okay=False),
+    default=default_socket_path,
+    help='Unix socket of --daemon',
+)
+def run_tests(samples_dir: str, config: str, lang: str, keyword: str,
+              selectors: List['Selector'], explain_selection: bool,
+              baseline: str, compare: str, repeat: int, concurrency: int,
+              target: Tuple[str, ...], plan: bool, profile: str,
+              profile_sampling: int, record: str, replay: str,
+              shard: Optional['Shard'], report: str, resume: bool,
+              capture: str, read_only: str, deadline: Optional[float],
+              preflight: bool, metrics: str, metrics_port: Optional[int],
+              daemon: bool, socket_path: str):
+    from samples_validator.base import Language
+    from samples_validator.conf import conf
+    from samples_validator.loader import load_code_samples
+    from samples_validator.planner import build_plan
+    from samples_validator.progress import CONSOLE
+    from samples_validator.reporter import Reporter
+    from samples_validator.selection import select_samples
+    from samples_validator.sharding import plan_shards
+    from samples_validator.stats import LatencyStats, latency_stats_path
+
     setup_logging()
+    if metrics_port and not daemon:
+        raise click.UsageError('--metrics-port is for --daemon only')
     if config:
         conf.reload(Path(config))
-    conf.validate_environment()
+    # the budget covers loading and checking of the samples as well
+    time_budget = make_deadline(deadline, daemon or bool(target or repeat))
     languages = [Language[lang]] if lang else None
-    samples = load_code_samples(Path(samples_dir), languages, keyword or '')
-    test_session = TestSession(samples)
-    failed_tests_count = test_session.run()
+    selection = select_samples(
+        load_code_samples(Path(samples_dir), languages), keyword or '',
+        selectors,
+    )
+    Reporter().print_selection(selection, explain_selection)
+    samples = selection.samples
+    samples, id_capture, captured = select_capture(
+        samples, capture, read_only,
+    )
+    baseline_latencies = read_baseline(compare, repeat, bool(shard))
+    shard_plan = None
+    if shard:
+        shard_plan = plan_shards(samples, shard, baseline_latencies)
+        samples = shard_plan.samples
+        Reporter().print_shard_plan(shard_plan)
+    if plan:
+        latency_stats = LatencyStats.load(latency_stats_path())
+        Reporter().print_execution_plan(build_plan(samples, latency_stats))
+        CONSOLE.stop()
+        sys.exit(0)
+
+    conf.validate_environment()
+    if daemon:
+        from samples_validator.daemon import ValidatorDaemon
+
+        ValidatorDaemon(
+            Path(samples_dir), Path(socket_path), languages, keyword or '',
+            [selector.pattern for selector in selectors],
+            metrics_path=Path(metrics) if metrics else None,
+            metrics_port=metrics_port,
+        ).serve_forever()
+        CONSOLE.stop()
+        sys.exit(0)
+    remove_capture(capture, selection.samples)
+    if preflight:
+        check_syntax(samples)
+    proxy = make_proxy(record, replay, target, repeat)
+    test_session = make_session(
+        samples, target, repeat, concurrency, bool(baseline or compare),
+        proxy, resume, id_capture, captured, time_budget,
+    )
+    start_time = time.time()
+    try:
+        failed_tests_count = run_session(
+            test_session, profile, profile_sampling,
+        )
+    finally:
+        if proxy:
+            proxy.stop()
+    if proxy:
+        Reporter().print_proxy_report(proxy)
+    save_capture(capture, id_capture, test_session)
+    failed_tests_count += finish_session(
+        test_session.test_results, baseline, baseline_latencies, report,
+        shard_plan, metrics, time.time() - start_time,
+    )
+    CONSOLE.stop()
     sys.exit(failed_tests_count)
 
 
+def finish_session(
+        test_results: List['ApiTestResult'],
+        baseline: str,
+        baseline_latencies: Optional[Dict[str, List[float]]],
+        report: str,
+        shard_plan: Optional['ShardPlan'],
+        metrics: str,
+        wall_time: float) -> int:
+    """
+    Save and report what the run has measured
+
+    :param wall_time: Duration of the run
+    :return: Number of latency regressions
+    """
+    from samples_validator.conf import conf
+    from samples_validator.metrics import METRICS
+    from samples_validator.regression import (
+        collect_latencies, find_regressions, save_baseline,
+        unjudged_endpoints,
+    )
+    from samples_validator.reporter import Reporter
+    from samples_validator.sharding import save_report
+    from samples_validator.throttle import THROTTLE
+
+    if conf.throttle:
+        Reporter().print_throttle_report(THROTTLE.metrics())
+    if baseline:
+        save_baseline(Path(baseline), test_results)
+    if report:
+        save_report(Path(report), test_results, shard_plan)
+    if metrics:
+        METRICS.add_session(test_results, wall_time)
+        METRICS.write(Path(metrics), THROTTLE.metrics())
+    if baseline_latencies is None:
+        return 0
+    latencies = collect_latencies(test_results)
+    regressions = find_regressions(baseline_latencies, latencies)
+    Reporter().print_regressions_report(
+        regressions, unjudged_endpoints(baseline_latencies, latencies),
+    )
+    return len(regressions)
+
+
+def read_baseline(
+        compare: str,
+        repeat: int,
+        sharded: bool) -> Optional[Dict[str, List[float]]]:
+    """
+    :param sharded: The baseline balances the shards as well, so a run
+        without enough observations to compare is only warned about
+    """
+    from samples_validator.conf import conf
+    from samples_validator.regression import load_baseline
+    from samples_validator.reporter import Reporter
+
+    if not compare:
+        return None
+    try:
+        baseline_latencies = load_baseline(Path(compare))
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--compare')
+    # a regular run observes every sample once, nothing would be judged
+    min_samples = conf.regression_min_samples
+    if (repeat or 1) < min_samples:
+        if not sharded:
+            raise click.UsageError(
+                f'--compare needs --repeat {min_samples} or more, latencies '
+                f'with fewer observations are not compared',
+            )
+        Reporter().show_not_comparable(min_samples)
+    return baseline_latencies
+
+
+@click.command()
+@click.argument(
+    'reports', nargs=-1, required=True,
+    type=click.Path(exists=True, file_okay=True, dir_okay=False),
+)
+@click.option(
+    '-c', '--config',
+    type=click.Path(exists=True, file_okay=True, dir_okay=False),
+    help='Path to configuration file',
+)
+def merge_reports(reports: Tuple[str, ...], config: str):
+    """Combine JSON reports of all shards (--shard) into one session"""
+    from samples_validator.conf import conf
+    from samples_validator.progress import CONSOLE
+    from samples_validator.reporter import Reporter
+    from samples_validator.sharding import load_report
+    from samples_validator.sharding import merge_reports as merge
+
+    setup_logging()
+    if config:
+        conf.reload(Path(config))
+    try:
+        test_results = merge([load_report(Path(path)) for path in reports])
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    Reporter().print_test_session_report(test_results)
+    CONSOLE.stop()
+    sys.exit(sum(1 for result in test_results if result.failed))
+
+
+@click.command()
+@click.option(
+    '--socket', 'socket_path',
+    type=click.Path(exists=True, dir_okay=False),
+    default=default_socket_path,
+    help='Unix socket of the validator started with --daemon',
+)
+@click.option(
+    '-l', '--lang',
+    type=click.Choice(['python', 'js', 'shell']),
+    help='Run samples only for that language. Run all of them by default',
+)
+@click.option(
+    '-k', '--keyword', help='Sample name filter',
+)
+@click.option(
+    '--select', 'selectors', multiple=True, metavar='PATTERN',
+    help='Sample name pattern, see --select of samples-validator',
+)
+@click.option(
+    '--status', is_flag=True, help='Show the state of the validator',
+)
+@click.option(
+    '--stop', is_flag=True, help='Stop the validator',
+)
+def run_client(socket_path: str, lang: str, keyword: str,
+               selectors: Tuple[str, ...], status: bool, stop: bool):
+    """
+    Run samples by the validator started with --daemon, its runners and
+    environments are ready already. Results are shown as samples finish
+    """
+    import json
+    import socket
+
+    command = 'stop' if stop else 'status' if status else 'run'
+    request = {
+        'command': command, 'lang': lang, 'keyword': keyword or '',
+        'select': list(selectors),
+    }
+    failed = 0
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall(json.dumps(request).encode() + b'\n')
+        for line in client.makefile('rb'):
+            message = json.loads(line)
+            event = message.pop('event')
+            if event == 'result':
+                result = message['result']
+                click.echo('{:>8} {} {} {} ({:.2f}s)'.format(
+                    message['status'], message['lang'],
+                    result['sample']['method'], result['sample']['name'],
+                    result['duration'],
+                ))
+            elif event == 'finished':
+                failed = message['failed']
+                click.echo(f"{message['total']} total, {failed} failed")
+            elif event == 'error':
+                raise click.ClickException(message['message'])
+            elif message:
+                click.echo(f'{event}: {json.dumps(message)}')
+            else:
+                click.echo(event)
+    sys.exit(failed)
+
+
+def check_syntax(samples: List['CodeSample']):
+    """Exit with the number of broken samples, if there are any"""
+    from samples_validator.preflight import run_preflight
+    from samples_validator.progress import CONSOLE
+    from samples_validator.reporter import Reporter
+
+    report = run_preflight(samples)
+    Reporter().print_preflight_report(report)
+    if not report.passed:
+        CONSOLE.stop()
+        sys.exit(len(report.failures))
+
+
+def run_session(
+        test_session: Union['TestSession', 'LoadSession', 'TargetSession'],
+        profile: str,
+        profile_sampling: int) -> int:
+    from samples_validator.profiling import Profiler
+    from samples_validator.reporter import Reporter
+
+    if not profile:
+        return test_session.run()
+    sampling_interval = profile_sampling / 1000 if profile_sampling else None
+    profiler = Profiler(Path(profile), sampling_interval)
+    profiler.start()
+    try:
+        failed_tests_count = test_session.run()
+    finally:
+        profile_summary = profiler.stop()
+    Reporter().print_profile_summary(profile_summary)
+    return failed_tests_count
+
+
+def make_proxy(
+        record: str,
+        replay: str,
+        target: Tuple[str, ...],
+        repeat: int) -> Optional['RecordingProxy']:
+    from samples_validator.proxy import RecordingProxy  # noqa: F811
+
+    if not (record or replay):
+        return None
+    if record and replay:
+        raise click.UsageError("--record can't be combined with --replay")
+    if target or repeat:
+        raise click.UsageError(
+            "--record and --replay can't be combined with --target and "
+            '--repeat',
+        )
+    proxy = RecordingProxy(Path(replay or record), replay=bool(replay))
+    proxy.start()
+    return proxy
+
+
+def make_session(
+        samples: List['CodeSample'],
+        target: Tuple[str, ...],
+        repeat: int,
+        concurrency: int,
+        with_baseline: bool,
+        proxy: Optional['RecordingProxy'] = None,
+        resume: bool = False,
+        capture: Optional['Capture'] = None,
+        captured: Optional[Dict[str, dict]] = None,
+        deadline: Optional['Deadline'] = None,
+) -> Union['TestSession', 'LoadSession', 'TargetSession']:
+    from samples_validator.checkpoint import Checkpoint, checkpoint_path
+    from samples_validator.conf import conf
+    from samples_validator.load import LoadSession  # noqa: F811
+    from samples_validator.prerequisites.base import ResourceRegistry
+    from samples_validator.proxy import proxy_substitutions
+    from samples_validator.reporter import Reporter
+    from samples_validator.session import (  # noqa: F811
+        TestSession, make_runners,
+    )
+    from samples_validator.stats import LatencyStats, latency_stats_path
+    from samples_validator.targets import TargetSession  # noqa: F811
+
+    if (resume or capture or captured is not None) and (
+            target or repeat or proxy):
+        raise click.UsageError(
+            "--resume, --capture and --read-only can't be combined with "
+            '--target, --repeat, --record and --replay',
+        )
+    if target:
+        if repeat or with_baseline:
+            raise click.UsageError(
+                "--target can't be combined with --repeat, --baseline "
+                'and --compare',
+            )
+        unknown_targets = set(target) - set(conf.targets)
+        if unknown_targets:
+            raise click.BadParameter(
+                f'Unknown targets: {", ".join(sorted(unknown_targets))}',
+                param_hint='--target',
+            )
+        return TargetSession(
+            samples, {name: conf.targets[name] for name in target},
+        )
+    elif repeat:
+        return LoadSession(samples, repeat, concurrency)
+    elif proxy:
+        return TestSession(
+            samples,
+            runners=make_runners(proxy_substitutions(proxy.url), proxy.url),
+            # replayed responses would distort the latencies of the API
+            latency_stats=(
+                LatencyStats.load(latency_stats_path('replay'))
+                if proxy.replay else None
+            ),
+            resource_registry=ResourceRegistry(proxy.url, conf.access_token),
+            deadline=deadline,
+        )
+    try:
+        checkpoint = Checkpoint(checkpoint_path(), samples, resume)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    if resume:
+        Reporter().show_resumed(
+            len(checkpoint.restored), len(checkpoint.leftover_resources),
+            len(checkpoint.pending_removals),
+        )
+    return TestSession(
+        samples, checkpoint=checkpoint, capture=capture, captured=captured,
+        deadline=deadline,
+    )
+
+
+def make_deadline(
+        deadline: Optional[float],
+        unbounded: bool) -> Optional['Deadline']:
+    """
+    :param unbounded: The run is a --daemon, --target or --repeat one,
+        these sessions don't keep a budget
+    """
+    from samples_validator.conf import conf
+    from samples_validator.deadline import Deadline  # noqa: F811
+
+    if not deadline:
+        return None
+    if unbounded:
+        raise click.UsageError(
+            "--deadline can't be combined with --daemon, --target and "
+            '--repeat',
+        )
+    if deadline <= conf.deadline_margin:
+        raise click.BadParameter(
+            f'The budget must be longer than deadline_margin '
+            f'({conf.deadline_margin:g}s)',
+            param_hint='--deadline',
+        )
+    return Deadline(deadline)
+
+
+def select_capture(
+        samples: List['CodeSample'],
+        capture: str,
+        read_only: str,
+) -> Tuple[List['CodeSample'], Optional['Capture'],
+           Optional[Dict[str, dict]]]:
+    """
+    :return: Samples to run, the capture to save after the run and
+        substitutions of a read-only run
+    """
+    from samples_validator.base import HttpMethod
+    from samples_validator.readonly import (  # noqa: F811
+        Capture, capture_samples, load_capture, read_only_samples,
+    )
+    from samples_validator.reporter import Reporter
+
+    if capture and read_only:
+        raise click.UsageError("--capture can't be combined with --read-only")
+    if capture:
+        removers = [
+            sample for sample in samples
+            if sample.http_method == HttpMethod.delete
+        ]
+        return capture_samples(samples), Capture(removers), None
+    if not read_only:
+        return samples, None, None
+    try:
+        captured = load_capture(Path(read_only))
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    selected, missing = read_only_samples(samples, captured)
+    Reporter().show_read_only(len(selected), missing)
+    return selected, None, captured
+
+
+def remove_capture(capture: str, samples: List['CodeSample']):
+    """Remove what the previous capture to the file has left"""
+    from samples_validator.prerequisites.base import ResourceRegistry
+    from samples_validator.readonly import load_created
+    from samples_validator.reporter import Reporter
+    from samples_validator.session import remove_created
+
+    if not capture or not Path(capture).exists():
+        return
+    try:
+        created, removers, resources = load_created(Path(capture), samples)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--capture')
+    Reporter().show_capture_removal(len(removers), len(resources))
+    for test_result in remove_created(created, removers):
+        Reporter().show_not_removed(test_result)
+    registry = ResourceRegistry()
+    for name, url, id_field in resources:
+        registry.adopt(name, url, id_field)
+    registry.cleanup()
+
+
+def save_capture(
+        capture: str,
+        id_capture: Optional['Capture'],
+        test_session: Union['TestSession', 'LoadSession', 'TargetSession']):
+    from samples_validator.session import TestSession  # noqa: F811
+
+    # --capture is refused for the other sessions
+    if id_capture is None or not isinstance(test_session, TestSession):
+        return
+    id_capture.save(
+        Path(capture), test_session.test_results, test_session.prerequisites,
+    )
+
+
 def setup_logging():
+    from loguru import logger
+
+    from samples_validator.progress import CONSOLE
+
     logger.remove()
     logger.level('regular', no=100)
     logger.level('red', no=101, color='<red>')
     logger.level('green', no=102, color='<green>')
     logger.level('yellow', no=103, color='<yellow>')
-    logger.add(APP_LOG_HANDLER, colorize=True, format='<level>{message}</>',
+    logger.add(CONSOLE.write, colorize=True, format='<level>{message}</>',
                level='DEBUG')
 
 
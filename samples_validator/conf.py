@@ -1,67 +1,16 @@
-import os
 from pathlib import Path
-from typing import Dict, List
-
-import yaml
-from pydantic import BaseModel
-
-
-class Config(BaseModel):
-    api_url: str
-    access_token: str
-    sample_timeout: int = 5
-    virtualenv_creation_timeout: int = 120
-    virtualenv_name: str = '.pot-svt-env'
-    js_project_dir_name: str = '.pot-node'
-    substitutions: Dict[str, str] = {}
-    resp_attr_replacements: Dict[str, List[dict]] = {}
-    always_create_environments: bool = False
-    debug: bool = False
-    before_sample: Dict[str, List[dict]] = {}
-    ignore_failures: Dict[str, List[str]] = {}
+from typing import Any, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from samples_validator.schema import Config  # noqa
+
+DEFAULT_CONFIG_PATH = Path(__file__).absolute().parent.parent / 'conf.yaml'
+
+
+def load_config(path: Path) -> 'Config':
+    import yaml
+    from samples_validator.schema import Config  # noqa: F811
 
-    def reload(self, path: Path):
-        new_conf = load_config(path)
-        for name, value in new_conf:
-            setattr(self, name, value)
-        self._replace_env_vars()
-
-    def __init__(self, **data):
-        super().__init__(**data)
-        self._replace_env_vars()
-
-    def _replace_env_vars(self, raise_error: bool = False):
-        if self.substitutions is None:
-            return
-        missing_variables = set()
-        for key, value in self.substitutions.items():
-            if value.startswith('$'):
-                var_name = value[1:]
-                real_value = os.environ.get(var_name)
-                if real_value is not None:
-                    self.substitutions[key] = real_value
-                else:
-                    missing_variables.add(var_name)
-        for key in self.fields:
-            attr = getattr(self, key)
-            if isinstance(attr, str) and attr.startswith('$'):
-                var_name = attr[1:]
-                real_value = os.environ.get(var_name)
-                if real_value is not None:
-                    setattr(self, key, real_value)
-                else:
-                    missing_variables.add(var_name)
-        if missing_variables and raise_error:
-            variables = ', '.join(missing_variables)
-            raise ValueError(
-                f'Failed to find variables in the environment: {variables}',
-            )
-
-    def validate_environment(self):
-        self._replace_env_vars(raise_error=True)
-
-
-def load_config(path: Path):
     conf_path = path.as_posix()
     try:
         with open(conf_path) as fd:
@@ -72,4 +21,47 @@ def load_config(path: Path):
     return Config(**conf_data)
 
 
-conf = load_config(Path(__file__).absolute().parent.parent / 'conf.yaml')
+class LazyConfig:
+    """
+    Proxy to the configuration which is loaded on the first attribute access.
+    Importing the package doesn't parse YAML or import pydantic, so the CLI
+    starts fast even when all it does is printing help
+    """
+
+    def __init__(self, path: Path):
+        object.__setattr__(self, '_path', path)
+        object.__setattr__(self, '_config', None)
+
+    @property
+    def loaded(self) -> bool:
+        return self._config is not None
+
+    def reload(self, path: Path):
+        if self._config is None:
+            object.__setattr__(self, '_path', path)
+        else:
+            self._config.reload(path)
+
+    def _get_config(self) -> 'Config':
+        config: Optional['Config'] = self._config
+        if config is None:
+            config = load_config(self._path)
+            object.__setattr__(self, '_config', config)
+        return config
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._get_config(), name)
+
+    def __setattr__(self, name: str, value: Any):
+        setattr(self._get_config(), name, value)
+
+
+def __getattr__(name: str) -> Any:
+    # `Config` is still importable from here, but pydantic is loaded lazily
+    if name == 'Config':
+        from samples_validator.schema import Config  # noqa: F811
+        return Config
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+conf = LazyConfig(DEFAULT_CONFIG_PATH)
@@ -0,0 +1,450 @@
+import contextlib
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import socketserver
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Union
+
+from samples_validator.base import ApiTestResult, CodeSample, Language
+from samples_validator.conf import conf
+from samples_validator.loader import load_code_samples
+from samples_validator.metrics import METRICS, MetricsServer
+from samples_validator.progress import status_label
+from samples_validator.reporter import Reporter, debug, log
+from samples_validator.selection import Selector, select_samples
+from samples_validator.session import TestSession, make_runners
+from samples_validator.sharding import result_to_dict, split_units
+from samples_validator.stats import LatencyStats, latency_stats_path
+from samples_validator.throttle import THROTTLE
+
+# inotify(7)
+_IN_MODIFY = 0x2
+_IN_ATTRIB = 0x4
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_Q_OVERFLOW = 0x4000
+_IN_IGNORED = 0x8000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = (
+    _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM
+    | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+)
+# wd, mask, cookie and length of the name which follows
+_EVENT = struct.Struct('iIII')
+
+Send = Callable[[dict], None]
+
+
+class InotifyWatcher:
+    """Changes of files under the directory, reported by the kernel"""
+
+    name = 'inotify'
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._libc = ctypes.CDLL(
+            ctypes.util.find_library('c') or 'libc.so.6', use_errno=True,
+        )
+        self._fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'Failed to initialize inotify')
+        self._directories: Dict[int, Path] = {}
+        try:
+            self._watch_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def wait(self, timeout: float) -> Set[Path]:
+        """
+        :return: Paths changed within the timeout, empty if there were none
+        """
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        changed: Set[Path] = set()
+        data = os.read(self._fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & _IN_Q_OVERFLOW:
+                # events were lost, anything could change
+                changed.add(self.root)
+                continue
+            if mask & _IN_IGNORED:
+                self._directories.pop(wd, None)
+                continue
+            directory = self._directories.get(wd)
+            if directory is None:
+                continue
+            path = directory / name if name else directory
+            changed.add(path)
+            if mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO):
+                # files could appear before the directory is watched
+                changed.update(self._watch_new_tree(path))
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+    def _watch_tree(self, root: Path):
+        directories = [root] + [path for path in root.rglob('*')
+                                if path.is_dir()]
+        for directory in directories:
+            wd = self._libc.inotify_add_watch(
+                self._fd, os.fsencode(str(directory)), _WATCH_MASK,
+            )
+            if wd < 0:
+                # e.g. ENOSPC when the limit of watches is reached
+                raise OSError(
+                    ctypes.get_errno(), f'Failed to watch {directory}',
+                )
+            self._directories[wd] = directory
+
+    def _watch_new_tree(self, root: Path) -> List[Path]:
+        try:
+            self._watch_tree(root)
+        except OSError as e:
+            # removed already, its removal is reported as well
+            debug(f'{root} is not watched: {e}')
+            return []
+        return list(root.rglob('*'))
+
+
+class PollingWatcher:
+    """Changes of files under the directory, found by their mtime"""
+
+    name = 'polling'
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._snapshot = self._scan()
+
+    def wait(self, timeout: float) -> Set[Path]:
+        time.sleep(timeout)
+        snapshot = self._scan()
+        changed = {
+            path for path in set(snapshot) | set(self._snapshot)
+            if snapshot.get(path) != self._snapshot.get(path)
+        }
+        self._snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+    def _scan(self) -> Dict[Path, int]:
+        snapshot = {}
+        for path in self.root.rglob('*'):
+            with contextlib.suppress(FileNotFoundError):
+                if path.is_file():
+                    snapshot[path] = path.stat().st_mtime_ns
+        return snapshot
+
+
+Watcher = Union[InotifyWatcher, PollingWatcher]
+
+
+def make_watcher(root: Path) -> Watcher:
+    try:
+        return InotifyWatcher(root)
+    except (OSError, AttributeError) as e:
+        # no inotify outside of Linux, or the limits are too low
+        debug(f'inotify is not available, polling {root}: {e}')
+        return PollingWatcher(root)
+
+
+def affected_samples(
+        samples: List[CodeSample],
+        changed: Set[Path]) -> List[CodeSample]:
+    """
+    Samples whose files, or the files next to them (e.g. `debug.edn`),
+    have changed
+    """
+    return [
+        sample for sample in samples
+        if any(
+            path == sample.path
+            or path.parent == sample.path.parent
+            or path in sample.path.parents
+            for path in changed
+        )
+    ]
+
+
+def samples_to_rerun(
+        old_samples: List[CodeSample],
+        new_samples: List[CodeSample],
+        changed: Set[Path]) -> List[CodeSample]:
+    """
+    Whole subtrees of the changed samples: children depend on their parents,
+    and a removed parent affects the remaining children as well
+    """
+    affected = (
+        affected_samples(old_samples, changed)
+        + affected_samples(new_samples, changed)
+    )
+    keys = {
+        unit.key
+        for unit in split_units(old_samples) + split_units(new_samples)
+        if any(sample in unit.samples for sample in affected)
+    }
+    return [
+        sample
+        for unit in split_units(new_samples) if unit.key in keys
+        for sample in unit.samples
+    ]
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class ValidatorDaemon:
+    """
+    Long-running validator. Runners and their environments, parsed specs,
+    latency history and the index of samples are kept between runs.
+    Changed subtrees are run again automatically, clients request runs
+    over a Unix socket and get results as soon as samples finish.
+
+    Every message is a JSON object on its own line. Requests are
+    `{"command": "run", "lang": "shell", "keyword": "users",
+    "select": ["GET */{id}"]}`,
+    `{"command": "status"}` and `{"command": "stop"}`. A run is answered
+    by a `result` event per sample and a `finished` event at the end
+    """
+
+    def __init__(
+            self,
+            samples_dir: Path,
+            socket_path: Path,
+            languages: Optional[List[Language]] = None,
+            keyword: str = '',
+            selectors: Optional[List[str]] = None,
+            watch: bool = True,
+            metrics_path: Optional[Path] = None,
+            metrics_port: Optional[int] = None):
+        """
+        :param selectors: Patterns of `Selector`, the samples validated by
+            the daemon are selected by them and the keyword
+        :param metrics_path: OpenMetrics text file updated after every run
+        :param metrics_port: Local port the metrics are served on
+        """
+        self.samples_dir = samples_dir
+        self.socket_path = socket_path
+        self.languages = languages
+        self.keyword = keyword
+        self.selectors = [Selector(pattern) for pattern in selectors or []]
+        self.samples = self._load_samples()
+        self.runners = make_runners()
+        self.runs = 0
+        self.watcher: Optional[Watcher] = (
+            make_watcher(samples_dir) if watch else None
+        )
+        self._latency_stats = LatencyStats.load(latency_stats_path())
+        self._run_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._remove_stale_socket()
+        self._server = _Server(str(socket_path), self._make_handler())
+        os.chmod(str(socket_path), 0o600)
+        self._server_thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True,
+        )
+        self.metrics_path = metrics_path
+        self.metrics_server = (
+            MetricsServer(metrics_port) if metrics_port else None
+        )
+
+    def serve_forever(self):
+        try:
+            self._server_thread.start()
+            if self.metrics_server is not None:
+                self.metrics_server.start()
+                log(f'Metrics are served on '
+                    f'http://127.0.0.1:{self.metrics_server.port}/metrics')
+            log(f'Validator is listening on {self.socket_path}, '
+                f'{len(self.samples)} samples, watching changes: '
+                f'{self.watcher.name if self.watcher else "no"}')
+            while not self._stopped.is_set():
+                if self.watcher is None:
+                    self._stopped.wait(conf.daemon_poll_interval)
+                    continue
+                changed = self.watcher.wait(conf.daemon_poll_interval)
+                if changed:
+                    self.rerun(self._settle(self.watcher, changed))
+        finally:
+            self.close()
+
+    def stop(self):
+        self._stopped.set()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+        with contextlib.suppress(FileNotFoundError):
+            self.socket_path.unlink()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.watcher is not None:
+            self.watcher.close()
+
+    def rerun(self, changed: Set[Path]):
+        """Reload the index and run the subtrees of the changed files"""
+        with self._run_lock:
+            old_samples, self.samples = self.samples, self._load_samples()
+        samples = samples_to_rerun(old_samples, self.samples, changed)
+        if not samples:
+            return
+        log(f'\n{len(samples)} samples are affected by changes')
+        test_results = self.run(samples, verbose=True)
+        Reporter().print_test_session_report(test_results)
+
+    def run(
+            self,
+            samples: List[CodeSample],
+            send: Optional[Send] = None,
+            verbose: bool = False) -> List[ApiTestResult]:
+        """One run at a time, they share the runners and the API resources"""
+        with self._run_lock:
+            self.runs += 1
+            session = TestSession(
+                samples, runners=self.runners,
+                latency_stats=self._latency_stats,
+            )
+            start_time = time.time()
+            results = session.iter_results(verbose=verbose)
+            try:
+                with contextlib.closing(results):
+                    for test_result in results:
+                        if send is not None:
+                            send({
+                                'event': 'result',
+                                'status': status_label(test_result),
+                                'lang': test_result.sample.lang.value,
+                                'failed': test_result.failed,
+                                'result': result_to_dict(test_result),
+                            })
+            finally:
+                session.save_latency_stats()
+                self._add_metrics(session.test_results, start_time)
+            return session.test_results
+
+    def select(
+            self,
+            lang: Optional[str],
+            keyword: str,
+            patterns: Optional[List[str]] = None) -> List[CodeSample]:
+        """
+        :raise ValueError: A pattern is invalid
+        """
+        samples = [
+            sample for sample in self.samples
+            if not lang or sample.lang.value == lang
+        ]
+        selectors = [Selector(pattern) for pattern in patterns or []]
+        return select_samples(samples, keyword, selectors).samples
+
+    def handle_request(self, request: dict, send: Send):
+        command = request.get('command')
+        if command == 'run':
+            try:
+                samples = self.select(
+                    request.get('lang'), request.get('keyword') or '',
+                    request.get('select'),
+                )
+            except ValueError as e:
+                send({'event': 'error', 'message': str(e)})
+                return
+            test_results = self.run(samples, send)
+            send({
+                'event': 'finished',
+                'total': len(test_results),
+                'failed': sum(1 for res in test_results if res.failed),
+            })
+        elif command == 'status':
+            send({
+                'event': 'status',
+                'samples': len(self.samples),
+                'runs': self.runs,
+                'running': self._run_lock.locked(),
+                'watcher': self.watcher.name if self.watcher else None,
+            })
+        elif command == 'stop':
+            self.stop()
+            send({'event': 'stopped'})
+        else:
+            send({'event': 'error', 'message': f'Unknown command: {command}'})
+
+    def _add_metrics(
+            self,
+            test_results: List[ApiTestResult],
+            start_time: float):
+        METRICS.add_session(test_results, time.time() - start_time)
+        if self.metrics_path is not None:
+            METRICS.write(self.metrics_path, THROTTLE.metrics())
+
+    def _load_samples(self) -> List[CodeSample]:
+        samples = load_code_samples(self.samples_dir, self.languages)
+        return select_samples(samples, self.keyword, self.selectors).samples
+
+    @staticmethod
+    def _settle(watcher: Watcher, changed: Set[Path]) -> Set[Path]:
+        """Editors and VCS change files in several steps, wait for all"""
+        while True:
+            more = watcher.wait(conf.daemon_debounce)
+            if not more:
+                return changed
+            changed |= more
+
+    def _remove_stale_socket(self):
+        import socket
+
+        if not self.socket_path.exists():
+            return
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            try:
+                client.connect(str(self.socket_path))
+            except ConnectionRefusedError:
+                # left by a daemon which was killed
+                self.socket_path.unlink()
+                return
+        raise RuntimeError(
+            f'Another validator is listening on {self.socket_path}',
+        )
+
+    def _make_handler(self):
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+
+            def handle(self):
+                try:
+                    request = json.loads(self.rfile.readline())
+                except ValueError:
+                    self._send({'event': 'error', 'message': 'Bad request'})
+                    return
+                try:
+                    daemon.handle_request(request, self._send)
+                except BrokenPipeError:
+                    # the client has gone, the run is stopped
+                    debug('Client disconnected')
+
+            def _send(self, message: dict):
+                self.wfile.write(json.dumps(message).encode() + b'\n')
+                self.wfile.flush()
+
+        return Handler
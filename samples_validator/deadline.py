@@ -0,0 +1,35 @@
+import time
+from typing import Optional
+
+from samples_validator.conf import conf
+
+MIN_TIMEOUT = 0.1
+
+
+class Deadline:
+    """
+    Time budget of a session, counted from its creation. The last `margin`
+    seconds are reserved for cleanup: DELETE samples of the resources the
+    session has created and removal of prerequisites. Other samples are run
+    only while their estimated duration fits before the margin
+    """
+
+    def __init__(self, budget: float, margin: Optional[float] = None):
+        self.budget = budget
+        self.margin = conf.deadline_margin if margin is None else margin
+        self._end = time.monotonic() + budget
+
+    def remaining(self, cleanup: bool = False) -> float:
+        """
+        :param cleanup: Time for cleanup, the margin is included
+        """
+        remaining = self._end - time.monotonic()
+        return remaining if cleanup else remaining - self.margin
+
+    def allows(self, cost: float, cleanup: bool = False) -> bool:
+        return self.remaining(cleanup) >= cost
+
+    def cap(self, timeout: float, cleanup: bool = False) -> float:
+        """The timeout of a sample, so it's stopped at the deadline"""
+        # zero timeout means the default one for `run_shell_command`
+        return max(min(timeout, self.remaining(cleanup)), MIN_TIMEOUT)
@@ -22,5 +22,13 @@ class ExecutionTimeout(SampleRuntimeError):
     pass
 
 
+class BlockedByFailure(SampleRuntimeError):
+    pass
+
+
+class DeadlineExceeded(SampleRuntimeError):
+    pass
+
+
 class ConformToSchemaError(OutputParsingError):
     pass
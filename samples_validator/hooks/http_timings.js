@@ -0,0 +1,57 @@
+'use strict';
+// Preloaded into JavaScript samples when the validator measures HTTP phases.
+// Requests made through the `http` and `https` modules (unirest included)
+// are timed by the events of their sockets, every request is reported as a
+// marker line on stderr. The sample itself isn't changed
+const http = require('http');
+const https = require('https');
+
+const MARKER = '@@samples-validator-http ';
+
+function now() {
+  return Number(process.hrtime.bigint()) / 1e9;
+}
+
+function report(start, marks, end) {
+  const connected = marks.secure || marks.connect || marks.lookup || start;
+  const timings = {
+    dns: marks.lookup ? marks.lookup - start : 0,
+    connect: marks.connect ? marks.connect - (marks.lookup || start) : 0,
+    tls: marks.secure ? marks.secure - (marks.connect || start) : 0,
+    ttfb: marks.response - connected,
+    transfer: end - marks.response,
+    total: end - start,
+  };
+  process.stderr.write(MARKER + JSON.stringify(timings) + '\n');
+}
+
+function track(req) {
+  const start = now();
+  const marks = {};
+  req.once('socket', (socket) => {
+    socket.once('lookup', () => { marks.lookup = now(); });
+    socket.once('connect', () => { marks.connect = now(); });
+    socket.once('secureConnect', () => { marks.secure = now(); });
+  });
+  req.once('response', (res) => {
+    marks.response = now();
+    res.once('end', () => report(start, marks, now()));
+  });
+  return req;
+}
+
+function wrap(module) {
+  const request = module.request;
+  module.request = function (...args) {
+    return track(request.apply(this, args));
+  };
+  // `get` calls the internal `request`, not the property of the module
+  module.get = function (...args) {
+    const req = module.request.apply(this, args);
+    req.end();
+    return req;
+  };
+}
+
+wrap(http);
+wrap(https);
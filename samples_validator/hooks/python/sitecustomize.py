@@ -0,0 +1,74 @@
+"""
+Loaded by Python samples when the validator measures HTTP phases. Network
+calls made inside of `requests` are timed, and every request is reported
+as a marker line on stderr. The sample itself isn't changed
+"""
+import http.client
+import json
+import socket
+import ssl
+import sys
+import threading
+import time
+
+MARKER = '@@samples-validator-http '
+
+_state = threading.local()
+
+
+def _timed(phase, function):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            phases = getattr(_state, 'phases', None)
+            if phases is not None:
+                elapsed = time.perf_counter() - start
+                phases[phase] = phases.get(phase, 0.0) + elapsed
+    return wrapper
+
+
+def _report(phases, total):
+    timings = {
+        phase: phases.get(phase, 0.0)
+        for phase in ('dns', 'connect', 'tls', 'ttfb')
+    }
+    timings['transfer'] = max(0.0, total - sum(timings.values()))
+    timings['total'] = total
+    sys.stderr.write(f'{MARKER}{json.dumps(timings)}\n')
+
+
+def _patch_requests():
+    try:
+        import requests
+    except ImportError:
+        return
+    send = requests.Session.send
+
+    def timed_send(self, request, **kwargs):
+        if getattr(_state, 'phases', None) is not None:
+            # redirects are sent from the inside, they're a part of it
+            return send(self, request, **kwargs)
+        _state.phases = phases = {}
+        start = time.perf_counter()
+        try:
+            return send(self, request, **kwargs)
+        finally:
+            _state.phases = None
+            _report(phases, time.perf_counter() - start)
+
+    requests.Session.send = timed_send
+
+
+socket.getaddrinfo = _timed('dns', socket.getaddrinfo)
+socket.socket.connect = _timed(  # type: ignore
+    'connect', socket.socket.connect,
+)
+ssl.SSLContext.wrap_socket = _timed(  # type: ignore
+    'tls', ssl.SSLContext.wrap_socket,
+)
+http.client.HTTPConnection.getresponse = _timed(  # type: ignore
+    'ttfb', http.client.HTTPConnection.getresponse,
+)
+_patch_requests()
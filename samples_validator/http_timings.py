@@ -0,0 +1,97 @@
+import atexit
+import json
+import shutil
+import tempfile
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from samples_validator.base import HttpTimings
+
+# every HTTP request of a sample is reported by its hook as a line on stderr
+MARKER = '@@samples-validator-http '
+
+HOOKS_PATH = Path(__file__).absolute().parent / 'hooks'
+PYTHON_HOOK_PATH = HOOKS_PATH / 'python'
+NODE_HOOK_PATH = HOOKS_PATH / 'http_timings.js'
+
+# times of curl are counted from the start of the request
+_CURL_WRITE_OUT = (
+    '%{stderr}' + MARKER.replace('"', '\\"')
+    + '{'
+    + ', '.join(
+        f'\\"{name}\\": %{{{name}}}'
+        for name in (
+            'time_namelookup', 'time_connect', 'time_appconnect',
+            'time_pretransfer', 'time_starttransfer', 'time_total',
+        )
+    )
+    + '}\\n'
+)
+
+
+def parse_http_timings(stderr: str) -> Tuple[Optional[HttpTimings], str]:
+    """
+    Take the timings reported by the hooks out of the command's stderr
+
+    :return: Timings of all requests summed up, None if there were no
+        requests. Stderr without the marker lines
+    """
+    timings: Optional[HttpTimings] = None
+    lines = []
+    for line in stderr.splitlines(keepends=True):
+        if not line.startswith(MARKER):
+            lines.append(line)
+            continue
+        try:
+            data = json.loads(line[len(MARKER):])
+        except ValueError:
+            lines.append(line)
+            continue
+        if 'time_total' in data:
+            request_timings = _from_curl(data)
+        else:
+            # python and node hooks report the phases themselves
+            request_timings = HttpTimings(
+                dns=data['dns'],
+                connect=data['connect'],
+                tls=data['tls'],
+                ttfb=data['ttfb'],
+                transfer=data['transfer'],
+                total=data['total'],
+            )
+        timings = request_timings if timings is None else (
+            timings + request_timings
+        )
+    return timings, ''.join(lines)
+
+
+def _from_curl(data: Dict[str, float]) -> HttpTimings:
+    connected = data['time_connect']
+    # zero when there was no TLS
+    handshaken = max(data['time_appconnect'], connected)
+    return HttpTimings(
+        dns=data['time_namelookup'],
+        connect=max(0.0, connected - data['time_namelookup']),
+        tls=handshaken - connected,
+        ttfb=max(0.0, data['time_starttransfer'] - data['time_pretransfer']),
+        transfer=max(0.0, data['time_total'] - data['time_starttransfer']),
+        total=data['time_total'],
+    )
+
+
+@lru_cache(maxsize=None)
+def curl_home() -> Path:
+    """
+    Directory with `.curlrc` making curl report its timings, it's used as
+    `CURL_HOME`. Options from the user's own `.curlrc` are kept. Every
+    process has its own directory, it's removed on exit
+    """
+    path = Path(tempfile.mkdtemp(prefix='samples-validator-curl-'))
+    atexit.register(shutil.rmtree, path.as_posix(), ignore_errors=True)
+    user_config = Path.home() / '.curlrc'
+    options = user_config.read_text() if user_config.exists() else ''
+    (path / '.curlrc').write_text(
+        f'{options}\nwrite-out = "{_CURL_WRITE_OUT}"\n',
+    )
+    return path
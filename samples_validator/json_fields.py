@@ -0,0 +1,105 @@
+import json
+import re
+from json.decoder import scanstring  # type: ignore
+from typing import Any, Collection, Optional
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# anything but brackets, strings are matched as a whole to skip brackets
+# within them
+_FILLER = re.compile(
+    r'(?:[^"\[\]{}]+|"[^"\\]*(?:\\.[^"\\]*)*")*', re.DOTALL,
+)
+_CLOSING = {'{': '}', '[': ']'}
+
+
+def extract_fields(text: str, keys: Optional[Collection[str]] = None) -> Any:
+    """
+    Parse a JSON document keeping only the given top-level fields of an
+    object. The object is read member by member and objects and arrays of
+    other fields are skipped without decoding: only their brackets and
+    strings are checked, so a big response is never built as a tree
+
+    :param text: JSON document
+    :param keys: Fields to keep. The whole document is decoded if None
+    :return: Dict with found fields. None if the document is not an object,
+        because nothing can be taken from it for substitutions
+    :raises json.JSONDecodeError: Document is malformed
+    """
+    if keys is None:
+        return json.loads(text)
+    idx = _skip_whitespace(text, 0)
+    if not text.startswith('{', idx):
+        _ensure_end(text, _skip_value(text, idx))
+        return None
+
+    fields: dict = {}
+    idx = _skip_whitespace(text, idx + 1)
+    if text.startswith('}', idx):
+        _ensure_end(text, idx + 1)
+        return fields
+    while True:
+        if not text.startswith('"', idx):
+            raise json.JSONDecodeError(
+                'Expecting property name enclosed in double quotes', text, idx,
+            )
+        key, idx = scanstring(text, idx + 1)
+        idx = _skip_whitespace(text, idx)
+        if not text.startswith(':', idx):
+            raise json.JSONDecodeError("Expecting ':' delimiter", text, idx)
+        idx = _skip_whitespace(text, idx + 1)
+        if key in keys:
+            fields[key], idx = _decoder.raw_decode(text, idx)
+        else:
+            idx = _skip_value(text, idx)
+        idx = _skip_whitespace(text, idx)
+        if text.startswith(',', idx):
+            idx = _skip_whitespace(text, idx + 1)
+        elif text.startswith('}', idx):
+            _ensure_end(text, idx + 1)
+            return fields
+        else:
+            raise json.JSONDecodeError("Expecting ',' delimiter", text, idx)
+
+
+def select_fields(body: Any, keys: Optional[Collection[str]] = None) -> Any:
+    """The same as `extract_fields`, but for already decoded body"""
+    if keys is None:
+        return body
+    if not isinstance(body, dict):
+        return None
+    return {key: value for key, value in body.items() if key in keys}
+
+
+def _skip_whitespace(text: str, idx: int) -> int:
+    return _WHITESPACE.match(text, idx).end()  # type: ignore
+
+
+def _ensure_end(text: str, idx: int):
+    idx = _skip_whitespace(text, idx)
+    if idx != len(text):
+        raise json.JSONDecodeError('Extra data', text, idx)
+
+
+def _skip_value(text: str, idx: int) -> int:
+    if not text.startswith(('{', '['), idx):
+        # scalars are small, the C scanner validates them exactly
+        _, end = _decoder.raw_decode(text, idx)
+        return end
+    expected = []
+    while True:
+        idx = _FILLER.match(text, idx).end()  # type: ignore
+        char = text[idx:idx + 1]
+        if char in _CLOSING:
+            expected.append(_CLOSING[char])
+        elif char == '"':
+            raise json.JSONDecodeError('Unterminated string', text, idx)
+        elif not char:
+            raise json.JSONDecodeError(
+                f'Expecting {expected[-1]!r}', text, idx,
+            )
+        elif char != expected.pop():
+            raise json.JSONDecodeError('Mismatched bracket', text, idx)
+        idx += 1
+        if not expected:
+            return idx
@@ -0,0 +1,186 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from samples_validator.base import (
+    ApiTestResult, CodeSample, HttpMethod, Language,
+)
+from samples_validator.conf import conf
+from samples_validator.reporter import Reporter
+from samples_validator.session import TestSession, make_runners
+from samples_validator.sharding import split_units
+from samples_validator.stats import (
+    LatencyStats, latency_stats_path, percentile, summarize_http_timings,
+)
+from samples_validator.utils import collect_response_keys
+
+
+@dataclass
+class LoadChain:
+    name: str
+    samples: List[CodeSample]
+
+    @property
+    def read_only(self) -> bool:
+        """Iterations create nothing, so they can overlap"""
+        return all(
+            sample.http_method == HttpMethod.get
+            and sample.name not in conf.before_sample
+            for sample in self.samples
+        )
+
+
+@dataclass
+class IterationError:
+    chain: LoadChain
+    # 1-based
+    iteration: int
+    error: Exception
+
+
+@dataclass
+class EndpointLoadSummary:
+    lang: Language
+    endpoint: str
+    requests_count: int
+    failed_count: int
+    throughput: float
+    p50: float
+    p95: float
+    p99: float
+
+
+def summarize_load(
+        test_results: List[ApiTestResult],
+        wall_time: float) -> List[EndpointLoadSummary]:
+    """Latency percentiles and throughput per endpoint and language"""
+    grouped: Dict[Tuple[Language, str], List[ApiTestResult]] = {}
+    for test_result in test_results:
+        sample = test_result.sample
+        endpoint = f'{sample.http_method.value} {sample.name}'
+        grouped.setdefault((sample.lang, endpoint), []).append(test_result)
+
+    summaries = []
+    for (lang, endpoint), results in grouped.items():
+        durations = [test_result.duration for test_result in results]
+        summaries.append(EndpointLoadSummary(
+            lang=lang,
+            endpoint=endpoint,
+            requests_count=len(results),
+            failed_count=sum(1 for res in results if res.failed),
+            throughput=len(results) / wall_time if wall_time else 0.0,
+            p50=percentile(durations, 50),
+            p95=percentile(durations, 95),
+            p99=percentile(durations, 99),
+        ))
+    return summaries
+
+
+def split_chains(samples: List[CodeSample]) -> List[LoadChain]:
+    """Chains which share no resources: the units of `split_units`"""
+    return [LoadChain(unit.name, unit.samples) for unit in split_units(samples)]
+
+
+class LoadSession:
+    """
+    Reuse code samples as a load generator. One iteration is a regular
+    session over a chain of the samples, so every POST is followed by its
+    DELETE and prerequisites are cleaned up. Iterations of a chain which
+    creates resources are run one after another, as they create the same
+    ones, the chains sharing no resources run concurrently. Iterations of
+    read-only chains overlap
+    """
+
+    def __init__(
+            self,
+            samples: List[CodeSample],
+            repeat: int,
+            concurrency: int = 1):
+        self.samples = samples
+        self.repeat = repeat
+        self.concurrency = max(1, concurrency)
+        self.chains = split_chains(samples)
+        self.runners = make_runners()
+        self.response_keys = collect_response_keys(
+            samples, conf.resp_attr_replacements,
+        )
+        # load affects latency, so observations are not saved for timeouts
+        self._latency_stats = LatencyStats.load(latency_stats_path())
+        self.test_results: List[ApiTestResult] = []
+        self.errors: List[IterationError] = []
+        self.wall_time = 0.0
+        self._lock = threading.Lock()
+
+    def run(self) -> int:
+        reporter = Reporter()
+        reporter.show_load_run(self.repeat, self.concurrency)
+        if self.concurrency > self.parallelism:
+            reporter.show_load_parallelism(self.parallelism)
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            chain_runs = [
+                executor.submit(self._run_chain, chain, iterations)
+                for chain, iterations in self._schedule()
+            ]
+            for chain_run in chain_runs:
+                self.test_results.extend(chain_run.result())
+        self.wall_time = time.time() - start_time
+
+        reporter.print_load_report(
+            summarize_load(self.test_results, self.wall_time), self.wall_time,
+        )
+        reporter.print_http_timings_report(
+            summarize_http_timings(self.test_results),
+        )
+        reporter.print_load_errors(self.errors, self.repeat)
+        failed_count = sum(1 for res in self.test_results if res.failed)
+        return failed_count + len(self.errors)
+
+    @property
+    def parallelism(self) -> int:
+        """How many iterations can run at the same time"""
+        return sum(
+            self.repeat if chain.read_only else 1 for chain in self.chains
+        )
+
+    def _schedule(self) -> List[Tuple[LoadChain, range]]:
+        """Iterations run one after another, 1-based"""
+        schedule: List[Tuple[LoadChain, range]] = []
+        for chain in self.chains:
+            if chain.read_only:
+                schedule.extend(
+                    (chain, range(iteration, iteration + 1))
+                    for iteration in range(1, self.repeat + 1)
+                )
+            else:
+                schedule.append((chain, range(1, self.repeat + 1)))
+        return schedule
+
+    def _run_chain(
+            self,
+            chain: LoadChain,
+            iterations: range) -> List[ApiTestResult]:
+        """
+        The iterations of the chain, up to the first one which has crashed:
+        it may have left resources the next ones would conflict with
+        """
+        test_results: List[ApiTestResult] = []
+        for iteration in iterations:
+            try:
+                test_results.extend(self._run_iteration(chain))
+            except Exception as e:
+                with self._lock:
+                    self.errors.append(IterationError(chain, iteration, e))
+                break
+        return test_results
+
+    def _run_iteration(self, chain: LoadChain) -> List[ApiTestResult]:
+        session = TestSession(
+            chain.samples,
+            runners=self.runners,
+            latency_stats=self._latency_stats,
+            response_keys=self.response_keys,
+        )
+        return session.execute(verbose=False)
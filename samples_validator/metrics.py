@@ -0,0 +1,280 @@
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from socketserver import ThreadingMixIn
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from samples_validator import errors
+from samples_validator.base import ApiTestResult
+from samples_validator.conf import conf
+from samples_validator.throttle import ThrottleMetrics
+
+PREFIX = 'samples_validator'
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+
+    def __init__(self, buckets: List[float]):
+        # OpenMetrics wants canonical floats in `le`, e.g. "1.0" for 1
+        self.buckets = sorted(float(bound) for bound in buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+
+def result_status(test_result: ApiTestResult) -> str:
+    if test_result.skipped:
+        return 'skipped'
+    if test_result.unfinished:
+        return 'unfinished'
+    if test_result.passed:
+        return 'passed'
+    return 'ignored' if test_result.ignored else 'failed'
+
+
+def _escape(value: str) -> str:
+    return (
+        value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    )
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in labels)
+    return f'{{{pairs}}}'
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class ValidatorMetrics:
+    """
+    Metrics of the sessions run by the process, in OpenMetrics text format.
+    Counters and histograms grow with every session, e.g. of `--daemon`
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.durations: Dict[Labels, Histogram] = {}
+            self.statuses: Counter = Counter()
+            self.timeouts: Counter = Counter()
+            self.resources: Dict[Labels, Histogram] = {}
+            self.sessions = 0
+            self.last_session_duration = 0.0
+            self.last_session_time = 0.0
+
+    def add_session(
+            self,
+            test_results: List[ApiTestResult],
+            wall_time: float):
+        with self._lock:
+            for test_result in test_results:
+                self._add_result(test_result)
+            self.sessions += 1
+            self.last_session_duration = wall_time
+            self.last_session_time = time.time()
+
+    def observe_resource(self, operation: str, name: str, seconds: float):
+        """Creation or removal of a prerequisite resource"""
+        labels = (('operation', operation), ('resource', name))
+        with self._lock:
+            self._histogram(self.resources, labels).observe(seconds)
+
+    def render(
+            self,
+            throttle_metrics: Optional[Dict[str, ThrottleMetrics]] = None,
+    ) -> str:
+        with self._lock:
+            lines = list(self._render(throttle_metrics or {}))
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def write(
+            self,
+            path: Path,
+            throttle_metrics: Optional[Dict[str, ThrottleMetrics]] = None):
+        """
+        Replace the file at once, a collector of text files (e.g. of
+        node_exporter) never reads it half-written
+        """
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=f'.{path.name}-', dir=str(path.parent),
+        )
+        with os.fdopen(fd, 'w') as tmp_file:
+            tmp_file.write(self.render(throttle_metrics))
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, str(path))
+
+    def _add_result(self, test_result: ApiTestResult):
+        sample = test_result.sample
+        scope = (('lang', sample.lang.value),
+                 ('api', sample.name.split('/')[0]))
+        self.statuses[scope + (('status', result_status(test_result)),)] += 1
+        # unfinished samples may have been stopped before their start
+        if test_result.skipped or (
+                test_result.unfinished and not test_result.duration):
+            return
+        if test_result.reason is errors.ExecutionTimeout:
+            self.timeouts[scope] += 1
+        labels = scope + (
+            ('method', sample.http_method.value), ('sample', sample.name),
+        )
+        self._histogram(self.durations, labels).observe(test_result.duration)
+
+    @staticmethod
+    def _histogram(
+            histograms: Dict[Labels, Histogram],
+            labels: Labels) -> Histogram:
+        histogram = histograms.get(labels)
+        if histogram is None:
+            histogram = histograms[labels] = Histogram(conf.metrics_buckets)
+        return histogram
+
+    def _render(
+            self,
+            throttle_metrics: Dict[str, ThrottleMetrics]) -> Iterator[str]:
+        yield from _render_histograms(
+            'sample_duration_seconds', 'Duration of sample runs',
+            self.durations,
+        )
+        yield from _render_counter(
+            'samples', 'Results of samples', self.statuses,
+        )
+        yield from _render_counter(
+            'timeouts', 'Samples which timed out', self.timeouts,
+        )
+        yield from _render_counter(
+            'throttle_retries', 'Requests repeated after 429 or 503',
+            {(('host', host),): metrics.retries
+             for host, metrics in throttle_metrics.items()},
+        )
+        yield from _render_counter(
+            'throttled_responses', 'Responses with 429 or 503',
+            {(('host', host),): metrics.throttled
+             for host, metrics in throttle_metrics.items()},
+        )
+        yield from _render_histograms(
+            'prerequisite_duration_seconds',
+            'Creation and removal of prerequisite resources', self.resources,
+        )
+        yield from _render_counter(
+            'sessions', 'Finished sessions', {(): self.sessions},
+        )
+        yield from _render_gauge(
+            'session_duration_seconds', 'Wall time of the last session',
+            self.last_session_duration, 'seconds',
+        )
+        yield from _render_gauge(
+            'last_session_timestamp_seconds', 'When the last session finished',
+            self.last_session_time, 'seconds',
+        )
+
+
+def _render_counter(
+        name: str,
+        description: str,
+        values: Dict[Labels, int]) -> Iterator[str]:
+    name = f'{PREFIX}_{name}'
+    yield f'# TYPE {name} counter'
+    yield f'# HELP {name} {description}.'
+    for labels, value in sorted(values.items()):
+        yield f'{name}_total{_labels(labels)} {value}'
+
+
+def _render_gauge(
+        name: str,
+        description: str,
+        value: float,
+        unit: str) -> Iterator[str]:
+    name = f'{PREFIX}_{name}'
+    yield f'# TYPE {name} gauge'
+    yield f'# UNIT {name} {unit}'
+    yield f'# HELP {name} {description}.'
+    yield f'{name} {_number(value)}'
+
+
+def _render_histograms(
+        name: str,
+        description: str,
+        histograms: Dict[Labels, Histogram]) -> Iterator[str]:
+    name = f'{PREFIX}_{name}'
+    yield f'# TYPE {name} histogram'
+    yield f'# UNIT {name} seconds'
+    yield f'# HELP {name} {description}.'
+    for labels, histogram in sorted(histograms.items()):
+        bounds = histogram.buckets + [float('inf')]
+        counts = histogram.counts + [histogram.count]
+        for bound, count in zip(bounds, counts):
+            bucket_labels = labels + (('le', _number(bound)),)
+            yield f'{name}_bucket{_labels(bucket_labels)} {count}'
+        yield f'{name}_count{_labels(labels)} {histogram.count}'
+        yield f'{name}_sum{_labels(labels)} {_number(histogram.sum)}'
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class MetricsServer:
+    """Serves the metrics of the process to Prometheus on `/metrics`"""
+
+    def __init__(self, port: int, host: str = '127.0.0.1'):
+        self._server = _Server((host, port), self._make_handler())
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True,
+        )
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @staticmethod
+    def _make_handler():
+        from samples_validator.throttle import THROTTLE
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = METRICS.render(THROTTLE.metrics()).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):  # noqa: A002
+                pass
+
+        return Handler
+
+
+METRICS = ValidatorMetrics()
@@ -0,0 +1,253 @@
+import heapq
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+from samples_validator.base import CodeSample, HttpMethod, Language
+from samples_validator.conf import conf
+from samples_validator.stats import LatencyStats, percentile
+from samples_validator.utils import PLACEHOLDER_RE
+
+# placeholders look like {id}, braces in the code itself are not matched
+_KEY_RE = re.compile(r'[\w@.-]+')
+
+
+@dataclass
+class Dependency:
+    producer: CodeSample
+    consumer: CodeSample
+    reason: str
+
+
+def find_placeholders(text: str) -> Set[str]:
+    return {key for key in PLACEHOLDER_RE.findall(text)
+            if _KEY_RE.fullmatch(key)}
+
+
+def prerequisite_keys(sample: CodeSample) -> Set[str]:
+    """Placeholders filled by `before_sample` resources of the sample"""
+    keys: Set[str] = set()
+    for params in conf.before_sample.get(sample.name, []):
+        if params['method'] == sample.http_method.value:
+            for value in params['subs'].values():
+                keys.update(find_placeholders(str(value)))
+    return keys
+
+
+def renamed_keys(sample: CodeSample) -> Set[str]:
+    """Fields which `resp_attr_replacements` add to the sample's response"""
+    return {
+        key_to
+        for rule in conf.resp_attr_replacements.get(sample.name, [])
+        for key_to in rule.values()
+    }
+
+
+class ExecutionPlan:
+    """
+    Dependency graph of code samples. A sample depends on the POST samples
+    whose responses (or prerequisites) fill its placeholders, and DELETE
+    samples depend on everything which uses the resource being deleted
+    """
+
+    def __init__(
+            self,
+            samples: List[CodeSample],
+            dependencies: List[Dependency],
+            unresolved: Optional[List[Tuple[CodeSample, str]]] = None,
+            durations: Optional[List[Optional[float]]] = None):
+        """
+        :param samples: Samples in the order of a sequential run
+        :param dependencies: Edges of the graph
+        :param unresolved: Placeholders without a producer per sample
+        :param durations: Expected duration per sample, if it's known
+        """
+        self.samples = samples
+        self.dependencies = dependencies
+        self.unresolved = unresolved or []
+        self._index = {id(sample): i for i, sample in enumerate(samples)}
+        self._predecessors: List[List[int]] = [[] for _ in samples]
+        self._dependencies_of: List[List[Dependency]] = [[] for _ in samples]
+        for dependency in dependencies:
+            consumer = self._index[id(dependency.consumer)]
+            self._predecessors[consumer].append(
+                self._index[id(dependency.producer)],
+            )
+            self._dependencies_of[consumer].append(dependency)
+
+        self._order = self._topological_order()
+        self._weights, self.estimated = self._estimate_weights(durations)
+        self.levels = self._make_levels()
+        self.critical_path, self.critical_path_duration = (
+            self._find_critical_path()
+        )
+
+    @property
+    def max_parallelism(self) -> int:
+        """Width of the widest level, i.e. samples which may run at once"""
+        return max((len(level) for level in self.levels), default=0)
+
+    def dependencies_of(self, sample: CodeSample) -> List[Dependency]:
+        return self._dependencies_of[self._index[id(sample)]]
+
+    def _topological_order(self) -> List[int]:
+        successors: List[List[int]] = [[] for _ in self.samples]
+        in_degree = [len(preds) for preds in self._predecessors]
+        for consumer, preds in enumerate(self._predecessors):
+            for producer in preds:
+                successors[producer].append(consumer)
+        # the sequential order is kept where the graph allows it
+        ready = [i for i, degree in enumerate(in_degree) if not degree]
+        order = []
+        while ready:
+            current = heapq.heappop(ready)
+            order.append(current)
+            for successor in successors[current]:
+                in_degree[successor] -= 1
+                if not in_degree[successor]:
+                    heapq.heappush(ready, successor)
+        if len(order) != len(self.samples):
+            cycle = ', '.join(
+                self.samples[i].name
+                for i, degree in enumerate(in_degree) if degree
+            )
+            raise ValueError(f'Dependency cycle between samples: {cycle}')
+        return order
+
+    def _estimate_weights(
+            self,
+            durations: Optional[List[Optional[float]]],
+    ) -> Tuple[List[float], bool]:
+        known = [value for value in durations or [] if value is not None]
+        if not durations or not known:
+            return [1.0] * len(self.samples), False
+        # samples without history are expected to be as slow as a typical one
+        typical = percentile(known, 50)
+        weights = [typical if value is None else value for value in durations]
+        return weights, True
+
+    def _make_levels(self) -> List[List[CodeSample]]:
+        depth = [0] * len(self.samples)
+        for current in self._order:
+            for producer in self._predecessors[current]:
+                depth[current] = max(depth[current], depth[producer] + 1)
+        levels: List[List[CodeSample]] = [
+            [] for _ in range(max(depth, default=-1) + 1)
+        ]
+        for current in self._order:
+            levels[depth[current]].append(self.samples[current])
+        return levels
+
+    def _find_critical_path(self) -> Tuple[List[CodeSample], float]:
+        """The longest chain of dependent samples, weighted by duration"""
+        if not self.samples:
+            return [], 0.0
+        finish = [0.0] * len(self.samples)
+        previous: List[Optional[int]] = [None] * len(self.samples)
+        for current in self._order:
+            for producer in self._predecessors[current]:
+                if finish[producer] > finish[current]:
+                    finish[current] = finish[producer]
+                    previous[current] = producer
+            finish[current] += self._weights[current]
+
+        last: Optional[int] = max(
+            range(len(self.samples)), key=lambda i: finish[i],
+        )
+        duration = finish[last]  # type: ignore
+        path = []
+        while last is not None:
+            path.append(self.samples[last])
+            last = previous[last]
+        path.reverse()
+        return path, duration
+
+
+def build_plan(
+        samples: List[CodeSample],
+        latency_stats: Optional[LatencyStats] = None) -> ExecutionPlan:
+    """
+    Match placeholders of every sample with the samples producing them
+
+    A placeholder is taken, in order of preference, from a `before_sample`
+    resource of the sample itself, from a prerequisite or a renamed field
+    of a POST sample up the path, from the POST of the collection the
+    placeholder belongs to (`{id}` in `a/{id}` comes from `POST a`), and
+    finally from the closest POST up the path. Static substitutions from
+    the configuration don't create dependencies
+    """
+    posts: Dict[Tuple[Language, str], int] = {}
+    deletes: Dict[Tuple[Language, str], int] = {}
+    for index, sample in enumerate(samples):
+        if sample.http_method == HttpMethod.post:
+            posts[(sample.lang, sample.name)] = index
+        elif sample.http_method == HttpMethod.delete:
+            deletes[(sample.lang, sample.name)] = index
+
+    static_keys = find_placeholders(' '.join(conf.substitutions))
+    edges: Dict[Tuple[int, int], str] = {}
+    unresolved: List[Tuple[CodeSample, str]] = []
+    for index, sample in enumerate(samples):
+        path_parts = sample.name.split('/')
+        ancestors = [
+            '/'.join(path_parts[:depth])
+            for depth in range(len(path_parts) - 1, 0, -1)
+        ]
+        producers = [
+            posts[(sample.lang, name)] for name in ancestors
+            if (sample.lang, name) in posts
+        ]
+        placeholders = (
+            find_placeholders(sample.path.read_text())
+            - static_keys
+            - prerequisite_keys(sample)
+        )
+        for key in sorted(placeholders):
+            found = _find_producer(samples, sample, key, producers, posts)
+            if found is None:
+                unresolved.append((sample, key))
+            else:
+                producer, reason = found
+                edges.setdefault((producer, index), reason)
+
+        for name in [sample.name] + ancestors:
+            delete = deletes.get((sample.lang, name))
+            if delete is not None and delete != index:
+                edges.setdefault((index, delete), 'cleanup')
+
+    dependencies = [
+        Dependency(samples[producer], samples[consumer], reason)
+        for (producer, consumer), reason in edges.items()
+    ]
+    durations = None
+    if latency_stats is not None:
+        durations = [
+            percentile(latency_stats.durations(sample), 50) or None
+            for sample in samples
+        ]
+    return ExecutionPlan(samples, dependencies, unresolved, durations)
+
+
+def _find_producer(
+        samples: List[CodeSample],
+        sample: CodeSample,
+        key: str,
+        producers: List[int],
+        posts: Dict[Tuple[Language, str], int],
+) -> Optional[Tuple[int, str]]:
+    if not producers:
+        return None
+    for producer in producers:
+        if key in prerequisite_keys(samples[producer]):
+            return producer, f'{{{key}}} from prerequisite'
+    for producer in producers:
+        if key in renamed_keys(samples[producer]):
+            return producer, f'{{{key}}} from renamed field'
+    path_parts = sample.name.split('/')
+    placeholder = f'{{{key}}}'
+    if placeholder in path_parts:
+        collection = '/'.join(path_parts[:path_parts.index(placeholder)])
+        owner = posts.get((sample.lang, collection))
+        if owner is not None:
+            return owner, f'{placeholder} from response'
+    return producers[0], f'{placeholder} from response'
@@ -0,0 +1,119 @@
+import os
+import re
+from concurrent.futures import (
+    FIRST_COMPLETED, Future, ProcessPoolExecutor, wait,
+)
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from samples_validator.base import CodeSample, Language, run_shell_command
+from samples_validator.conf import conf
+from samples_validator.runner.base import CodeRunner
+
+# substituted for placeholders of the path, e.g. `{id}`, whose values come
+# from the responses of parents: valid both in and out of string literals
+PLACEHOLDER_VALUE = '1'
+_PATH_PLACEHOLDER_RE = re.compile(r'{[^{}/]+}')
+_ERROR_RE = re.compile(r'^\w*Error:')
+
+
+@dataclass
+class PreflightFailure:
+    sample: CodeSample
+    message: str
+
+
+@dataclass
+class PreflightReport:
+    total: int
+    checked: int = 0
+    failures: List[PreflightFailure] = field(default_factory=list)
+    # languages without a checker, e.g. node isn't installed
+    unavailable: Set[Language] = field(default_factory=set)
+
+    @property
+    def passed(self) -> bool:
+        return not self.failures
+
+
+def render_for_check(sample: CodeSample) -> str:
+    """
+    Source code of the sample as it would be run, but placeholders filled by
+    the responses of other samples get a stand-in value
+    """
+    substitutions: Dict[str, str] = CodeRunner.get_substitutions_from_spec(
+        sample,
+    )
+    for placeholder in _PATH_PLACEHOLDER_RE.findall(sample.name):
+        substitutions[placeholder] = PLACEHOLDER_VALUE
+    return CodeRunner.replace_keywords(
+        sample.path.read_text(), substitutions,
+    )
+
+
+def check_syntax(lang: Language, source_code: str) -> Optional[str]:
+    """
+    Run in a worker process
+
+    :return: Description of the syntax error, None if there is none
+    :raise FileNotFoundError: The checker of the language isn't installed
+    """
+    if lang == Language.python:
+        try:
+            compile(source_code, '<sample>', 'exec')
+        except SyntaxError as e:
+            return f'line {e.lineno}: {e.msg}'
+        return None
+    if lang == Language.js:
+        args = ['node', '--check', '-']
+    else:
+        args = ['/bin/bash', '-n']
+    cmd_result = run_shell_command(
+        args, timeout=conf.sample_timeout, input=source_code,
+    )
+    if cmd_result.exit_code == 0:
+        return None
+    # node follows the error by its own stack trace
+    lines = [
+        line.strip() for line in cmd_result.stderr.splitlines()
+        if line.strip() and not line.strip().startswith('at ')
+    ]
+    # node puts the location, the source line and a caret before the error
+    error = next((line for line in lines if _ERROR_RE.match(line)), None)
+    if error is not None:
+        return error if lines[0] == error else f'{lines[0]} {error}'
+    return ' '.join(lines[:3]) or f'exit code {cmd_result.exit_code}'
+
+
+def run_preflight(samples: List[CodeSample]) -> PreflightReport:
+    """
+    Check syntax of all the samples in a pool of processes. The API isn't
+    requested and the environments of runners aren't needed. Checks stop at
+    the first failure, the samples left are reported as not checked
+    """
+    report = PreflightReport(total=len(samples))
+    workers = conf.preflight_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: Dict[Future, CodeSample] = {
+            pool.submit(check_syntax, sample.lang, render_for_check(sample)):
+            sample
+            for sample in samples
+        }
+        while pending and report.passed:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                _add_check(report, pending.pop(future), future)
+        for future in pending:
+            future.cancel()
+    return report
+
+
+def _add_check(report: PreflightReport, sample: CodeSample, future: Future):
+    try:
+        message = future.result()
+    except FileNotFoundError:
+        report.unavailable.add(sample.lang)
+        return
+    report.checked += 1
+    if message is not None:
+        report.failures.append(PreflightFailure(sample, message))
@@ -1,13 +1,21 @@
 import json
+import time
 from abc import abstractmethod
-from typing import Dict, Optional, Tuple
-
-import requests
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 
 from samples_validator.conf import conf
+from samples_validator.metrics import METRICS
 from samples_validator.reporter import debug
+from samples_validator.throttle import THROTTLE
+
+if TYPE_CHECKING:
+    from samples_validator.checkpoint import Checkpoint  # noqa
 
-API_URL = f'https://{conf.api_url}'
+
+def api_url(url: Optional[str] = None) -> str:
+    # scheme can be set explicitly, e.g. to use http://localhost:8888 dev server
+    url = str(conf.api_url if url is None else url)
+    return url if '://' in url else f'https://{url}'
 
 
 def _create_resource(
@@ -15,6 +23,8 @@ def _create_resource(
         payload: Optional[dict] = None,
         access_token: Optional[str] = None,
         headers: Optional[dict] = None) -> Tuple[int, Optional[dict]]:
+    import requests
+
     if access_token:
         headers = headers or {}
         headers['Authorization'] = f'Bearer {access_token}'
@@ -30,6 +40,8 @@ def _delete_resource(
         url: str,
         access_token: Optional[str] = None,
         headers: Optional[dict] = None) -> int:
+    import requests
+
     if access_token:
         headers = headers or {}
         headers['Authorization'] = f'Bearer {access_token}'
@@ -38,9 +50,15 @@ def _delete_resource(
 
 
 class Resource:
+    # path of the resource collection relative to the API url
+    path = ''
 
-    def __init__(self, base_url: str):
-        self.base_url = base_url
+    def __init__(
+            self,
+            base_url: Optional[str] = None,
+            access_token: Optional[str] = None):
+        self.base_url = base_url or f'{api_url()}{self.path}'
+        self.access_token = access_token or conf.access_token
         self._created = False
         self._deleted = False
 
@@ -63,6 +81,10 @@ class Resource:
         self._deleted = True
         return response
 
+    def restore(self, id_field: Optional[str]):
+        """Take over a resource created earlier, e.g. by another process"""
+        self._created = True
+
     @property
     def deleted(self):
         return self._deleted
@@ -88,8 +110,20 @@ class Resource:
 
 
 class ResourceRegistry:
-    def __init__(self):
-        self.resources = []
+    def __init__(
+            self,
+            url: Optional[str] = None,
+            access_token: Optional[str] = None,
+            checkpoint: Optional['Checkpoint'] = None):
+        """
+        :param url: API url, the one from the configuration by default
+        :param access_token: Token for the API, the configured by default
+        :param checkpoint: Journal of created and removed resources
+        """
+        self.url = url
+        self.access_token = access_token
+        self.checkpoint = checkpoint
+        self.resources: List[Resource] = []
 
     def create(
             self,
@@ -98,16 +132,46 @@ class ResourceRegistry:
 
         from samples_validator.prerequisites import resources
         filtered_body = {}
-        resource = getattr(resources, name)()
-        status_code, body = resource.create()
+        resource_cls = getattr(resources, name)
+        resource = resource_cls(
+            f'{api_url(self.url)}{resource_cls.path}', self.access_token,
+        )
+        start_time = time.time()
+        status_code, body = THROTTLE.call(
+            resource.base_url, resource.create, lambda result: result[0],
+            endpoint=f'create {name}',
+        )
+        METRICS.observe_resource('create', name, time.time() - start_time)
         body = body or {}
-        self.resources.append(resource)
+        # a failed create leaves nothing to remove
+        if status_code < 400 and resource.id_field is not None:
+            self.resources.append(resource)
+            if self.checkpoint is not None:
+                self.checkpoint.record_resource(resource, deleted=False)
         for key_from, key_to in substitutions.items():
             if key_from in body:
                 filtered_body[key_to] = body[key_from]
         return filtered_body
 
+    def adopt(self, name: str, base_url: str, id_field: Optional[str]):
+        """Remove the resource left by an interrupted session on cleanup"""
+        from samples_validator.prerequisites import resources
+
+        resource = getattr(resources, name)(base_url, self.access_token)
+        resource.restore(id_field)
+        self.resources.append(resource)
+
     def cleanup(self):
         for resource in self.resources:
             if not resource.deleted:
-                resource.delete()
+                name = resource.__class__.__name__
+                start_time = time.time()
+                THROTTLE.call(
+                    resource.base_url, resource.delete, lambda code: code,
+                    endpoint=f'delete {name}',
+                )
+                METRICS.observe_resource(
+                    'delete', name, time.time() - start_time,
+                )
+                if self.checkpoint is not None:
+                    self.checkpoint.record_resource(resource, deleted=True)
@@ -1,22 +1,25 @@
 from typing import Optional, Tuple
 
-from samples_validator.conf import conf
 from samples_validator.prerequisites.base import (
-    _create_resource, _delete_resource, API_URL, Resource,
+    _create_resource, _delete_resource, Resource,
 )
 
 
 class Identity(Resource):
+    path = '/identities/v1'
 
-    def __init__(self, base_url: str = f'{API_URL}/identities/v1'):
-        super().__init__(base_url)
-        self._id_field = None
+    def __init__(
+            self,
+            base_url: Optional[str] = None,
+            access_token: Optional[str] = None):
+        super().__init__(base_url, access_token)
+        self._id_field: Optional[str] = None
 
     def _create(
             self,
             payload: Optional[dict] = None) -> Tuple[int, Optional[dict]]:
         code, body = _create_resource(
-            self.base_url, self.generate_payload(), conf.access_token,
+            self.base_url, self.generate_payload(), self.access_token,
         )
         if code < 400 and body:
             self._id_field = body.get('@id')
@@ -25,9 +28,13 @@ class Identity(Resource):
     def _delete(self) -> int:
         return _delete_resource(
             f'{self.base_url}/{self.id_field}',
-            conf.access_token,
+            self.access_token,
         )
 
+    def restore(self, id_field: Optional[str]):
+        super().restore(id_field)
+        self._id_field = id_field
+
     @property
     def id_field(self):
         return self._id_field
@@ -44,16 +51,14 @@ class Identity(Resource):
 
 
 class DeleteProduct(Resource):
-
-    def __init__(self, base_url: str = f'{API_URL}/products/v1'):
-        super().__init__(base_url)
+    path = '/products/v1'
 
     def _create(
             self,
             payload: Optional[dict] = None) -> Tuple[int, Optional[dict]]:
         code = _delete_resource(
             f'{self.base_url}/{self.id_field}',
-            conf.access_token,
+            self.access_token,
         )
         return code, None
 
@@ -0,0 +1,213 @@
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import FrameType
+from typing import Dict, List, Optional, Tuple
+
+# stack frames of `run_shell_command` mean waiting for a sample to finish
+_CHILD_WAIT_FRAME = ('samples_validator.base', 'run_shell_command')
+_CHILD_WAIT_LABEL = '[child process]'
+
+
+class ChildProcessWaits:
+    """
+    Time spent by the validator waiting for child processes, i.e. running
+    samples, per executable. Waits of different threads are summed up
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts: Dict[str, int] = {}
+            self.totals: Dict[str, float] = {}
+
+    def add(self, command: str, seconds: float):
+        with self._lock:
+            self.counts[command] = self.counts.get(command, 0) + 1
+            self.totals[command] = self.totals.get(command, 0.0) + seconds
+
+    @property
+    def total(self) -> float:
+        return sum(self.totals.values())
+
+
+CHILD_WAITS = ChildProcessWaits()
+
+
+@dataclass
+class ProfileSummary:
+    output_dir: Path
+    wall_time: float
+    # CPU time of the validator process itself, children aren't included
+    cpu_time: float
+    child_wait: float
+    child_waits: Dict[str, Tuple[int, float]] = field(default_factory=dict)
+    peak_memory: int = 0
+    samples_count: int = 0
+
+    @property
+    def overhead(self) -> float:
+        """
+        Wall time not spent waiting for samples. Concurrent waits are summed
+        up, so it's only meaningful for sequential runs
+        """
+        return max(0.0, self.wall_time - self.child_wait)
+
+
+class StackSampler:
+    """
+    Background thread taking stacks of all the other threads at a fixed
+    interval. Stacks are kept collapsed: `frame;frame;frame count`
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples_count = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {
+                thread.ident: thread.name for thread in threading.enumerate()
+            }
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = collapse_stack(frame)
+                thread_name = names.get(thread_id, str(thread_id))
+                self.stacks[f'thread:{thread_name};{stack}'] += 1
+            self.samples_count += 1
+
+    def write(self, path: Path):
+        lines = [
+            f'{stack} {count}\n'
+            for stack, count in sorted(self.stacks.items())
+        ]
+        path.write_text(''.join(lines))
+
+
+def collapse_stack(frame: Optional[FrameType]) -> str:
+    """
+    Outermost frame goes first. Everything below `run_shell_command` is
+    replaced with a single frame, it's the time the sample is running
+    """
+    frames: List[str] = []
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '?')
+        function = frame.f_code.co_name
+        if (module, function) == _CHILD_WAIT_FRAME:
+            frames = [_CHILD_WAIT_LABEL]
+        frames.append(f'{module}:{function}')
+        frame = frame.f_back
+    return ';'.join(reversed(frames))
+
+
+class Profiler:
+    """
+    Profile the validator process: deterministic profile of the calling
+    thread with cProfile, allocations with tracemalloc and, optionally,
+    sampled stacks of all threads. Reports are written to `output_dir`
+    """
+
+    def __init__(
+            self,
+            output_dir: Path,
+            sampling_interval: Optional[float] = None,
+            top_allocations: int = 30):
+        """
+        :param sampling_interval: Seconds between stack samples, stacks
+            aren't sampled if None
+        """
+        self.output_dir = output_dir
+        self.top_allocations = top_allocations
+        self.summary: Optional[ProfileSummary] = None
+        self._profile = cProfile.Profile()
+        self._sampler = (
+            StackSampler(sampling_interval) if sampling_interval else None
+        )
+        self._started_at = 0.0
+        self._cpu_started_at = 0.0
+
+    def __enter__(self) -> 'Profiler':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        CHILD_WAITS.reset()
+        tracemalloc.start()
+        if self._sampler is not None:
+            self._sampler.start()
+        self._started_at = time.time()
+        self._cpu_started_at = time.process_time()
+        self._profile.enable()
+
+    def stop(self) -> ProfileSummary:
+        self._profile.disable()
+        wall_time = time.time() - self._started_at
+        cpu_time = time.process_time() - self._cpu_started_at
+        if self._sampler is not None:
+            self._sampler.stop()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self._write_profile()
+        self._write_allocations(snapshot)
+        if self._sampler is not None:
+            self._sampler.write(self.output_dir / 'stacks.collapsed')
+        self.summary = ProfileSummary(
+            output_dir=self.output_dir,
+            wall_time=wall_time,
+            cpu_time=cpu_time,
+            child_wait=CHILD_WAITS.total,
+            child_waits={
+                command: (count, CHILD_WAITS.totals[command])
+                for command, count in CHILD_WAITS.counts.items()
+            },
+            peak_memory=peak_memory,
+            samples_count=(
+                self._sampler.samples_count if self._sampler else 0
+            ),
+        )
+        return self.summary
+
+    def _write_profile(self):
+        self._profile.dump_stats(str(self.output_dir / 'profile.pstats'))
+        stream = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=stream)
+        stats.sort_stats('cumulative').print_stats(50)
+        (self.output_dir / 'profile.txt').write_text(stream.getvalue())
+
+    def _write_allocations(self, snapshot: tracemalloc.Snapshot):
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<unknown>'),
+        ))
+        top = snapshot.statistics('lineno')[:self.top_allocations]
+        lines = [f'{stat}\n' for stat in top]
+        (self.output_dir / 'allocations.txt').write_text(''.join(lines))
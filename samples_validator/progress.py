@@ -0,0 +1,266 @@
+import atexit
+import queue
+import shutil
+import sys
+import threading
+import time
+from typing import Any, List, Optional, TextIO, Tuple
+
+from samples_validator.base import ApiTestResult, CodeSample
+
+_COLORS = {
+    'PASSED': '\x1b[32m',
+    'FAILED': '\x1b[31m',
+    'IGNORE': '\x1b[33m',
+    'SKIPPED': '\x1b[36m',
+    'UNFINISHED': '\x1b[35m',
+}
+_RESET = '\x1b[0m'
+_CLEAR_LINE = '\r\x1b[K'
+
+
+def status_label(test_result: ApiTestResult) -> str:
+    if test_result.passed:
+        return 'PASSED'
+    elif test_result.skipped:
+        return 'SKIPPED'
+    elif test_result.unfinished:
+        return 'UNFINISHED'
+    elif test_result.ignored:
+        return 'IGNORE'
+    return 'FAILED'
+
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    return f'{minutes}m{seconds:02d}s' if minutes else f'{seconds}s'
+
+
+class LiveConsole:
+    """
+    Console output of the application. Callers never block: log messages
+    and progress events are put into a queue and rendered by a background
+    thread.
+    On a TTY a compact status line (in-flight, passed, failed, ETA) is
+    redrawn at most `fps` times per second, only failed and ignored samples
+    are printed above it. Otherwise every finished sample is printed as a
+    plain line, lines are written in batches
+    """
+
+    def __init__(
+            self,
+            stream: TextIO = sys.stdout,
+            tty: Optional[bool] = None,
+            fps: float = 10.0,
+            batch_size: int = 20,
+            flush_interval: float = 1.0):
+        self.stream = stream
+        self.tty = self._is_tty(stream) if tty is None else tty
+        self.frame_interval = 1 / fps
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        # the state below belongs to the rendering thread
+        self._in_session = False
+        self._total = 0
+        self._in_flight = 0
+        self._passed = 0
+        self._failed = 0
+        self._ignored = 0
+        self._skipped = 0
+        self._unfinished = 0
+        self._started_at = 0.0
+        self._status_shown = False
+        self._last_frame = 0.0
+        self._last_flush = 0.0
+        self._pending_lines: List[str] = []
+
+    @staticmethod
+    def _is_tty(stream: TextIO) -> bool:
+        try:
+            return stream.isatty()
+        except (AttributeError, ValueError):
+            return False
+
+    def write(self, message: Any):
+        """Sink for the logger"""
+        self._put(('log', str(message)))
+
+    def start_session(self, total: int):
+        self._put(('start', total))
+
+    def end_session(self):
+        self._put(('end', None))
+
+    def sample_started(self, sample: CodeSample):
+        self._put(('started', sample))
+
+    def sample_finished(self, test_result: ApiTestResult):
+        self._put(('finished', test_result))
+
+    def flush(self):
+        """Wait until everything queued so far is written"""
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._put(('flush', done))
+        done.wait()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def _put(self, event: Tuple[str, Any]):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._render_loop, daemon=True,
+                    )
+                    self._thread.start()
+        self._queue.put_nowait(event)
+
+    def _render_loop(self):
+        stopped = False
+        while not stopped:
+            events = [self._next_event()]
+            while True:
+                try:
+                    events.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            output: List[str] = []
+            flushed = []
+            force = False
+            for event in events:
+                if event is None:
+                    stopped = force = True
+                    self._in_session = False
+                    continue
+                kind, payload = event
+                if kind == 'flush':
+                    flushed.append(payload)
+                    force = True
+                else:
+                    output.extend(self._handle(kind, payload))
+            self._render(output, force)
+            for done in flushed:
+                done.set()
+
+    def _next_event(self) -> Optional[Tuple[str, Any]]:
+        live = self.tty and self._in_session and self._in_flight
+        timeout = self.frame_interval if live else None
+        if self._pending_lines:
+            timeout = self.flush_interval
+        try:
+            return self._queue.get(timeout=timeout)  # type: ignore
+        except queue.Empty:
+            return 'tick', None
+
+    def _handle(self, kind: str, payload: Any) -> List[str]:
+        if kind == 'log':
+            return [payload]
+        elif kind == 'start':
+            self._in_session = True
+            self._total = payload
+            self._in_flight = self._passed = self._failed = 0
+            self._ignored = self._skipped = self._unfinished = 0
+            self._started_at = self._last_flush = time.time()
+        elif kind == 'end':
+            self._in_session = False
+        elif kind == 'started':
+            self._in_flight += 1
+        elif kind == 'finished':
+            return self._handle_finished(payload)
+        return []
+
+    def _handle_finished(self, test_result: ApiTestResult) -> List[str]:
+        label = status_label(test_result)
+        # skipped samples are never started, nor the ones the deadline stops
+        # before their turn
+        started = label != 'SKIPPED' and (
+            label != 'UNFINISHED' or bool(test_result.duration)
+        )
+        if started:
+            self._in_flight = max(0, self._in_flight - 1)
+        if label == 'PASSED':
+            self._passed += 1
+        elif label == 'IGNORE':
+            self._ignored += 1
+        elif label == 'FAILED':
+            self._failed += 1
+        elif label == 'SKIPPED':
+            self._skipped += 1
+        elif label == 'UNFINISHED':
+            self._unfinished += 1
+        sample = test_result.sample
+        line = '{:>6}: {}'.format(sample.http_method.value, sample.name)
+        if not self.tty:
+            self._pending_lines.append(f'{line} [{label}]\n')
+            return []
+        if label == 'PASSED':
+            return []
+        status = f'{_COLORS[label]}[{label}]{_RESET}'
+        return [f'{sample.lang.value} {line} {status}\n']
+
+    def _render(self, output: List[str], force: bool = False):
+        now = time.time()
+        chunks: List[str] = []
+        if not self.tty:
+            batch_is_ready = (
+                len(self._pending_lines) >= self.batch_size
+                or now - self._last_flush >= self.flush_interval
+            )
+            # pending lines go first, log messages mustn't overtake them
+            if self._pending_lines and (output or force or batch_is_ready):
+                chunks.extend(self._pending_lines)
+                self._pending_lines = []
+                self._last_flush = now
+            chunks.extend(output)
+        else:
+            frame_is_due = now - self._last_frame >= self.frame_interval
+            if output or force or frame_is_due:
+                if self._status_shown:
+                    chunks.append(_CLEAR_LINE)
+                    self._status_shown = False
+                chunks.extend(output)
+                if self._in_session:
+                    chunks.append(self._status_line(now))
+                    self._status_shown = True
+                self._last_frame = now
+        if chunks:
+            self.stream.write(''.join(chunks))
+            self.stream.flush()
+
+    def _status_line(self, now: float) -> str:
+        done = (
+            self._passed + self._failed + self._ignored + self._skipped
+            + self._unfinished
+        )
+        status = (
+            f'[{done}/{self._total}] in-flight {self._in_flight}, '
+            f'passed {self._passed}, failed {self._failed}'
+        )
+        if self._ignored:
+            status += f', ignored {self._ignored}'
+        if self._skipped:
+            status += f', skipped {self._skipped}'
+        if self._unfinished:
+            status += f', unfinished {self._unfinished}'
+        if done and self._total > done:
+            elapsed = now - self._started_at
+            eta = elapsed / done * (self._total - done)
+            status += f', ETA {format_duration(eta)}'
+        # wrapped line can't be erased by carriage return
+        width = shutil.get_terminal_size((100, 20)).columns
+        return status[:width - 1]
+
+
+CONSOLE = LiveConsole()
+atexit.register(CONSOLE.stop)
@@ -0,0 +1,349 @@
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from socketserver import ThreadingMixIn
+from typing import Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from samples_validator.conf import conf
+from samples_validator.prerequisites.base import api_url
+
+HAR_VERSION = '1.2'
+# headers which describe the connection or the encoding, not the exchange
+_HOP_BY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailers', 'transfer-encoding', 'upgrade', 'host',
+    'content-length', 'content-encoding',
+}
+# secrets are not written to the recording
+_REDACTED_HEADERS = {'authorization', 'cookie', 'set-cookie'}
+
+# method and path with query
+ExchangeKey = Tuple[str, str]
+
+
+class Exchange:
+    """A request with its response, as it's kept in a HAR entry"""
+
+    def __init__(
+            self,
+            method: str,
+            url: str,
+            request_headers: List[Tuple[str, str]],
+            request_body: bytes,
+            status: int,
+            reason: str,
+            response_headers: List[Tuple[str, str]],
+            response_body: bytes,
+            duration: float = 0.0,
+            started_at: Optional[datetime] = None):
+        self.method = method
+        self.url = url
+        self.request_headers = request_headers
+        self.request_body = request_body
+        self.status = status
+        self.reason = reason
+        self.response_headers = response_headers
+        self.response_body = response_body
+        self.duration = duration
+        self.started_at = started_at or datetime.now(timezone.utc)
+
+    @property
+    def key(self) -> ExchangeKey:
+        parts = urlsplit(self.url)
+        path = parts.path or '/'
+        return self.method, f'{path}?{parts.query}' if parts.query else path
+
+    def to_har(self) -> dict:
+        request: dict = {
+            'method': self.method,
+            'url': self.url,
+            'httpVersion': 'HTTP/1.1',
+            'headers': _har_headers(self.request_headers),
+            'queryString': [],
+            'cookies': [],
+            'headersSize': -1,
+            'bodySize': len(self.request_body),
+        }
+        if self.request_body:
+            request['postData'] = {
+                'mimeType': _header(self.request_headers, 'content-type'),
+                'text': self.request_body.decode('utf8', 'replace'),
+            }
+        return {
+            'startedDateTime': self.started_at.isoformat(),
+            'time': round(self.duration * 1000, 3),
+            'request': request,
+            'response': {
+                'status': self.status,
+                'statusText': self.reason,
+                'httpVersion': 'HTTP/1.1',
+                'headers': _har_headers(self.response_headers),
+                'cookies': [],
+                'content': {
+                    'size': len(self.response_body),
+                    'mimeType': _header(self.response_headers, 'content-type'),
+                    'text': self.response_body.decode('utf8', 'replace'),
+                },
+                'redirectURL': '',
+                'headersSize': -1,
+                'bodySize': len(self.response_body),
+            },
+            'cache': {},
+            'timings': {
+                'send': 0, 'wait': round(self.duration * 1000, 3), 'receive': 0,
+            },
+        }
+
+    @classmethod
+    def from_har(cls, entry: dict) -> 'Exchange':
+        request = entry['request']
+        response = entry['response']
+        return cls(
+            method=request['method'],
+            url=request['url'],
+            request_headers=_headers_from_har(request['headers']),
+            request_body=request.get('postData', {}).get('text', '').encode(),
+            status=response['status'],
+            reason=response.get('statusText', ''),
+            response_headers=_headers_from_har(response['headers']),
+            response_body=response['content'].get('text', '').encode(),
+            duration=entry.get('time', 0) / 1000,
+        )
+
+
+def _header(headers: List[Tuple[str, str]], name: str) -> str:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return ''
+
+
+def _har_headers(headers: List[Tuple[str, str]]) -> List[dict]:
+    return [
+        {
+            'name': name,
+            'value': 'REDACTED' if name.lower() in _REDACTED_HEADERS else value,
+        }
+        for name, value in headers
+    ]
+
+
+def _headers_from_har(headers: List[dict]) -> List[Tuple[str, str]]:
+    return [(header['name'], header['value']) for header in headers]
+
+
+def load_har(path: Path) -> List[Exchange]:
+    har = json.loads(path.read_text())
+    return [Exchange.from_har(entry) for entry in har['log']['entries']]
+
+
+def save_har(path: Path, exchanges: List[Exchange]):
+    har = {
+        'log': {
+            'version': HAR_VERSION,
+            'creator': {'name': 'samples-validator', 'version': '0.1.0'},
+            'entries': [exchange.to_har() for exchange in exchanges],
+        },
+    }
+    path.write_text(json.dumps(har, indent=2))
+
+
+class Cassette:
+    """
+    Recorded responses served in the order they were recorded. The same
+    request made several times gets the next recorded response every time,
+    the last one is repeated when they run out
+    """
+
+    def __init__(self, exchanges: List[Exchange]):
+        self._queues: Dict[ExchangeKey, Deque[Exchange]] = {}
+        self._last: Dict[ExchangeKey, Exchange] = {}
+        self._lock = threading.Lock()
+        self.served = 0
+        self.missing: List[ExchangeKey] = []
+        for exchange in exchanges:
+            self._queues.setdefault(exchange.key, deque()).append(exchange)
+
+    def play(self, key: ExchangeKey) -> Optional[Exchange]:
+        with self._lock:
+            queue = self._queues.get(key)
+            if queue:
+                self._last[key] = queue.popleft()
+            exchange = self._last.get(key)
+            if exchange is None:
+                self.missing.append(key)
+            else:
+                self.served += 1
+            return exchange
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class RecordingProxy:
+    """
+    HTTP server the samples are pointed at instead of the API. In record mode
+    requests are forwarded to the API and exchanges are written to a HAR
+    file when the proxy stops. In replay mode responses come from a HAR file
+    and the API isn't touched
+    """
+
+    def __init__(
+            self,
+            har_path: Path,
+            replay: bool = False,
+            upstream: Optional[str] = None):
+        """
+        :param upstream: API the requests are forwarded to when recording,
+            the configured one by default
+        """
+        self.har_path = har_path
+        self.replay = replay
+        self.upstream = api_url(upstream).rstrip('/')
+        # recorded urls include the path of the API
+        self._base_path = urlsplit(self.upstream).path
+        self.exchanges: List[Exchange] = []
+        self.cassette = Cassette(load_har(har_path) if replay else [])
+        self._lock = threading.Lock()
+        self._server = _Server(('127.0.0.1', 0), self._make_handler())
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True,
+        )
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self._server.server_port}'
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        if not self.replay:
+            save_har(self.har_path, self.exchanges)
+
+    def handle(
+            self,
+            method: str,
+            path: str,
+            headers: List[Tuple[str, str]],
+            body: bytes) -> Exchange:
+        if self.replay:
+            exchange = self.cassette.play(
+                (method, f'{self._base_path}{path}'),
+            )
+            if exchange is not None:
+                return exchange
+            return Exchange(
+                method, path, headers, body, 404, 'Not Found',
+                [('Content-Type', 'application/json')],
+                json.dumps({'error': 'The request was not recorded'}).encode(),
+            )
+        import requests
+
+        try:
+            exchange = self._forward(method, path, headers, body)
+        except requests.RequestException as e:
+            # the sample gets a clear error, it isn't recorded as a response
+            return Exchange(
+                method, f'{self.upstream}{path}', headers, body,
+                502, 'Bad Gateway', [('Content-Type', 'application/json')],
+                json.dumps({'error': f'Upstream request failed: {e}'}).encode(),
+            )
+        with self._lock:
+            self.exchanges.append(exchange)
+        return exchange
+
+    def _forward(
+            self,
+            method: str,
+            path: str,
+            headers: List[Tuple[str, str]],
+            body: bytes) -> Exchange:
+        """:raise requests.RequestException: The upstream didn't respond"""
+        import requests
+
+        url = f'{self.upstream}{path}'
+        request_headers = [
+            (name, value) for name, value in headers
+            if name.lower() not in _HOP_BY_HOP_HEADERS
+        ]
+        started_at = datetime.now(timezone.utc)
+        start_time = time.time()
+        response = requests.request(
+            method, url, headers=dict(request_headers), data=body or None,
+            allow_redirects=False, timeout=conf.sample_timeout,
+        )
+        return Exchange(
+            method=method,
+            url=url,
+            request_headers=request_headers,
+            request_body=body,
+            status=response.status_code,
+            reason=response.reason or '',
+            response_headers=[
+                (name, value) for name, value in response.headers.items()
+                if name.lower() not in _HOP_BY_HOP_HEADERS
+            ],
+            response_body=response.content,
+            duration=time.time() - start_time,
+            started_at=started_at,
+        )
+
+    def _make_handler(self):
+        proxy = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _proxy(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                exchange = proxy.handle(
+                    self.command, self.path, list(self.headers.items()), body,
+                )
+                self.send_response(exchange.status, exchange.reason or None)
+                for name, value in exchange.response_headers:
+                    if name.lower() not in _HOP_BY_HOP_HEADERS:
+                        self.send_header(name, value)
+                self.send_header(
+                    'Content-Length', str(len(exchange.response_body)),
+                )
+                self.end_headers()
+                self.wfile.write(exchange.response_body)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _proxy
+
+            def log_message(self, format, *args):  # noqa: A002
+                pass
+
+        return Handler
+
+
+def proxy_substitutions(proxy_url: str) -> Dict[str, str]:
+    """
+    Static substitutions pointing the samples to the proxy. Samples request
+    the API over HTTPS, the proxy serves plain HTTP, so the scheme is
+    replaced as well
+    """
+    from samples_validator.schema import Target
+    from samples_validator.targets import target_substitutions
+
+    substitutions = {}
+    for key, value in conf.substitutions.items():
+        if value == conf.api_url and '://' not in key:
+            # must go before the key itself, it's a part of these ones
+            substitutions[f'https://{key}'] = proxy_url
+            substitutions[f'http://{key}'] = proxy_url
+    substitutions.update(target_substitutions(
+        Target(api_url=proxy_url, access_token=conf.access_token),
+    ))
+    return substitutions
@@ -0,0 +1,159 @@
+import json
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+
+from samples_validator.base import ApiTestResult, CodeSample, HttpMethod
+from samples_validator.checkpoint import ResourceKey
+from samples_validator.stats import sample_key
+from samples_validator.utils import CodeSamplesTree
+
+if TYPE_CHECKING:
+    from samples_validator.prerequisites.base import Resource  # noqa
+
+CAPTURE_VERSION = 1
+
+
+class Capture:
+    """
+    Substitutions GET samples were run with: bodies of the POST samples up
+    their path and prerequisites. They're valid as long as the resources
+    are in place, so a capture run doesn't remove them. What it has created
+    is saved as well, and removed by the next capture
+    """
+
+    def __init__(self, removers: Optional[List[CodeSample]] = None):
+        """
+        :param removers: DELETE samples which aren't run by the capture
+        """
+        self.removers = removers or []
+        self.substitutions: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, sample: CodeSample, substitutions: dict):
+        if sample.http_method == HttpMethod.get:
+            with self._lock:
+                self.substitutions[sample_key(sample)] = dict(substitutions)
+
+    def save(
+            self,
+            path: Path,
+            test_results: List[ApiTestResult],
+            resources: List['Resource']):
+        """
+        Only the samples which passed, the others may have broken IDs
+
+        :param resources: Prerequisite resources left by the capture
+        """
+        passed = {
+            sample_key(result.sample) for result in test_results
+            if result.passed
+        }
+        with self._lock:
+            samples = {
+                key: substitutions
+                for key, substitutions in self.substitutions.items()
+                if key in passed
+            }
+        # bodies of the POST samples, DELETE samples take their IDs
+        created = {
+            sample_key(result.sample): result.json_body
+            for result in test_results
+            if result.passed and result.sample.http_method == HttpMethod.post
+        }
+        path.write_text(json.dumps(
+            {
+                'version': CAPTURE_VERSION,
+                'samples': samples,
+                'created': created,
+                'resources': [
+                    [resource.__class__.__name__, resource.base_url,
+                     resource.id_field]
+                    for resource in resources
+                ],
+            },
+            indent=2,
+        ))
+
+
+def load_capture(path: Path) -> Dict[str, dict]:
+    """
+    :return: Substitutions by `sample_key`
+    """
+    samples: Dict[str, dict] = _read_capture(path)['samples']
+    return samples
+
+
+def load_created(
+        path: Path,
+        samples: List[CodeSample],
+) -> Tuple[List[ApiTestResult], List[CodeSample], List[ResourceKey]]:
+    """
+    What the capture has left: results of the POST samples, the DELETE
+    samples removing what they created and prerequisite resources. Captures
+    of earlier versions of the tool have nothing saved
+
+    :param samples: Samples the capture was made of
+    """
+    data = _read_capture(path)
+    tree = CodeSamplesTree()
+    for sample in samples:
+        tree.put(sample)
+    created: List[ApiTestResult] = []
+    removers: Set[int] = set()
+    for sample in samples:
+        key = sample_key(sample)
+        if key not in data.get('created', {}):
+            continue
+        created.append(ApiTestResult(
+            sample, passed=True, json_body=data['created'][key],
+        ))
+        removers.update(id(remover) for remover in tree.get_removers(sample))
+    resources = [
+        (name, url, id_field)
+        for name, url, id_field in data.get('resources', [])
+    ]
+    # children are removed before their parents
+    return created, [
+        sample for sample in samples if id(sample) in removers
+    ], resources
+
+
+def _read_capture(path: Path) -> dict:
+    try:
+        data = json.loads(path.read_text())
+    except json.JSONDecodeError:
+        raise ValueError(f'Capture file is corrupted: {path.as_posix()}')
+    if data.get('version') != CAPTURE_VERSION:
+        raise ValueError(
+            f'Unsupported version of the capture: {path.as_posix()}',
+        )
+    capture: dict = data
+    return capture
+
+
+def capture_samples(samples: List[CodeSample]) -> List[CodeSample]:
+    """Samples of a capture run, the resources are left in place"""
+    return [
+        sample for sample in samples
+        if sample.http_method != HttpMethod.delete
+    ]
+
+
+def read_only_samples(
+        samples: List[CodeSample],
+        captured: Dict[str, dict],
+) -> Tuple[List[CodeSample], List[CodeSample]]:
+    """
+    :return: GET samples with captured substitutions, and the GET samples
+        which can't be run without them
+    """
+    selected, missing = [], []
+    for sample in samples:
+        if sample.http_method != HttpMethod.get:
+            continue
+        if sample_key(sample) in captured:
+            selected.append(sample)
+        else:
+            missing.append(sample)
+    return selected, missing
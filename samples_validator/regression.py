@@ -0,0 +1,141 @@
+import json
+import math
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List
+
+from samples_validator.base import ApiTestResult
+from samples_validator.conf import conf
+from samples_validator.stats import percentile, sample_key
+
+
+@dataclass
+class LatencyRegression:
+    endpoint: str
+    baseline_median: float
+    current_median: float
+    p_value: float
+
+    @property
+    def slowdown(self) -> float:
+        if not self.baseline_median:
+            return 0.0
+        return self.current_median / self.baseline_median - 1
+
+
+def collect_latencies(
+        test_results: List[ApiTestResult]) -> Dict[str, List[float]]:
+    """
+    Group durations of passed samples by `sample_key`: the language is a
+    part of it, as startup of interpreters differs a lot. Failed runs are
+    not representative, they are reported anyway
+    """
+    latencies: Dict[str, List[float]] = {}
+    for test_result in test_results:
+        if test_result.passed:
+            latencies.setdefault(sample_key(test_result.sample), []).append(
+                round(test_result.duration, 3),
+            )
+    return latencies
+
+
+def save_baseline(path: Path, test_results: List[ApiTestResult]):
+    path.write_text(json.dumps(collect_latencies(test_results), indent=2))
+
+
+def load_baseline(path: Path) -> Dict[str, List[float]]:
+    try:
+        data = json.loads(path.read_text())
+    except FileNotFoundError:
+        raise ValueError(f'Baseline file is missing: {path.as_posix()}')
+    except json.JSONDecodeError:
+        raise ValueError(f'Baseline file is corrupted: {path.as_posix()}')
+    return {key: [float(value) for value in values]
+            for key, values in data.items()}
+
+
+def mann_whitney_u(baseline: List[float], current: List[float]) -> float:
+    """
+    One-sided Mann-Whitney U test with normal approximation, tie and
+    continuity corrections
+
+    :param baseline: Latencies observed in the baseline run
+    :param current: Latencies observed in the current run
+    :return: p-value of the hypothesis that current latencies are
+        stochastically greater than the baseline ones
+    """
+    n1, n2 = len(current), len(baseline)
+    if not n1 or not n2:
+        return 1.0
+    combined = sorted(
+        [(value, True) for value in current]
+        + [(value, False) for value in baseline],
+    )
+    n = n1 + n2
+    rank_sum = 0.0
+    ties_correction = 0.0
+    i = 0
+    while i < n:
+        j = i
+        while j + 1 < n and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        average_rank = (i + j) / 2 + 1
+        ties = j - i + 1
+        ties_correction += ties ** 3 - ties
+        rank_sum += average_rank * sum(
+            1 for _, is_current in combined[i:j + 1] if is_current
+        )
+        i = j + 1
+
+    u = rank_sum - n1 * (n1 + 1) / 2
+    mean = n1 * n2 / 2
+    variance = n1 * n2 / 12 * ((n + 1) - ties_correction / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - mean - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def find_regressions(
+        baseline: Dict[str, List[float]],
+        current: Dict[str, List[float]]) -> List[LatencyRegression]:
+    """
+    Endpoint is considered regressed when its median latency grew more than
+    `regression_threshold` and the slowdown is statistically significant
+    """
+    regressions = []
+    for endpoint in sorted(set(baseline) & set(current)):
+        before, after = baseline[endpoint], current[endpoint]
+        if not _enough_samples(before, after):
+            continue
+        before_median = percentile(before, 50)
+        after_median = percentile(after, 50)
+        if after_median <= before_median * (1 + conf.regression_threshold):
+            continue
+        p_value = mann_whitney_u(before, after)
+        if p_value < conf.regression_alpha:
+            regressions.append(LatencyRegression(
+                endpoint=endpoint,
+                baseline_median=before_median,
+                current_median=after_median,
+                p_value=p_value,
+            ))
+    return regressions
+
+
+def unjudged_endpoints(
+        baseline: Dict[str, List[float]],
+        current: Dict[str, List[float]]) -> List[str]:
+    """
+    Endpoints of the run which can't be compared with the baseline: missing
+    from it, or with too few observations in either of the runs
+    """
+    return [
+        endpoint for endpoint in sorted(current)
+        if not _enough_samples(baseline.get(endpoint, []), current[endpoint])
+    ]
+
+
+def _enough_samples(before: List[float], after: List[float]) -> bool:
+    min_samples: int = conf.regression_min_samples
+    return min(len(before), len(after)) >= min_samples
@@ -1,31 +1,35 @@
-from contextlib import contextmanager
-from shutil import get_terminal_size
-from typing import List
+from collections import Counter
+from typing import Dict, List, Optional, TYPE_CHECKING
 
 from loguru import logger
 
 from samples_validator import errors
 from samples_validator.base import ApiTestResult, CodeSample, Language
 from samples_validator.conf import conf
-from samples_validator.runner.base import APP_LOG_HANDLER
+from samples_validator.progress import CONSOLE, status_label
+from samples_validator.regression import LatencyRegression
+from samples_validator.stats import summarize_http_timings
+
+if TYPE_CHECKING:
+    from samples_validator.load import (  # noqa
+        EndpointLoadSummary, IterationError,
+    )
+    from samples_validator.planner import ExecutionPlan  # noqa
+    from samples_validator.preflight import PreflightReport  # noqa
+    from samples_validator.profiling import ProfileSummary  # noqa
+    from samples_validator.selection import Selection  # noqa
+    from samples_validator.proxy import RecordingProxy  # noqa
+    from samples_validator.sharding import ShardPlan  # noqa
+    from samples_validator.stats import EndpointHttpSummary  # noqa
+    from samples_validator.throttle import ThrottleMetrics  # noqa
 
 
 def debug(message: str):
     logger.debug(message)
 
 
-@contextmanager
-def patch_stream_handler_terminator(enabled=False):
-    if enabled:
-        APP_LOG_HANDLER.terminator = ''
-    yield
-    if enabled:
-        APP_LOG_HANDLER.terminator = '\n'
-
-
-def log(message: str, no_new_line: bool = False):
-    with patch_stream_handler_terminator(no_new_line):
-        logger.log('regular', message)  # TODO: move to consts
+def log(message: str):
+    logger.log('regular', message)  # TODO: move to consts
 
 
 def log_red(message: str):
@@ -80,7 +84,8 @@ class Reporter:
 
     @staticmethod
     def _explain_timeout_error(test_result: ApiTestResult):
-        log(f'Timeout error: {conf.sample_timeout}s')
+        timeout = test_result.timeout or conf.sample_timeout
+        log('Timeout error: {:.1f}s'.format(timeout))
 
     @staticmethod
     def _print_sample_source_code(test_result: ApiTestResult):
@@ -120,60 +125,409 @@ class Reporter:
         self._print_sample_source_code(test_result)
         log('')
 
+    @staticmethod
+    def _list_tests(category: str, test_results: List[ApiTestResult]):
+        if not test_results:
+            return
+        log(f'== List of {category} tests ==')
+        for test_result in test_results:
+            sample = test_result.sample
+            line = (
+                f'{sample.lang.value} - {sample.name} - '
+                f'{sample.http_method.value}'
+            )
+            blocker = test_result.blocked_by
+            if blocker is not None:
+                line += (
+                    f' (blocked by {blocker.http_method.value} '
+                    f'{blocker.name})'
+                )
+            log(line)
+
+    @staticmethod
+    def show_session_start(samples_count: int):
+        CONSOLE.start_session(samples_count)
+
     @staticmethod
     def show_short_test_status(test_result: ApiTestResult):
-        if test_result.passed:
-            log_green('[PASSED]')
-        elif test_result.ignored:
-            log_yellow('[IGNORE]')
-        else:
-            log_red('[FAILED]')
+        CONSOLE.sample_finished(test_result)
 
     def print_test_session_report(self, test_results: List[ApiTestResult]):
-        passed_count = 0
-        failed_count = 0
-        ignored_count = 0
-        overall_time = 0.0
-        log_fn = log_green
+        CONSOLE.end_session()
         log('')
         for test_result in test_results:
-            overall_time += test_result.duration
-            if test_result.passed:
-                passed_count += 1
-            elif test_result.ignored:
-                ignored_count += 1
-                log_fn = log_yellow
-            else:
-                failed_count += 1
-                log_fn = log_red
-            self._explain_in_details(test_result)
-        if ignored_count:
-            log('== List of ignored tests ==')
-            for test_result in test_results:
-                if test_result.ignored:
-                    log((
-                        f'{test_result.sample.lang.value} - '
-                        f'{test_result.sample.name} - '
-                        f'{test_result.sample.http_method.value}'
-                    ))
-        if failed_count:
+            # skipped and unfinished samples have nothing to explain
+            if not test_result.skipped and not test_result.unfinished:
+                self._explain_in_details(test_result)
+        labels = Counter(status_label(res) for res in test_results)
+        failed_results = [
+            res for res in test_results if res.failed and not res.unfinished
+        ]
+        self._list_tests(
+            'skipped', [res for res in test_results if res.skipped],
+        )
+        self._list_tests(
+            'ignored', [res for res in test_results if res.ignored],
+        )
+        self._list_tests(
+            'unfinished', [res for res in test_results if res.unfinished],
+        )
+        self._list_tests('failed', failed_results)
+        if failed_results:
+            log_fn = log_red
             conclusion = 'Test session failed'
-            log('== List of failed tests ==')
-            for test_result in test_results:
-                if test_result.failed:
-                    log((
-                        f'{test_result.sample.lang.value} - '
-                        f'{test_result.sample.name} - '
-                        f'{test_result.sample.http_method.value}'
-                    ))
+        elif labels['UNFINISHED']:
+            log_fn = log_red
+            conclusion = 'Test session ran out of time'
         else:
             conclusion = 'Test session passed'
+            log_fn = log_green
+            if labels['IGNORE'] or labels['SKIPPED']:
+                log_fn = log_yellow
+        self.print_http_timings_report(summarize_http_timings(test_results))
+        overall_time = sum(res.duration for res in test_results)
         log('Time spent: {:.1f}s'.format(overall_time))
         description = '{} total, {} passed, {} failed, {} ignored'.format(
-            len(test_results), passed_count, failed_count, ignored_count,
+            len(test_results), labels['PASSED'], labels['FAILED'],
+            labels['IGNORE'],
         )
+        if labels['SKIPPED']:
+            description += ', {} skipped'.format(labels['SKIPPED'])
+        if labels['UNFINISHED']:
+            description += ', {} unfinished'.format(labels['UNFINISHED'])
         log_fn(f'\n== {conclusion} ==\n{description}')
 
+    @staticmethod
+    def show_not_comparable(min_samples: int):
+        log_red(f'Latencies are not compared with baseline: every endpoint '
+                f'needs {min_samples} observations, see --repeat\n')
+
+    @staticmethod
+    def print_regressions_report(
+            regressions: List[LatencyRegression],
+            unjudged: List[str]):
+        """
+        :param unjudged: Endpoints without enough observations to compare
+        """
+        if unjudged:
+            log_yellow(
+                f'\n== {len(unjudged)} endpoints are not compared with '
+                f'baseline, they have fewer than '
+                f'{conf.regression_min_samples} observations in either run, '
+                f'see --repeat ==',
+            )
+            for endpoint in unjudged:
+                log_yellow(f'  {endpoint}')
+        if not regressions:
+            compared = ' among the compared endpoints' if unjudged else ''
+            log_green(f'\n== No latency regressions against baseline'
+                      f'{compared} ==')
+            return
+        log_red('\n== Latency regressions against baseline ==')
+        for regression in regressions:
+            details = '{:.2f}s -> {:.2f}s (+{:.0%}), p={:.3f}'.format(
+                regression.baseline_median, regression.current_median,
+                regression.slowdown, regression.p_value,
+            )
+            log(f'{regression.endpoint} - {details}')
+
+    @staticmethod
+    def print_http_timings_report(summaries: List['EndpointHttpSummary']):
+        if not summaries:
+            return
+        log('== HTTP phases per endpoint (median) ==')
+        for summary in sorted(summaries, key=lambda item: item.endpoint):
+            phases = ', '.join(
+                '{} {:.3f}s'.format(phase, seconds)
+                for phase, seconds in summary.phases.items()
+            )
+            log(f'{summary.endpoint} - {summary.runs_count} runs, '
+                f'{summary.requests_count} requests')
+            log('    {}; HTTP {:.3f}s, runtime {:.3f}s'.format(
+                phases, summary.http, summary.runtime,
+            ))
+
+    @staticmethod
+    def print_throttle_report(metrics: Dict[str, 'ThrottleMetrics']):
+        if not metrics:
+            return
+        log('\n== Rate limiting ==')
+        for host, host_metrics in sorted(metrics.items()):
+            log(f'{host}: {host_metrics.requests} requests, '
+                f'{host_metrics.throttled} throttled (429/503), '
+                f'{host_metrics.retries} retries')
+            log('    concurrency limit {:.1f} (min {:.1f}, max {:.1f}), '
+                '{} increases, {} decreases, waited {:.2f}s'.format(
+                    host_metrics.limit, host_metrics.min_limit,
+                    host_metrics.max_limit, host_metrics.increases,
+                    host_metrics.decreases, host_metrics.wait_time,
+                ))
+
+    @staticmethod
+    def show_resumed(
+            restored: int,
+            leftover_resources: int,
+            pending_removals: int):
+        log(f'Resuming: {restored} results are taken from the checkpoint, '
+            f'{leftover_resources} leftover resources will be removed, '
+            f'{pending_removals} DELETE samples are run first for the '
+            f'unfinished resources\n')
+
+    @staticmethod
+    def show_not_removed(test_result: ApiTestResult):
+        sample = test_result.sample
+        log_yellow(f'Resource left by an earlier run is not removed: '
+                   f'{sample.lang.value} {sample.http_method.value} '
+                   f'{sample.name} failed')
+
+    @staticmethod
+    def show_capture_removal(removers: int, resources: int):
+        log(f'Removing what the previous capture has left: {removers} DELETE '
+            f'samples are run, {resources} prerequisite resources are '
+            f'removed\n')
+
+    @staticmethod
+    def show_deadline_reached():
+        log_yellow('\nTime budget is running out: other samples are not run, '
+                   'only the created resources are removed')
+
+    @staticmethod
+    def show_read_only(selected: int, missing: List[CodeSample]):
+        log(f'Read-only run: {selected} GET samples with captured '
+            f'substitutions')
+        if missing:
+            log_yellow(f'{len(missing)} GET samples were not captured and '
+                       f'are not run:')
+            for sample in missing:
+                log_yellow(f'  {sample.lang.value}: {sample.name}')
+        log('')
+
+    @staticmethod
+    def print_selection(selection: 'Selection', explain: bool):
+        from samples_validator.selection import describe
+
+        if not selection.added:
+            if explain:
+                log('Selected samples need no others\n')
+            return
+        log(f'{len(selection.added)} samples are added to the selected ones, '
+            f'they are needed for substitutions')
+        if not explain:
+            log('')
+            return
+        for sample, reasons in selection.added:
+            log(f'  + {describe(sample)}')
+            for reason in reasons:
+                log(f'      {reason}')
+        log('')
+
+    @staticmethod
+    def print_shard_plan(plan: 'ShardPlan'):
+        cost_unit = 's' if plan.historical else ' samples'
+        log(f'== Shard {plan.shard} ==')
+        for index, units in enumerate(plan.units):
+            mark = '*' if index == plan.shard.index - 1 else ' '
+            log('{} {}/{}: {} subtrees, cost {:.1f}{}'.format(
+                mark, index + 1, plan.shard.count, len(units),
+                plan.cost_of(index), cost_unit,
+            ))
+        for unit in sorted(plan.units[plan.shard.index - 1],
+                           key=lambda unit: unit.position):
+            log(f'    {unit.name} ({len(unit.samples)} samples)')
+        log('')
+
+    @staticmethod
+    def print_preflight_report(report: 'PreflightReport'):
+        log('== Pre-flight check ==')
+        for failure in report.failures:
+            sample = failure.sample
+            log_red(f'{sample.lang.value} {sample.http_method.value} '
+                    f'{sample.name}: {failure.message}')
+        for lang in sorted(report.unavailable, key=lambda lang: lang.value):
+            log_yellow(f'{lang.value}: the checker is not installed, samples '
+                       f'are not checked')
+        summary = (
+            f'{report.checked} of {report.total} samples checked, '
+            f'{len(report.failures)} failed\n'
+        )
+        if report.passed:
+            log_green(summary)
+        else:
+            log_red(summary)
+
+    @staticmethod
+    def print_proxy_report(proxy: 'RecordingProxy'):
+        if not proxy.replay:
+            log(f'\nRecorded {len(proxy.exchanges)} requests to '
+                f'{proxy.har_path}')
+            return
+        cassette = proxy.cassette
+        log(f'\nReplayed {cassette.served} requests from {proxy.har_path}')
+        if cassette.missing:
+            log(f'{len(cassette.missing)} requests were not recorded:')
+            for method, path in sorted(set(cassette.missing)):
+                log(f'    {method} {path}')
+
+    @staticmethod
+    def print_profile_summary(summary: 'ProfileSummary'):
+        log('\n== Profile of the validator ==')
+        log('Wall time: {:.2f}s, validator CPU time: {:.2f}s'.format(
+            summary.wall_time, summary.cpu_time,
+        ))
+        log('Waiting for samples: {:.2f}s, overhead: {:.2f}s'.format(
+            summary.child_wait, summary.overhead,
+        ))
+        for command, (count, total) in sorted(summary.child_waits.items()):
+            log(f'    {command}: {count} runs, {total:.2f}s')
+        log('Peak traced memory: {:.1f} MiB'.format(
+            summary.peak_memory / 2 ** 20,
+        ))
+        if summary.samples_count:
+            log(f'Stack samples: {summary.samples_count}')
+        log(f'Reports are saved to {summary.output_dir}')
+
+    @staticmethod
+    def print_execution_plan(plan: 'ExecutionPlan'):
+        from samples_validator.stats import sample_key
+
+        log('== Execution plan ==')
+        for number, level in enumerate(plan.levels):
+            log(f'-- Level {number}: {len(level)} samples --')
+            for sample in level:
+                log(sample_key(sample))
+                for dependency in plan.dependencies_of(sample):
+                    producer = sample_key(dependency.producer)
+                    log(f'    <- {producer} ({dependency.reason})')
+        if plan.unresolved:
+            log_yellow('\n== Placeholders without producer ==')
+            for sample, key in plan.unresolved:
+                log(f'{sample_key(sample)}: {{{key}}}')
+
+        log('\n== Critical path ==')
+        for sample in plan.critical_path:
+            log(sample_key(sample))
+        if plan.estimated:
+            duration = '~{:.1f}s'.format(plan.critical_path_duration)
+        else:
+            duration = 'no latency history'
+        log(f'\n{len(plan.samples)} samples, '
+            f'{len(plan.dependencies)} dependencies, '
+            f'critical path: {len(plan.critical_path)} samples ({duration}), '
+            f'max parallelism: {plan.max_parallelism}')
+
+    @staticmethod
+    def show_targets_run(targets: List[str]):
+        log(f'======== Targets: {", ".join(targets)} ========')
+
+    def print_targets_report(
+            self,
+            results_by_target: Dict[str, List[ApiTestResult]]):
+        """
+        Results of every sample side by side. Durations are compared with
+        the first target
+        """
+        from samples_validator.stats import sample_key
+
+        targets = list(results_by_target)
+        rows: Dict[str, Dict[str, ApiTestResult]] = {}
+        for target, test_results in results_by_target.items():
+            failures = [res for res in test_results if not res.passed]
+            if failures:
+                log(f'\n== Target: {target} ==')
+            for test_result in failures:
+                self._explain_in_details(test_result)
+            for test_result in test_results:
+                key = sample_key(test_result.sample)
+                rows.setdefault(key, {})[target] = test_result
+
+        log('\n== Results per target ==')
+        for key, by_target in rows.items():
+            reference = by_target.get(targets[0])
+            cells = [
+                self._describe_target_result(
+                    target, by_target.get(target), reference,
+                )
+                for target in targets
+            ]
+            log(f'{key} | {" | ".join(cells)}')
+
+        log('')
+        for target, test_results in results_by_target.items():
+            failed_count = sum(1 for res in test_results if res.failed)
+            log_fn = log_red if failed_count else log_green
+            log_fn('== {}: {} total, {} passed, {} failed, {} ignored, '
+                   'time spent {:.1f}s =='.format(
+                       target,
+                       len(test_results),
+                       sum(1 for res in test_results if res.passed),
+                       failed_count,
+                       sum(1 for res in test_results if res.ignored),
+                       sum(res.duration for res in test_results),
+                   ))
+
+    @staticmethod
+    def _describe_target_result(
+            target: str,
+            test_result: Optional[ApiTestResult],
+            reference: Optional[ApiTestResult]) -> str:
+        if test_result is None:
+            return f'{target}: -'
+        description = '{}: {} {:.2f}s'.format(
+            target, status_label(test_result), test_result.duration,
+        )
+        if (reference is not None and test_result is not reference
+                and reference.duration):
+            description += ' ({:+.0%})'.format(
+                test_result.duration / reference.duration - 1,
+            )
+        return description
+
+    @staticmethod
+    def show_load_run(repeat: int, concurrency: int):
+        log(f'======== Load: {repeat} iterations, '
+            f'concurrency {concurrency} ========')
+
+    @staticmethod
+    def show_load_parallelism(parallelism: int):
+        log_yellow(f'Only {parallelism} iterations can run at the same time: '
+                   f'iterations of the samples creating resources run one '
+                   f'after another')
+
+    @staticmethod
+    def print_load_report(
+            summaries: List['EndpointLoadSummary'],
+            wall_time: float):
+        log('\n== Latency per endpoint ==')
+        for summary in sorted(
+                summaries, key=lambda item: (item.lang.value, item.endpoint)):
+            details = (
+                '{} req, {} failed, {:.1f} req/s, '
+                'p50 {:.2f}s, p95 {:.2f}s, p99 {:.2f}s'.format(
+                    summary.requests_count, summary.failed_count,
+                    summary.throughput, summary.p50, summary.p95, summary.p99,
+                )
+            )
+            log(f'{summary.lang.value} - {summary.endpoint} - {details}')
+        requests_count = sum(summary.requests_count for summary in summaries)
+        failed_count = sum(summary.failed_count for summary in summaries)
+        throughput = requests_count / wall_time if wall_time else 0.0
+        log_fn = log_red if failed_count else log_green
+        log_fn('\n== Throughput: {} requests in {:.1f}s, {:.1f} req/s, '
+               '{} failed =='.format(
+                   requests_count, wall_time, throughput, failed_count,
+               ))
+
+    @staticmethod
+    def print_load_errors(crashes: List['IterationError'], repeat: int):
+        if not crashes:
+            return
+        log_red('\n== Crashed iterations ==')
+        for error in crashes:
+            log_red(
+                f'{error.chain.name}: iteration {error.iteration} of '
+                f'{repeat} crashed, the rest are not run: {error.error!r}',
+            )
+
     @staticmethod
     def show_language_scope_run(lang: Language):
         pretty_name = {
@@ -185,10 +539,4 @@ class Reporter:
 
     @staticmethod
     def show_test_is_running(sample: CodeSample):
-        message = '{:>6}: {}'.format(sample.http_method.value, sample.name)
-        terminal_width = get_terminal_size((100, 20)).columns
-        spaces = 2
-        status_len = 8
-        dots_count = terminal_width - len(message) - spaces - status_len
-        dots = '.' * dots_count if dots_count > 0 else ''
-        log(f'{message} {dots} ', no_new_line=True)
+        CONSOLE.sample_started(sample)
@@ -1,37 +1,83 @@
 import json
 import os
 import re
-import sys
+import tempfile
 import time
 from abc import abstractmethod
-from logging import StreamHandler
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Optional, Tuple
+from typing import Collection, Dict, Optional, Tuple
 
 from samples_validator import errors
-from samples_validator.base import ApiTestResult, CodeSample, SystemCmdResult
+from samples_validator.base import (
+    ApiTestResult, CodeSample, Phase, SystemCmdResult, add_slots,
+)
 from samples_validator.conf import conf
-from samples_validator.utils import parse_edn_spec_file
+from samples_validator.http_timings import parse_http_timings
+from samples_validator.throttle import THROTTLE
+from samples_validator.utils import load_spec_examples
 
-APP_LOG_HANDLER = StreamHandler(sys.stdout)
+
+@add_slots
+@dataclass
+class SampleExecution:
+    """Sample which has been run, but its output isn't checked yet"""
+    sample: CodeSample
+    # None if the sample timed out
+    cmd_result: Optional[SystemCmdResult]
+    source_code: Optional[str]
+    duration: float
+    timeout: float
+    phases: Dict[Phase, float]
 
 
 class CodeRunner(object):
 
-    def __init__(self):
+    def __init__(
+            self,
+            substitutions: Optional[Dict[str, str]] = None,
+            url: Optional[str] = None):
+        """
+        :param substitutions: Static substitutions, the configured ones are
+            used by default
+        :param url: API url the samples request, the configured by default.
+            Runs are throttled per its host
+        """
+        self.substitutions = substitutions
+        self.url = url
         self.tmp_sample_path: Optional[Path] = None
 
+    def _hook_env(self) -> Optional[Dict[str, str]]:
+        """
+        Environment making the samples report timings of HTTP requests,
+        None if there is nothing to add
+        """
+        return None
+
     @abstractmethod
     def _run_sample(
             self,
-            sample_path: str) -> SystemCmdResult:
+            sample_path: str,
+            timeout: Optional[float] = None) -> SystemCmdResult:
         """Language-specific method which runs corresponding system command
         :returns Wrapper over system command result
         """
 
     @abstractmethod
-    def _parse_stdout(self, stdout: str) -> Tuple[dict, int]:
+    def _run_sample_code(
+            self,
+            source_code: str,
+            timeout: Optional[float] = None) -> SystemCmdResult:
+        """The same as `_run_sample`, but the code is passed via stdin"""
+
+    @abstractmethod
+    def _parse_stdout(
+            self,
+            stdout: str,
+            keys: Optional[Collection[str]] = None) -> Tuple[dict, int]:
         """Parse stdout of system command
+        :param keys: Keep only these top-level fields of the response,
+            keep everything if None
         :returns JSON response of HTTP request and status code
         """
 
@@ -42,56 +88,204 @@ class CodeRunner(object):
             substitutions: Optional[Dict[str, str]] = None) -> Path:
         """Sample preparation"""
 
-    def _cleanup(self, sample: CodeSample):
-        if (self.tmp_sample_path
-                and self.tmp_sample_path.exists()
-                and self.tmp_sample_path != sample.path):
-            os.remove(self.tmp_sample_path.as_posix())
+    def render_sample(
+            self,
+            path: Path,
+            substitutions: Optional[Dict[str, str]] = None) -> str:
+        """Source code of the sample with all the substitutions made"""
+        return self.replace_keywords(
+            path.read_text(), substitutions, self.substitutions,
+        )
+
+    @staticmethod
+    def _make_tmp_sample_path(
+            directory: Optional[Path] = None,
+            name: str = 'sample') -> Path:
+        """Unique file for a prepared sample, so several samples of the same
+        language can be executed simultaneously
+        """
+        stem, suffix = os.path.splitext(name)
+        fd, path = tempfile.mkstemp(
+            prefix=f'{stem}-', suffix=suffix,
+            dir=(directory or Path(tempfile.gettempdir())).as_posix(),
+        )
+        os.close(fd)
+        return Path(path)
+
+    def _cleanup(self, sample: CodeSample, tmp_sample_path: Path):
+        if tmp_sample_path.exists() and tmp_sample_path != sample.path:
+            os.remove(tmp_sample_path.as_posix())
 
     def run_sample(
             self,
             sample: CodeSample,
-            substitutions: Optional[Dict[str, str]] = None) -> ApiTestResult:
-        _substitutions = self.get_substitutions_from_spec(sample)
+            substitutions: Optional[Dict[str, str]] = None,
+            timeout: Optional[float] = None,
+            response_keys: Optional[Collection[str]] = None) -> ApiTestResult:
+        start_time = time.time()
+        spec_substitutions = self.get_substitutions_from_spec(sample)
+        execution = self.execute_sample(
+            sample, spec_substitutions, substitutions, timeout, start_time,
+        )
+        return self.check_output(execution, response_keys)
+
+    def execute_sample(
+            self,
+            sample: CodeSample,
+            spec_substitutions: Dict[str, str],
+            substitutions: Optional[Dict[str, str]] = None,
+            timeout: Optional[float] = None,
+            start_time: Optional[float] = None) -> SampleExecution:
+        """
+        Make the substitutions and run the sample, the output isn't checked
+
+        :param spec_substitutions: Result of `get_substitutions_from_spec`,
+            it doesn't depend on other samples, so it can be made in advance
+        :param substitutions: Substitutions from the previous responses
+        :param start_time: When preparation of the sample started
+        """
+        start_time = start_time or time.time()
+        _substitutions = dict(spec_substitutions)
         _substitutions.update(substitutions or {})
-        self.tmp_sample_path = self.prepare_sample(sample.path, _substitutions)
+        timeout = timeout or conf.sample_timeout
+        if conf.stdin_execution:
+            source_code = self.render_sample(sample.path, _substitutions)
+            prepare_time = time.time() - start_time
+            cmd_result, duration = self._execute_throttled(
+                sample, None, timeout, source_code,
+            )
+        else:
+            tmp_sample_path = self.prepare_sample(sample.path, _substitutions)
+            prepare_time = time.time() - start_time
+            # the last prepared sample, handy for debugging
+            self.tmp_sample_path = tmp_sample_path
+            try:
+                cmd_result, duration = self._execute_throttled(
+                    sample, tmp_sample_path, timeout,
+                )
+                source_code = tmp_sample_path.read_text()
+            finally:
+                self._cleanup(sample, tmp_sample_path)
+        return SampleExecution(
+            sample=sample,
+            cmd_result=cmd_result,
+            source_code=source_code,
+            duration=duration,
+            timeout=timeout,
+            phases={Phase.prepare: prepare_time, Phase.execute: duration},
+        )
+
+    def _execute_throttled(
+            self,
+            sample: CodeSample,
+            tmp_sample_path: Optional[Path],
+            timeout: float,
+            source_code: Optional[str] = None,
+    ) -> Tuple[Optional[SystemCmdResult], float]:
+        """Run the sample again if the API responded with 429 or 503"""
+        return THROTTLE.call(
+            self.url or conf.api_url,
+            lambda: self._execute(tmp_sample_path, timeout, source_code),
+            lambda result: self._peek_status_code(result[0]),
+            endpoint=f'{sample.lang.value} {sample.http_method.value} '
+                     f'{sample.name}',
+        )
+
+    def _peek_status_code(
+            self,
+            cmd_result: Optional[SystemCmdResult]) -> Optional[int]:
+        if cmd_result is None or cmd_result.exit_code != 0:
+            return None
         try:
-            api_test_result = self.analyze_result(sample)
-            api_test_result.source_code = self.tmp_sample_path.read_text()
-            return api_test_result
-        finally:
-            self._cleanup(sample)
+            # nothing is kept from the response body
+            _, status_code = self._parse_stdout(cmd_result.stdout, ())
+        except errors.OutputParsingError:
+            return None
+        return status_code
 
-    def analyze_result(self, sample: CodeSample) -> ApiTestResult:
+    def _execute(
+            self,
+            tmp_sample_path: Optional[Path],
+            timeout: float,
+            source_code: Optional[str] = None,
+    ) -> Tuple[Optional[SystemCmdResult], float]:
+        """
+        :returns Command result, None if the sample timed out, and duration
+        """
         start_time = time.time()
         try:
-            cmd_result = self._run_sample(str(self.tmp_sample_path))
+            if source_code is not None:
+                cmd_result = self._run_sample_code(source_code, timeout)
+            else:
+                cmd_result = self._run_sample(str(tmp_sample_path), timeout)
         except errors.ExecutionTimeout:
+            return None, timeout
+        return cmd_result, time.time() - start_time
+
+    def check_output(
+            self,
+            execution: SampleExecution,
+            response_keys: Optional[Collection[str]] = None) -> ApiTestResult:
+        """
+        Make the test result from the output of the executed sample
+
+        :param response_keys: Keep only these top-level fields of the
+            response, keep everything if None
+        """
+        cmd_result = execution.cmd_result
+        http = None
+        if cmd_result is not None and conf.http_timings:
+            http, stderr = parse_http_timings(cmd_result.stderr)
+            cmd_result = SystemCmdResult(
+                cmd_result.exit_code, cmd_result.stdout, stderr,
+            )
+        test_result = self._check_output(execution, cmd_result, response_keys)
+        test_result.http = http
+        return test_result
+
+    def _check_output(
+            self,
+            execution: SampleExecution,
+            cmd_result: Optional[SystemCmdResult],
+            response_keys: Optional[Collection[str]]) -> ApiTestResult:
+        sample = execution.sample
+        duration = execution.duration
+        timeout = execution.timeout
+        phases = dict(execution.phases)
+        if cmd_result is None:
             return ApiTestResult(
                 sample, passed=False, reason=errors.ExecutionTimeout,
-                duration=conf.sample_timeout,
+                duration=timeout, timeout=timeout,
+                source_code=execution.source_code, phases=phases,
             )
-        duration = time.time() - start_time
 
         if cmd_result.exit_code != 0:
             return ApiTestResult(
                 sample, passed=False, reason=errors.NonZeroExitCode,
-                cmd_result=cmd_result, duration=duration,
+                cmd_result=cmd_result, duration=duration, timeout=timeout,
+                source_code=execution.source_code, phases=phases,
             )
 
+        parse_start_time = time.time()
         try:
-            json_body, status_code = self._parse_stdout(cmd_result.stdout)
+            json_body, status_code = self._parse_stdout(
+                cmd_result.stdout, response_keys,
+            )
         except errors.OutputParsingError as exc:
+            phases[Phase.parse] = time.time() - parse_start_time
             return ApiTestResult(
                 sample, passed=False, reason=exc.__class__,
-                cmd_result=cmd_result, duration=duration,
+                cmd_result=cmd_result, duration=duration, timeout=timeout,
+                source_code=execution.source_code, phases=phases,
             )
+        phases[Phase.parse] = time.time() - parse_start_time
 
         if status_code >= 400:
             return ApiTestResult(
                 sample, passed=False, reason=errors.BadRequest,
                 cmd_result=cmd_result, json_body=json_body,
-                status_code=status_code, duration=duration,
+                status_code=status_code, duration=duration, timeout=timeout,
+                source_code=execution.source_code, phases=phases,
             )
 
         return ApiTestResult(
@@ -102,16 +296,22 @@ class CodeRunner(object):
             sample=sample,
             cmd_result=cmd_result,
             duration=duration,
+            timeout=timeout,
+            source_code=execution.source_code,
+            phases=phases,
         )
 
     @staticmethod
     def replace_keywords(
             text: str,
-            subs: Optional[Dict[str, str]] = None) -> str:
+            subs: Optional[Dict[str, str]] = None,
+            static_subs: Optional[Dict[str, str]] = None) -> str:
+        if static_subs is None:
+            static_subs = conf.substitutions
         if subs is None:
-            subs = conf.substitutions.copy() or {}
+            subs = static_subs.copy() or {}
         else:
-            subs.update(conf.substitutions or {})
+            subs.update(static_subs or {})
 
         for replace_from, replace_to in subs.items():
             text = text.replace(replace_from, str(replace_to))
@@ -121,7 +321,7 @@ class CodeRunner(object):
     def get_substitutions_from_spec(sample: CodeSample) -> dict:
         edn_path = sample.path.parent / 'debug.edn'
         source_code = sample.path.read_text()
-        examples = parse_edn_spec_file(edn_path)
+        examples = load_spec_examples(edn_path)
         substitutions = {}
         re_json_curl = r'\\"(\w+?)\\": ?\\"<(.+?)>\\"'
         re_arrays_curl = r'\\"(\w+?)\\": ?(\[.+?\])'
@@ -3,19 +3,24 @@ import os
 import shutil
 import tempfile
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Collection, Dict, Optional
 
 from samples_validator import errors
 from samples_validator.base import run_shell_command
 from samples_validator.conf import conf
+from samples_validator.http_timings import NODE_HOOK_PATH
+from samples_validator.json_fields import extract_fields, select_fields
 from samples_validator.reporter import debug
 from .base import CodeRunner
 
 
 class NodeRunner(CodeRunner):
 
-    def __init__(self):
-        super().__init__()
+    def __init__(
+            self,
+            substitutions: Optional[Dict[str, str]] = None,
+            url: Optional[str] = None):
+        super().__init__(substitutions, url)
         tmp_path = Path(tempfile.gettempdir())
         self._project_dir_path = tmp_path / conf.js_project_dir_name
         self._node_modules_path = self._project_dir_path / 'node_modules'
@@ -25,10 +30,10 @@ class NodeRunner(CodeRunner):
             self,
             path: Path,
             substitutions: Optional[Dict[str, str]] = None) -> Path:
-        tmp_sample_path: Path = self._project_dir_path / 'sample.js'
-        sample_code = path.read_text()
-        prepared_code = self.replace_keywords(sample_code, substitutions)
-        tmp_sample_path.write_text(prepared_code)
+        tmp_sample_path = self._make_tmp_sample_path(
+            self._project_dir_path, 'sample.js',
+        )
+        tmp_sample_path.write_text(self.render_sample(path, substitutions))
         return tmp_sample_path
 
     def _install_node_modules_if_needed(self):
@@ -45,25 +50,49 @@ class NodeRunner(CodeRunner):
                 cwd=self._project_dir_path,
             )
 
-    def _run_sample(self, sample_path: str):
-        if self.tmp_sample_path is None:
-            raise ValueError('Temporary sample was not created')
+    def _hook_env(self) -> Optional[Dict[str, str]]:
+        if not conf.http_timings:
+            return None
+        options = f"{os.environ.get('NODE_OPTIONS', '')} --require"
+        return {'NODE_OPTIONS': f'{options} {NODE_HOOK_PATH}'.strip()}
+
+    def _run_sample(self, sample_path: str, timeout: Optional[float] = None):
         node_bin = 'node'
         return run_shell_command(
             [node_bin, sample_path],
+            timeout=timeout,
+            cwd=self._project_dir_path,
+            env=self._hook_env(),
+        )
+
+    def _run_sample_code(
+            self,
+            source_code: str,
+            timeout: Optional[float] = None):
+        # modules are resolved relative to the working directory
+        node_bin = 'node'
+        return run_shell_command(
+            [node_bin, '-'],
+            timeout=timeout,
             cwd=self._project_dir_path,
+            input=source_code,
+            env=self._hook_env(),
         )
 
-    def _parse_stdout(self, stdout: str):
+    def _parse_stdout(
+            self,
+            stdout: str,
+            keys: Optional[Collection[str]] = None):
         try:
             raw_result = json.loads(stdout.strip(), encoding='utf8')
             status_code = raw_result['code']
             if status_code == 204:
                 return None, status_code
-            elif isinstance(raw_result['raw_body'], dict):
-                return raw_result['raw_body'], status_code
+            raw_body = raw_result['raw_body']
+            if isinstance(raw_body, dict):
+                return select_fields(raw_body, keys), status_code
             else:
-                return json.loads(raw_result['raw_body']), status_code
+                return extract_fields(raw_body, keys), status_code
         except json.JSONDecodeError:
             raise errors.OutputParsingError
         except KeyError:
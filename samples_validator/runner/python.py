@@ -1,23 +1,27 @@
 import ast
 import json
+import os
 import shutil
 import tempfile
 from pathlib import Path
-from typing import Dict, Optional
-
-import virtualenv
+from typing import Collection, Dict, Optional
 
 from samples_validator import errors
 from samples_validator.base import run_shell_command
 from samples_validator.conf import conf
+from samples_validator.http_timings import PYTHON_HOOK_PATH
+from samples_validator.json_fields import extract_fields, select_fields
 from samples_validator.reporter import debug
 from .base import CodeRunner
 
 
 class PythonRunner(CodeRunner):
 
-    def __init__(self):
-        super().__init__()
+    def __init__(
+            self,
+            substitutions: Optional[Dict[str, str]] = None,
+            url: Optional[str] = None):
+        super().__init__(substitutions, url)
         tmp_path = Path(tempfile.gettempdir())
         self._virtualenv_path = tmp_path / conf.virtualenv_name
         self._python_path = self._virtualenv_path / 'bin' / 'python'
@@ -27,10 +31,8 @@ class PythonRunner(CodeRunner):
             self,
             path: Path,
             substitutions: Optional[Dict[str, str]] = None) -> Path:
-        tmp_sample_path = Path(tempfile.gettempdir()) / 'sample.py'
-        sample_code = path.read_text()
-        prepared_code = self.replace_keywords(sample_code, substitutions)
-        tmp_sample_path.write_text(prepared_code)
+        tmp_sample_path = self._make_tmp_sample_path(name='sample.py')
+        tmp_sample_path.write_text(self.render_sample(path, substitutions))
         return tmp_sample_path
 
     def _create_virtualenv_if_needed(self):
@@ -38,6 +40,8 @@ class PythonRunner(CodeRunner):
             debug(f'Removing virtualenv: {self._virtualenv_path}')
             shutil.rmtree(self._virtualenv_path.as_posix())
         if not self._python_path.exists():
+            import virtualenv
+
             debug(f'Creating virtualenv: {self._virtualenv_path}')
             virtualenv.create_environment(self._virtualenv_path.as_posix())
             self._install_python_packages()
@@ -50,12 +54,36 @@ class PythonRunner(CodeRunner):
             timeout=conf.virtualenv_creation_timeout,
         )
 
-    def _run_sample(self, sample_path: str):
-        return run_shell_command([
-            self._python_path.as_posix(), sample_path,
-        ])
+    def _hook_env(self) -> Optional[Dict[str, str]]:
+        if not conf.http_timings:
+            return None
+        python_path = [str(PYTHON_HOOK_PATH)]
+        if os.environ.get('PYTHONPATH'):
+            python_path.append(os.environ['PYTHONPATH'])
+        return {'PYTHONPATH': os.pathsep.join(python_path)}
+
+    def _run_sample(self, sample_path: str, timeout: Optional[float] = None):
+        return run_shell_command(
+            [self._python_path.as_posix(), sample_path],
+            timeout=timeout,
+            env=self._hook_env(),
+        )
 
-    def _parse_stdout(self, stdout: str):
+    def _run_sample_code(
+            self,
+            source_code: str,
+            timeout: Optional[float] = None):
+        return run_shell_command(
+            [self._python_path.as_posix(), '-'],
+            timeout=timeout,
+            input=source_code,
+            env=self._hook_env(),
+        )
+
+    def _parse_stdout(
+            self,
+            stdout: str,
+            keys: Optional[Collection[str]] = None):
         try:
             raw_result = ast.literal_eval(stdout.strip())
             status_code = raw_result['code']
@@ -68,8 +96,8 @@ class PythonRunner(CodeRunner):
         try:
             raw_body = raw_result['raw_body']
             if isinstance(raw_body, dict):
-                return raw_result['raw_body'], status_code
+                return select_fields(raw_body, keys), status_code
             else:
-                return json.loads(raw_body), status_code
+                return extract_fields(raw_body, keys), status_code
         except (KeyError, json.JSONDecodeError):
             raise errors.ConformToSchemaError
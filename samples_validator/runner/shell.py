@@ -1,11 +1,13 @@
 import json
 import re
-import tempfile
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Collection, Dict, Optional
 
 from samples_validator import errors
 from samples_validator.base import run_shell_command
+from samples_validator.conf import conf
+from samples_validator.http_timings import curl_home
+from samples_validator.json_fields import extract_fields
 from .base import CodeRunner
 
 
@@ -15,17 +17,35 @@ class CurlRunner(CodeRunner):
             self,
             path: Path,
             substitutions: Optional[Dict[str, str]] = None) -> Path:
-        tmp_sample_path = Path(tempfile.gettempdir()) / 'curl'
-        sample_code = path.read_text()
-        prepared_code = self.replace_keywords(sample_code, substitutions)
-        tmp_sample_path.write_text(prepared_code)
+        tmp_sample_path = self._make_tmp_sample_path(name='curl')
+        tmp_sample_path.write_text(self.render_sample(path, substitutions))
         return tmp_sample_path
 
-    def _run_sample(self, sample_path: str):
+    def _hook_env(self) -> Optional[Dict[str, str]]:
+        if not conf.http_timings:
+            return None
+        return {'CURL_HOME': str(curl_home())}
+
+    def _run_sample(self, sample_path: str, timeout: Optional[float] = None):
         bash_bin = '/bin/bash'
-        return run_shell_command([bash_bin, sample_path])
+        return run_shell_command(
+            [bash_bin, sample_path], timeout=timeout, env=self._hook_env(),
+        )
 
-    def _parse_stdout(self, stdout: str):
+    def _run_sample_code(
+            self,
+            source_code: str,
+            timeout: Optional[float] = None):
+        bash_bin = '/bin/bash'
+        return run_shell_command(
+            [bash_bin, '-s'], timeout=timeout, input=source_code,
+            env=self._hook_env(),
+        )
+
+    def _parse_stdout(
+            self,
+            stdout: str,
+            keys: Optional[Collection[str]] = None):
         status_code = None
         try:
             match = re.match(r'HTTP.*? (?P<code>\d+) ', stdout.strip())
@@ -37,7 +57,7 @@ class CurlRunner(CodeRunner):
                 return None, status_code
             raise errors.OutputParsingError
         try:
-            json_body = json.loads(body)
+            json_body = extract_fields(body, keys)
         except json.JSONDecodeError:
             raise errors.OutputParsingError
         return json_body, status_code
@@ -0,0 +1,103 @@
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Set, Union
+
+from pydantic import BaseModel
+
+
+def _from_env(value: Any, missing_variables: Set[str]) -> Any:
+    """Value of the environment variable if the value looks like '$VAR'"""
+    if isinstance(value, str) and value.startswith('$'):
+        real_value = os.environ.get(value[1:])
+        if real_value is not None:
+            return real_value
+        missing_variables.add(value[1:])
+    return value
+
+
+class Target(BaseModel):
+    api_url: str
+    access_token: str
+    substitutions: Dict[str, str] = {}
+
+
+class Config(BaseModel):
+    api_url: str
+    access_token: str
+    sample_timeout: int = 5
+    sample_timeouts: Dict[str, Dict[str, float]] = {}
+    adaptive_timeout: bool = True
+    adaptive_timeout_factor: float = 3.0
+    adaptive_timeout_min: float = 1.0
+    adaptive_timeout_max: float = 30.0
+    adaptive_timeout_min_samples: int = 5
+    latency_stats_file: str = '.pot-svt-stats.json'
+    latency_stats_window: int = 100
+    checkpoint_file: str = '.pot-svt-checkpoint.jsonl'
+    deadline_margin: float = 30.0
+    regression_threshold: float = 0.2
+    regression_alpha: float = 0.05
+    regression_min_samples: int = 3
+    virtualenv_creation_timeout: int = 120
+    virtualenv_name: str = '.pot-svt-env'
+    js_project_dir_name: str = '.pot-node'
+    substitutions: Dict[str, str] = {}
+    resp_attr_replacements: Dict[str, List[dict]] = {}
+    always_create_environments: bool = False
+    stdin_execution: bool = False
+    pipeline: bool = False
+    pipeline_prepare_workers: int = 2
+    pipeline_queue_size: int = 8
+    http_timings: bool = False
+    skip_blocked: bool = True
+    fail_on_skipped: bool = False
+    throttle: bool = False
+    throttle_rate: float = 10.0
+    throttle_burst: int = 10
+    throttle_max_concurrency: int = 16
+    throttle_retries: int = 3
+    throttle_backoff: float = 1.0
+    preflight_workers: int = 0
+    metrics_buckets: List[float] = [
+        0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+    ]
+    daemon_poll_interval: float = 1.0
+    daemon_debounce: float = 0.3
+    debug: bool = False
+    before_sample: Dict[str, List[dict]] = {}
+    ignore_failures: Dict[str, List[str]] = {}
+    targets: Dict[str, Target] = {}
+
+    def reload(self, path: Path):
+        from samples_validator.conf import load_config
+
+        new_conf = load_config(path)
+        for name, value in new_conf:
+            setattr(self, name, value)
+        self._replace_env_vars()
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        self._replace_env_vars()
+
+    def _replace_env_vars(self, raise_error: bool = False):
+        if self.substitutions is None:
+            return
+        missing_variables: Set[str] = set()
+        models: List[Union['Config', Target]] = [self, *self.targets.values()]
+        for model in models:
+            for key, value in model.substitutions.items():
+                model.substitutions[key] = _from_env(value, missing_variables)
+            for key in model.fields:
+                value = getattr(model, key)
+                real_value = _from_env(value, missing_variables)
+                if real_value is not value:
+                    setattr(model, key, real_value)
+        if missing_variables and raise_error:
+            variables = ', '.join(missing_variables)
+            raise ValueError(
+                f'Failed to find variables in the environment: {variables}',
+            )
+
+    def validate_environment(self):
+        self._replace_env_vars(raise_error=True)
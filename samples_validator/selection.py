@@ -0,0 +1,109 @@
+import fnmatch
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from samples_validator.base import CodeSample, HttpMethod
+from samples_validator.loader import sort_code_samples
+from samples_validator.utils import CodeSamplesTree
+
+REGEX_PREFIX = 're:'
+
+
+class Selector:
+    """
+    Pattern of sample names: a glob, e.g. `identity-api/*/{id}`, or a
+    regular expression after `re:`, which is searched in the name. It may
+    start with an HTTP method, e.g. `GET identity-api/*`
+    """
+
+    def __init__(self, pattern: str):
+        """
+        :raise ValueError: The regular expression is invalid
+        """
+        self.pattern = pattern
+        self.http_method: Optional[HttpMethod] = None
+        method, _, rest = pattern.partition(' ')
+        if rest and method.upper() in {item.value for item in HttpMethod}:
+            self.http_method = HttpMethod(method.upper())
+            pattern = rest.strip()
+        self._regex: Optional[re.Pattern] = None
+        self._glob: Optional[str] = None
+        if pattern.startswith(REGEX_PREFIX):
+            try:
+                self._regex = re.compile(pattern[len(REGEX_PREFIX):])
+            except re.error as e:
+                raise ValueError(f'Invalid expression {pattern!r}: {e}')
+        else:
+            self._glob = pattern
+
+    def matches(self, sample: CodeSample) -> bool:
+        if self.http_method and sample.http_method != self.http_method:
+            return False
+        if self._regex is not None:
+            return self._regex.search(sample.name) is not None
+        return fnmatch.fnmatchcase(sample.name, self._glob or '')
+
+    def __str__(self):
+        return self.pattern
+
+
+@dataclass
+class Selection:
+    samples: List[CodeSample]
+    # samples added to the selected ones, with the reasons
+    added: List[Tuple[CodeSample, List[str]]] = field(default_factory=list)
+
+
+def describe(sample: CodeSample) -> str:
+    return f'{sample.lang.value} {sample.http_method.value} {sample.name}'
+
+
+def select_samples(
+        samples: List[CodeSample],
+        keyword: str = '',
+        selectors: Optional[List[Selector]] = None) -> Selection:
+    """
+    Samples matching the keyword and any of the selectors, and the samples
+    they depend on: POST samples up their paths, whose responses are their
+    substitutions, and DELETE samples removing what the selected and added
+    POST samples create
+    """
+    selectors = selectors or []
+    selected = [
+        sample for sample in samples
+        if keyword in sample.name
+        and (not selectors or any(sel.matches(sample) for sel in selectors))
+    ]
+    if len(selected) == len(samples):
+        return Selection(samples)
+
+    tree = CodeSamplesTree()
+    for sample in samples:
+        tree.put(sample)
+    chosen = {id(sample) for sample in selected}
+    reasons: Dict[int, List[str]] = {}
+    extra: List[CodeSample] = []
+
+    def add(sample: CodeSample, reason: str):
+        if id(sample) in chosen:
+            return
+        if id(sample) not in reasons:
+            reasons[id(sample)] = []
+            extra.append(sample)
+        reasons[id(sample)].append(reason)
+
+    for sample in selected:
+        for producer in tree.get_producers(sample):
+            add(producer, f'creates the resource of {describe(sample)}')
+    producers = [
+        sample for sample in selected + extra
+        if sample.http_method == HttpMethod.post
+    ]
+    for producer in producers:
+        for remover in tree.get_removers(producer):
+            add(remover, f'removes what {describe(producer)} creates')
+    return Selection(
+        sort_code_samples(selected + extra),
+        [(sample, reasons[id(sample)]) for sample in extra],
+    )
@@ -1,73 +1,664 @@
-from typing import Dict, List
+import asyncio
+import contextlib
+import functools
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import (
+    AsyncIterator, Callable, Dict, Generator, List, Optional, Set, Tuple,
+    Union,
+)
 
-from samples_validator.base import ApiTestResult, CodeSample, Language
+from samples_validator import errors
+from samples_validator.base import (
+    ApiTestResult, CodeSample, HttpMethod, Language, Phase,
+)
+from samples_validator.checkpoint import Checkpoint
 from samples_validator.conf import conf
-from samples_validator.prerequisites.base import ResourceRegistry
+from samples_validator.deadline import Deadline
+from samples_validator.prerequisites.base import Resource, ResourceRegistry
+from samples_validator.readonly import Capture
 from samples_validator.reporter import Reporter
-from samples_validator.runner import CurlRunner, NodeRunner, PythonRunner
-from samples_validator.utils import TestExecutionResultMap
+from samples_validator.runner import (
+    CodeRunner, CurlRunner, NodeRunner, PythonRunner,
+)
+from samples_validator.stats import (
+    LatencyStats, PhaseMetrics, latency_stats_path, sample_key,
+)
+from samples_validator.utils import (
+    CodeSamplesTree, TestExecutionResultMap, collect_response_keys,
+)
+
+
+def make_runners(
+        substitutions: Optional[Dict[str, str]] = None,
+        url: Optional[str] = None,
+) -> Dict[Language, CodeRunner]:
+    return {
+        Language.js: NodeRunner(substitutions, url),
+        Language.python: PythonRunner(substitutions, url),
+        Language.shell: CurlRunner(substitutions, url),
+    }
+
+
+def remove_created(
+        created: List[ApiTestResult],
+        removers: List[CodeSample],
+        runners: Optional[Dict[Language, CodeRunner]] = None,
+        latency_stats: Optional[LatencyStats] = None) -> List[ApiTestResult]:
+    """
+    Run DELETE samples for the resources POST samples of another session
+    have created, substitutions are taken from the results of these POST
+    samples
+
+    :return: Results of the DELETE samples which failed
+    """
+    runners = runners or make_runners()
+    results_map = TestExecutionResultMap()
+    for test_result in created:
+        results_map.put(test_result)
+    failed = []
+    for sample in removers:
+        timeout = latency_stats.timeout_for(sample) if latency_stats else None
+        test_result = runners[sample.lang].run_sample(
+            sample, results_map.get_parent_body(sample, escaped=True),
+            timeout=timeout, response_keys=set(),
+        )
+        if not test_result.passed:
+            failed.append(test_result)
+    return failed
 
 
 class TestSession:
 
-    def __init__(self, samples: List[CodeSample]):
-        self.runners = {
-            Language.js: NodeRunner(),
-            Language.python: PythonRunner(),
-            Language.shell: CurlRunner(),
-        }
+    def __init__(
+            self,
+            samples: List[CodeSample],
+            runners: Optional[Dict[Language, CodeRunner]] = None,
+            latency_stats: Optional[LatencyStats] = None,
+            response_keys: Optional[Dict[str, Set[str]]] = None,
+            resource_registry: Optional[ResourceRegistry] = None,
+            checkpoint: Optional[Checkpoint] = None,
+            capture: Optional[Capture] = None,
+            captured: Optional[Dict[str, dict]] = None,
+            deadline: Optional[Deadline] = None):
+        """
+        :param checkpoint: Journal of the session, results restored from it
+            aren't run again
+        :param capture: Collect substitutions of GET samples, prerequisite
+            resources are left in place for them
+        :param captured: Substitutions by `sample_key` collected by a
+            capture, samples get them instead of running their parents and
+            making prerequisites
+        :param deadline: Time budget, samples which don't fit into it are
+            reported as unfinished
+        """
+        self.runners = runners or make_runners()
         self.samples = samples
+        if response_keys is None:
+            # DELETE samples left out of a capture are run by the next one
+            removers = capture.removers if capture is not None else []
+            response_keys = collect_response_keys(
+                samples + removers, conf.resp_attr_replacements,
+            )
+        self._response_keys = response_keys
         self._test_results_map = TestExecutionResultMap()
-        self._resource_registry = ResourceRegistry()
+        self._results_lock = threading.Lock()
+        self._checkpoint = checkpoint
+        self._capture = capture
+        self._captured = captured
+        self._deadline = deadline
+        # the deadline has stopped a sample, only cleanup is run since
+        self._out_of_time = False
+        # POST samples by the DELETE samples removing their resources, and
+        # the POST samples which have created them
+        self._creators = self._map_creators(samples) if deadline else {}
+        self._created: Set[int] = set()
+        # results of the interrupted session by `sample_key`
+        self._restored: Dict[str, ApiTestResult] = {}
+        self._resource_registry = resource_registry or ResourceRegistry(
+            checkpoint=checkpoint,
+        )
+        self._latency_stats = (
+            latency_stats or LatencyStats.load(latency_stats_path())
+        )
+        self.test_results: List[ApiTestResult] = []
+        self.metrics = PhaseMetrics()
+        self._cancelled = threading.Event()
 
     def run(self) -> int:
         reporter = Reporter()
+        results = self.execute()
+        self.save_latency_stats()
+        reporter.print_test_session_report(results)
+        failed_count = sum(1 for res in results if res.failed)
+        return failed_count
+
+    def save_latency_stats(self):
+        self._latency_stats.save()
+
+    def execute(self, verbose: bool = True) -> List[ApiTestResult]:
+        """
+        Run all the samples without printing the session report
+
+        :param verbose: Show progress of every sample
+        :return: Results of all the samples
+        """
+        return list(self.iter_results(verbose=verbose))
+
+    def iter_results(
+            self,
+            verbose: bool = False,
+    ) -> Generator[ApiTestResult, None, None]:
+        """
+        Run the samples yielding results as soon as they are ready.
+        Resources created for prerequisites are removed even if the caller
+        stops iterating early
+
+        :param verbose: Show progress of every sample
+        """
         samples_by_lang: Dict[Language, List[CodeSample]] = {
             Language.js: [],
             Language.python: [],
             Language.shell: [],
         }
-        results: List[ApiTestResult] = []
         for sample in self.samples:
             samples_by_lang[sample.lang].append(sample)
+        self.test_results = []
+        if verbose:
+            Reporter().show_session_start(len(self.samples))
+        self._begin_checkpoint()
 
         for lang in Language:
-            results.extend(
-                self.run_api_tests_for_lang(samples_by_lang[lang], lang),
+            if self.cancelled:
+                break
+            lang_results = self._iter_lang_results(
+                samples_by_lang[lang], lang, verbose=verbose,
             )
+            # closing the session closes the current language as well
+            with contextlib.closing(lang_results):
+                for test_result in lang_results:
+                    self.test_results.append(test_result)
+                    yield test_result
+        # unfinished samples are left in the journal for `--resume`
+        if (self._checkpoint is not None and not self.cancelled
+                and not self._out_of_time):
+            self._checkpoint.finish()
 
-        reporter.print_test_session_report(results)
-        failed_count = sum(1 for res in results if res.failed)
-        return failed_count
+    async def aiter_results(
+            self,
+            verbose: bool = False) -> AsyncIterator[ApiTestResult]:
+        """
+        The same as `iter_results`, but samples are run in a worker thread,
+        so the event loop isn't blocked
+        """
+        loop = asyncio.get_running_loop()
+        # one worker keeps the calls to the generator sequential
+        executor = ThreadPoolExecutor(max_workers=1)
+        results = self.iter_results(verbose=verbose)
+        try:
+            while True:
+                test_result = await loop.run_in_executor(
+                    executor, next, results, None,
+                )
+                if test_result is None:
+                    return
+                yield test_result
+        except (GeneratorExit, asyncio.CancelledError):
+            # the consumer has stopped before the end
+            self.cancel()
+            raise
+        finally:
+            # waits for the running sample, then cleans up the resources
+            await asyncio.shield(loop.run_in_executor(executor, results.close))
+            executor.shutdown(wait=False)
+
+    def cancel(self):
+        """
+        Stop the session after the currently running sample. It's safe to
+        call from any thread
+        """
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def prerequisites(self) -> List[Resource]:
+        """Resources created for prerequisites which aren't removed"""
+        return [
+            resource for resource in self._resource_registry.resources
+            if not resource.deleted
+        ]
 
-    def run_api_tests_for_lang(self, samples: List[CodeSample], lang: Language):
+    def run_api_tests_for_lang(
+            self,
+            samples: List[CodeSample],
+            lang: Language,
+            verbose: bool = True) -> List[ApiTestResult]:
+        return list(self._iter_lang_results(samples, lang, verbose=verbose))
+
+    def _iter_lang_results(
+            self,
+            samples: List[CodeSample],
+            lang: Language,
+            verbose: bool = True,
+    ) -> Generator[ApiTestResult, None, None]:
         reporter = Reporter()
-        reporter.show_language_scope_run(lang)
-        test_results = []
+        if verbose:
+            reporter.show_language_scope_run(lang)
+        if self._restored:
+            samples = yield from self._iter_restored(samples, verbose)
 
+        if conf.pipeline:
+            results = self._iter_pipelined(samples, lang, verbose)
+        else:
+            results = self._iter_sequential(samples, lang, verbose)
+        try:
+            yield from results
+        finally:
+            # a capture leaves the resources for read-only runs
+            if self._capture is None:
+                start_time = time.time()
+                self._resource_registry.cleanup()
+                self.metrics.add(Phase.cleanup, time.time() - start_time)
+
+    def _iter_sequential(
+            self,
+            samples: List[CodeSample],
+            lang: Language,
+            verbose: bool,
+    ) -> Generator[ApiTestResult, None, None]:
+        reporter = Reporter()
         for sample in samples:
+            if self.cancelled:
+                break
+            if not self._fits_deadline(sample):
+                yield self._unfinish(sample, verbose)
+                continue
+            blocker = self._find_blocker(sample)
+            if blocker is not None:
+                yield self._skip(sample, blocker, verbose)
+                continue
+            start_time = time.time()
             prerequisite_subs = self.extract_prerequisite_subs(sample)
+            prerequisites_time = time.time() - start_time
+            substitutions = self._get_substitutions(sample, prerequisite_subs)
+            if verbose:
+                reporter.show_test_is_running(sample)
+            timeout, capped = self._timeout_for(sample)
+            test_result = self.runners[lang].run_sample(
+                sample, substitutions, timeout=timeout,
+                response_keys=self.get_response_keys(sample),
+            )
+            yield self._complete(
+                test_result, prerequisite_subs, prerequisites_time, verbose,
+                capped,
+            )
+
+    def _iter_pipelined(
+            self,
+            samples: List[CodeSample],
+            lang: Language,
+            verbose: bool,
+    ) -> Generator[ApiTestResult, None, None]:
+        """
+        Substitutions from the API spec are made ahead by a pool of workers
+        and outputs are checked by a separate thread, so only running the
+        samples is left on this thread. A sample still waits until the
+        responses of POST samples up its path are parsed, they're used for
+        its substitutions
+        """
+        runner = self.runners[lang]
+        lookahead = max(1, conf.pipeline_queue_size)
+        prepare_pool = ThreadPoolExecutor(
+            max_workers=max(1, conf.pipeline_prepare_workers),
+        )
+        # keyed by id of the sample
+        spec_futures: Dict[int, Future] = {}
+        executed: queue.Queue = queue.Queue(maxsize=lookahead)
+        finished: queue.Queue = queue.Queue()
+        # POST samples which responses are being parsed
+        parsed: Dict[str, threading.Event] = {}
+        checker = threading.Thread(
+            target=self._check_outputs,
+            args=(executed, finished),
+            daemon=True,
+        )
+        checker.start()
+        stopped = False
+        try:
+            for index, sample in enumerate(samples):
+                if self.cancelled:
+                    break
+                # samples to come are prepared while this one is running
+                for ahead in range(index, min(index + lookahead, len(samples))):
+                    self._prepare_ahead(
+                        prepare_pool, runner, samples[ahead], spec_futures,
+                    )
+                spec_substitutions = spec_futures.pop(id(sample)).result()
+                self._wait_for_parents(sample, parsed)
+                job = self._execute_in_pipeline(
+                    runner, sample, spec_substitutions, verbose,
+                )
+                event: Optional[threading.Event] = None
+                if sample.http_method == HttpMethod.post:
+                    event = parsed[sample.name] = threading.Event()
+                executed.put((job, event))
+                while not finished.empty():
+                    yield self._unwrap(finished.get())
+
+            executed.put(None)
+            stopped = True
+            while True:
+                item = finished.get()
+                if item is None:
+                    break
+                yield self._unwrap(item)
+        finally:
+            if not stopped:
+                executed.put(None)
+            checker.join()
+            prepare_pool.shutdown()
+
+    @staticmethod
+    def _prepare_ahead(
+            pool: ThreadPoolExecutor,
+            runner: CodeRunner,
+            sample: CodeSample,
+            spec_futures: Dict[int, Future]):
+        if id(sample) not in spec_futures:
+            spec_futures[id(sample)] = pool.submit(
+                runner.get_substitutions_from_spec, sample,
+            )
+
+    @staticmethod
+    def _wait_for_parents(
+            sample: CodeSample,
+            parsed: Dict[str, threading.Event]):
+        for name, event in parsed.items():
+            if sample.name.startswith(f'{name}/'):
+                event.wait()
+
+    def _execute_in_pipeline(
+            self,
+            runner: CodeRunner,
+            sample: CodeSample,
+            spec_substitutions: Dict[str, str],
+            verbose: bool) -> Callable[[], ApiTestResult]:
+        """
+        Run the sample
+
+        :return: Job making the result, it's done by the checker thread
+        """
+        if not self._fits_deadline(sample):
+            return functools.partial(self._unfinish, sample, verbose)
+        blocker = self._find_blocker(sample)
+        if blocker is not None:
+            return functools.partial(self._skip, sample, blocker, verbose)
+
+        start_time = time.time()
+        prerequisite_subs = self.extract_prerequisite_subs(sample)
+        prerequisites_time = time.time() - start_time
+        substitutions = self._get_substitutions(sample, prerequisite_subs)
+        if verbose:
+            Reporter().show_test_is_running(sample)
+        timeout, capped = self._timeout_for(sample)
+        execution = runner.execute_sample(
+            sample, spec_substitutions, substitutions, timeout=timeout,
+        )
+
+        def check_output() -> ApiTestResult:
+            test_result = runner.check_output(
+                execution, self.get_response_keys(sample),
+            )
+            return self._complete(
+                test_result, prerequisite_subs, prerequisites_time, verbose,
+                capped,
+            )
+        return check_output
+
+    @staticmethod
+    def _check_outputs(executed: queue.Queue, finished: queue.Queue):
+        """Worker of the pipeline which makes results of executed samples"""
+        while True:
+            item = executed.get()
+            if item is None:
+                break
+            job, event = item
+            try:
+                finished.put(job())
+            except Exception as exc:
+                # raised by the session in the caller's thread
+                finished.put(exc)
+            finally:
+                if event is not None:
+                    event.set()
+        finished.put(None)
+
+    @staticmethod
+    def _unwrap(
+            item: Union[ApiTestResult, Exception]) -> ApiTestResult:
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def _begin_checkpoint(self):
+        if self._checkpoint is None:
+            return
+        # the interrupted journal is kept until they are removed
+        self._remove_unfinished(self._checkpoint)
+        self._checkpoint.begin()
+        self._restored = self._checkpoint.restored
+        for name, url, id_field in self._checkpoint.leftover_resources:
+            self._resource_registry.adopt(name, url, id_field)
+
+    def _remove_unfinished(self, checkpoint: Checkpoint):
+        """
+        Run DELETE samples for the resources created by the subtrees the
+        interrupted session didn't finish, they are run anew
+        """
+        failed = remove_created(
+            checkpoint.unremoved, checkpoint.pending_removals, self.runners,
+            self._latency_stats,
+        )
+        for test_result in failed:
+            Reporter().show_not_removed(test_result)
+
+    def _iter_restored(
+            self,
+            samples: List[CodeSample],
+            verbose: bool,
+    ) -> Generator[ApiTestResult, None, List[CodeSample]]:
+        """
+        Yield results of the interrupted session
+
+        :return: Samples which are left to run
+        """
+        left = []
+        for sample in samples:
+            test_result = self._restored.get(sample_key(sample))
+            if test_result is None:
+                left.append(sample)
+                continue
+            # bodies of POST samples are restored from the journal as well
+            with self._results_lock:
+                self._test_results_map.put(test_result)
+            if verbose:
+                Reporter().show_short_test_status(test_result)
+            yield test_result
+        return left
+
+    def _find_blocker(self, sample: CodeSample) -> Optional[CodeSample]:
+        """
+        Failed POST sample up the path of the sample. Its response is
+        missing, so the sample can't get its substitutions
+        """
+        if not conf.skip_blocked:
+            return None
+        with self._results_lock:
+            parent = self._test_results_map.get_parent_result(sample)
+        if parent is None or parent.passed:
+            return None
+        return parent.blocked_by or parent.sample
+
+    def _skip(
+            self,
+            sample: CodeSample,
+            blocker: CodeSample,
+            verbose: bool) -> ApiTestResult:
+        test_result = ApiTestResult(
+            sample, passed=False, reason=errors.BlockedByFailure,
+            blocked_by=blocker,
+        )
+        # children of a skipped POST are blocked by the same sample
+        with self._results_lock:
+            self._test_results_map.put(test_result)
+        if self._checkpoint is not None:
+            self._checkpoint.record_result(test_result)
+        if verbose:
+            Reporter().show_short_test_status(test_result)
+        return test_result
+
+    @staticmethod
+    def _map_creators(
+            samples: List[CodeSample]) -> Dict[int, List[CodeSample]]:
+        tree = CodeSamplesTree()
+        for sample in samples:
+            tree.put(sample)
+        creators: Dict[int, List[CodeSample]] = {}
+        for sample in samples:
+            if sample.http_method == HttpMethod.post:
+                for remover in tree.get_removers(sample):
+                    creators.setdefault(id(remover), []).append(sample)
+        return creators
+
+    def _removes_created(self, sample: CodeSample) -> bool:
+        """
+        DELETE sample of a resource the session has created: of the path of
+        the POST sample, or of a placeholder right under it
+        """
+        if sample.http_method != HttpMethod.delete:
+            return False
+        with self._results_lock:
+            return any(
+                id(creator) in self._created
+                for creator in self._creators.get(id(sample), [])
+            )
+
+    def _fits_deadline(self, sample: CodeSample) -> bool:
+        """
+        Once a sample doesn't fit, the others aren't run either, except for
+        removal of the created resources within the margin of the deadline
+        """
+        if self._deadline is None:
+            return True
+        cleanup = self._removes_created(sample)
+        if self._out_of_time and not cleanup:
+            return False
+        cost = self._latency_stats.estimate(sample)
+        if self._deadline.allows(cost, cleanup):
+            return True
+        self._stop_by_deadline()
+        return False
+
+    def _stop_by_deadline(self):
+        if not self._out_of_time:
+            self._out_of_time = True
+            Reporter().show_deadline_reached()
+
+    def _timeout_for(self, sample: CodeSample) -> Tuple[float, bool]:
+        """
+        :return: Timeout of the sample, and whether it's cut by the deadline
+        """
+        timeout = self._latency_stats.timeout_for(sample)
+        if self._deadline is None:
+            return timeout, False
+        capped = self._deadline.cap(timeout, self._removes_created(sample))
+        return capped, capped < timeout
+
+    def _unfinish(self, sample: CodeSample, verbose: bool) -> ApiTestResult:
+        test_result = ApiTestResult(
+            sample, passed=False, reason=errors.DeadlineExceeded,
+        )
+        # DELETE samples of an unfinished POST one have nothing to remove
+        with self._results_lock:
+            self._test_results_map.put(test_result)
+        if verbose:
+            Reporter().show_short_test_status(test_result)
+        return test_result
+
+    def _get_substitutions(
+            self,
+            sample: CodeSample,
+            prerequisite_subs: Dict[str, dict]) -> dict:
+        if self._captured is not None:
+            return dict(self._captured[sample_key(sample)])
+        with self._results_lock:
             substitutions = self._test_results_map.get_parent_body(
                 sample, escaped=True,
             )
-            substitutions.update(prerequisite_subs)
-            reporter.show_test_is_running(sample)
-            test_result = self.runners[lang].run_sample(
-                sample, substitutions,
-            )
+        substitutions.update(prerequisite_subs)
+        if self._capture is not None:
+            self._capture.record(sample, substitutions)
+        return substitutions
+
+    def _complete(
+            self,
+            test_result: ApiTestResult,
+            prerequisite_subs: Dict[str, dict],
+            prerequisites_time: float,
+            verbose: bool,
+            capped: bool = False) -> ApiTestResult:
+        """
+        Record the result of the sample and make it compact
+
+        :param capped: The timeout of the sample was cut by the deadline
+        """
+        if prerequisite_subs:
+            test_result.phases[Phase.prerequisites] = prerequisites_time
+        if capped and test_result.reason is errors.ExecutionTimeout:
+            # stopped to keep the time budget, it isn't slow
+            test_result.reason = errors.DeadlineExceeded
+            self._stop_by_deadline()
+        self.metrics.add_result(test_result)
+        if not test_result.unfinished:
+            self._latency_stats.record(test_result)
+        with self._results_lock:
             self._test_results_map.put(
                 test_result,
-                replace_keys=conf.resp_attr_replacements.get(sample.name, {}),
+                replace_keys=conf.resp_attr_replacements.get(
+                    test_result.sample.name, {},
+                ),
                 extra=prerequisite_subs,
             )
-            test_results.append(test_result)
-            reporter.show_short_test_status(test_result)
-        self._resource_registry.cleanup()
-        return test_results
+            if (test_result.passed
+                    and test_result.sample.http_method == HttpMethod.post):
+                self._created.add(id(test_result.sample))
+        if verbose:
+            Reporter().show_short_test_status(test_result)
+        test_result.compact()
+        if self._checkpoint is not None and not test_result.unfinished:
+            self._checkpoint.record_result(test_result)
+        return test_result
+
+    def get_response_keys(self, sample: CodeSample) -> Optional[Set[str]]:
+        """Fields of the sample's response which are worth keeping"""
+        if conf.debug:
+            return None
+        if sample.http_method != HttpMethod.post:
+            # only POST responses are used for substitutions
+            return set()
+        return self._response_keys.get(sample.name, set())
 
     def extract_prerequisite_subs(
             self,
             sample: CodeSample) -> Dict[str, dict]:
+        if self._captured is not None:
+            # the captured substitutions have the prerequisites
+            return {}
         if sample.name not in conf.before_sample:
             return {}
         prerequisite_subs: Dict[str, dict] = {}
@@ -0,0 +1,322 @@
+import hashlib
+import heapq
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from samples_validator import errors
+from samples_validator.base import (
+    ApiTestResult, CodeSample, HttpMethod, HttpTimings, Phase,
+    SystemCmdResult,
+)
+from samples_validator.conf import conf
+from samples_validator.stats import percentile, sample_key
+
+REPORT_VERSION = 1
+
+# the top level resource, e.g. `identity-api/identities`. Samples depend
+# only on the samples up their path in CodeSamplesTree, so such a subtree
+# can be run apart from the others
+UnitKey = str
+
+
+@dataclass
+class Shard:
+    index: int
+    count: int
+
+    @classmethod
+    def parse(cls, value: str) -> 'Shard':
+        """:param value: 1-based index and the number of shards, e.g. `2/4`"""
+        index, _, count = value.partition('/')
+        try:
+            shard = cls(int(index), int(count))
+        except ValueError:
+            raise ValueError(f'Shard should look like i/n, got: {value}')
+        if not 1 <= shard.index <= shard.count:
+            raise ValueError(
+                f'Shard index should be from 1 to {shard.count}, '
+                f'got: {shard.index}',
+            )
+        return shard
+
+    def __str__(self):
+        return f'{self.index}/{self.count}'
+
+
+@dataclass
+class ShardUnit:
+    key: UnitKey
+    samples: List[CodeSample]
+    cost: float
+    # index of the first sample in the session
+    position: int
+
+    @property
+    def name(self) -> str:
+        return self.key
+
+
+@dataclass
+class ShardPlan:
+    shard: Shard
+    units: List[List[ShardUnit]]
+    # the costs are measured, not only counted samples
+    historical: bool
+
+    @property
+    def samples(self) -> List[CodeSample]:
+        """Samples of the current shard, in the order of the session"""
+        return [
+            sample
+            for unit in sorted(self.units[self.shard.index - 1],
+                               key=lambda unit: unit.position)
+            for sample in unit.samples
+        ]
+
+    @property
+    def digest(self) -> str:
+        """
+        Fingerprint of the partition. Shards computed from different
+        samples or costs would miss or repeat samples, and the reports
+        of such shards can't be merged
+        """
+        assignment = [sorted(unit.name for unit in units)
+                      for units in self.units]
+        return hashlib.sha1(
+            json.dumps(assignment).encode(),
+        ).hexdigest()[:12]
+
+    def cost_of(self, index: int) -> float:
+        return sum(unit.cost for unit in self.units[index])
+
+
+def unit_key(sample: CodeSample, api_roots: Set[UnitKey]) -> UnitKey:
+    """
+    :param api_roots: Samples of API directories themselves, resources
+        under them are children of these samples and go together
+    """
+    parts = sample.name.split('/')
+    if len(parts) == 1 or parts[0] in api_roots:
+        return parts[0]
+    return '/'.join(parts[:2])
+
+
+def split_units(
+        samples: List[CodeSample],
+        latencies: Optional[Dict[str, List[float]]] = None,
+) -> List[ShardUnit]:
+    """
+    Group the sorted samples by top level subtree, keeping their order. A
+    subtree includes all the languages, as their samples post the same
+    examples from the spec, and subtrees with `before_sample` resources of
+    the same kind go together. Units share no resources, so they can run
+    simultaneously
+
+    :param latencies: Durations per endpoint from a baseline. Samples
+        without them cost as much as a typical one, all samples cost
+        1 without a baseline
+    """
+    durations = {
+        key: percentile(values, 50)
+        for key, values in (latencies or {}).items() if values
+    }
+    typical = percentile(list(durations.values()), 50) if durations else 1.0
+    api_roots = {sample.name for sample in samples if '/' not in sample.name}
+    groups = _group_subtrees(samples, api_roots)
+    units: Dict[UnitKey, ShardUnit] = {}
+    for position, sample in enumerate(samples):
+        key = groups[unit_key(sample, api_roots)]
+        unit = units.get(key)
+        if unit is None:
+            unit = units[key] = ShardUnit(key, [], 0.0, position)
+        unit.samples.append(sample)
+        unit.cost += durations.get(sample_key(sample), typical)
+    return list(units.values())
+
+
+def _group_subtrees(
+        samples: List[CodeSample],
+        api_roots: Set[UnitKey]) -> Dict[UnitKey, UnitKey]:
+    """
+    :return: Key of the unit by subtree: the subtrees of the unit joined
+    """
+    # disjoint sets of subtrees and kinds of `before_sample` resources
+    parents: Dict[str, str] = {}
+
+    def find(item: str) -> str:
+        parents.setdefault(item, item)
+        while parents[item] != item:
+            item = parents[item]
+        return item
+
+    for sample in samples:
+        subtree = find(unit_key(sample, api_roots))
+        for params in conf.before_sample.get(sample.name, []):
+            resource = find(f'resource:{params["resource"]}')
+            if resource != subtree:
+                parents[resource] = subtree
+    members: Dict[str, List[str]] = {}
+    for item in parents:
+        if not item.startswith('resource:'):
+            members.setdefault(find(item), []).append(item)
+    return {
+        subtree: ', '.join(sorted(subtrees))
+        for subtrees in members.values() for subtree in subtrees
+    }
+
+
+def plan_shards(
+        samples: List[CodeSample],
+        shard: Shard,
+        latencies: Optional[Dict[str, List[float]]] = None) -> ShardPlan:
+    """
+    Longest processing time first: the most expensive subtree goes to the
+    least loaded shard. Ties are broken by names, so every CI node gets
+    the same partition from the same samples and baseline
+    """
+    units = sorted(
+        split_units(samples, latencies),
+        key=lambda unit: (-unit.cost, unit.name),
+    )
+    shards: List[List[ShardUnit]] = [[] for _ in range(shard.count)]
+    loads = [(0.0, index) for index in range(shard.count)]
+    for unit in units:
+        load, index = heapq.heappop(loads)
+        shards[index].append(unit)
+        heapq.heappush(loads, (load + unit.cost, index))
+    return ShardPlan(shard, shards, historical=bool(latencies))
+
+
+def result_to_dict(test_result: ApiTestResult) -> dict:
+    sample = test_result.sample
+    cmd_result = test_result.cmd_result
+    blocker = test_result.blocked_by
+    reason = test_result.reason
+    if isinstance(reason, type):
+        # exceptions are reported by their class
+        reason = reason.__name__
+    elif reason is not None:
+        reason = str(reason)
+    return {
+        'sample': _sample_to_dict(sample),
+        'passed': test_result.passed,
+        'status_code': test_result.status_code,
+        'reason': reason,
+        'source_code': test_result.source_code,
+        'duration': test_result.duration,
+        'timeout': test_result.timeout,
+        'phases': {
+            phase.value: value for phase, value in test_result.phases.items()
+        },
+        'http': None if test_result.http is None else {
+            name: getattr(test_result.http, name)
+            for name in HttpTimings.__dataclass_fields__
+        },
+        'cmd_result': None if cmd_result is None else {
+            'exit_code': cmd_result.exit_code,
+            'stdout': cmd_result.stdout,
+            'stderr': cmd_result.stderr,
+        },
+        'blocked_by': None if blocker is None else _sample_to_dict(blocker),
+    }
+
+
+def result_from_dict(data: dict) -> ApiTestResult:
+    reason = data['reason']
+    cmd_result = data['cmd_result']
+    return ApiTestResult(
+        sample=_sample_from_dict(data['sample']),
+        passed=data['passed'],
+        status_code=data['status_code'],
+        reason=getattr(errors, reason, reason) if reason else None,
+        source_code=data['source_code'],
+        duration=data['duration'],
+        timeout=data['timeout'],
+        phases={
+            Phase(phase): value for phase, value in data['phases'].items()
+        },
+        http=None if data['http'] is None else HttpTimings(**data['http']),
+        cmd_result=None if cmd_result is None else SystemCmdResult(
+            **cmd_result,
+        ),
+        blocked_by=(
+            None if data['blocked_by'] is None
+            else _sample_from_dict(data['blocked_by'])
+        ),
+    )
+
+
+def _sample_to_dict(sample: CodeSample) -> dict:
+    return {
+        'path': sample.path.as_posix(),
+        'name': sample.name,
+        'method': sample.http_method.value,
+    }
+
+
+def _sample_from_dict(data: dict) -> CodeSample:
+    return CodeSample(
+        Path(data['path']), data['name'], HttpMethod(data['method']),
+    )
+
+
+def save_report(
+        path: Path,
+        test_results: List[ApiTestResult],
+        plan: Optional[ShardPlan] = None):
+    report: dict = {
+        'version': REPORT_VERSION,
+        'shard': None,
+        'results': [result_to_dict(result) for result in test_results],
+    }
+    if plan is not None:
+        report['shard'] = {
+            'index': plan.shard.index,
+            'count': plan.shard.count,
+            'digest': plan.digest,
+        }
+    path.write_text(json.dumps(report, indent=2))
+
+
+def load_report(path: Path) -> dict:
+    try:
+        report: dict = json.loads(path.read_text())
+    except json.JSONDecodeError:
+        raise ValueError(f'Report file is corrupted: {path.as_posix()}')
+    if report.get('version') != REPORT_VERSION:
+        raise ValueError(
+            f'Unsupported version of the report: {path.as_posix()}',
+        )
+    return report
+
+
+def merge_reports(reports: List[dict]) -> List[ApiTestResult]:
+    """
+    Results of all shards of a run. Every shard must be present once and
+    all of them must come from the same partition
+    """
+    shards = [report['shard'] for report in reports]
+    if None in shards:
+        raise ValueError('Only reports of shards (--shard) can be merged')
+    counts = {shard['count'] for shard in shards}
+    digests = {shard['digest'] for shard in shards}
+    if len(counts) > 1 or len(digests) > 1:
+        raise ValueError(
+            'Reports come from different partitions, shards should be run '
+            'with the same samples, options and baseline',
+        )
+    count = counts.pop()
+    indexes = sorted(shard['index'] for shard in shards)
+    if indexes != list(range(1, count + 1)):
+        missing = sorted(set(range(1, count + 1)) - set(indexes))
+        raise ValueError(
+            f'Expected reports of {count} shards once each, missing: '
+            f'{missing or "none"}, got: {indexes}',
+        )
+    return [
+        result_from_dict(result)
+        for report in sorted(reports, key=lambda item: item['shard']['index'])
+        for result in report['results']
+    ]
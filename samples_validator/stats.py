@@ -0,0 +1,196 @@
+import json
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from samples_validator import errors
+from samples_validator.base import (
+    HTTP_PHASES, ApiTestResult, CodeSample, Phase,
+)
+from samples_validator.conf import conf
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """
+    Percentile with linear interpolation between closest ranks
+
+    :param values: Observations, not necessarily sorted
+    :param percent: Percentile in range [0, 100]
+    :return: Interpolated value, 0.0 for empty input
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * percent / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    fraction = rank - lower
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * fraction
+
+
+def sample_key(sample: CodeSample) -> str:
+    # interpreter startup time differs a lot, so language is a part of key
+    return f'{sample.lang.value} {sample.http_method.value} {sample.name}'
+
+
+def latency_stats_path(target: Optional[str] = None) -> Path:
+    path = Path(tempfile.gettempdir(), conf.latency_stats_file)
+    if target is None:
+        return path
+    # environments differ in latency, so every target has its own history
+    return path.with_name(f'{path.stem}-{target}{path.suffix}')
+
+
+class LatencyStats:
+    """
+    Rolling window of observed durations per code sample. It's persisted
+    between runs in a local JSON file and used to derive per-sample timeouts
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path
+        self._durations: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: Path) -> 'LatencyStats':
+        stats = cls(path)
+        try:
+            data = json.loads(path.read_text())
+        except (FileNotFoundError, ValueError):
+            return stats
+        if isinstance(data, dict):
+            stats._durations = {
+                key: [float(value) for value in values]
+                for key, values in data.items() if isinstance(values, list)
+            }
+        return stats
+
+    def save(self):
+        if self.path is None:
+            return
+        # several validators on the host may save at once, each needs its
+        # own temporary file
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=f'.{self.path.name}-', dir=str(self.path.parent),
+        )
+        with os.fdopen(fd, 'w') as tmp_file, self._lock:
+            tmp_file.write(json.dumps(self._durations))
+        os.replace(tmp_path, str(self.path))
+
+    def durations(self, sample: CodeSample) -> List[float]:
+        return self._durations.get(sample_key(sample), [])
+
+    def record(self, test_result: ApiTestResult):
+        """
+        Remember how long the sample took. Timed out runs are recorded with
+        the applied limit, so the timeout of an endpoint which became slower
+        grows on every run instead of failing forever. Other failures are
+        skipped, they are often faster than a real response
+        """
+        if (not test_result.passed
+                and test_result.reason is not errors.ExecutionTimeout):
+            return
+        with self._lock:
+            durations = self._durations.setdefault(
+                sample_key(test_result.sample), [],
+            )
+            durations.append(round(test_result.duration, 3))
+            del durations[:-conf.latency_stats_window]
+
+    def estimate(self, sample: CodeSample) -> float:
+        """Typical duration of the sample, its timeout if it's unknown"""
+        durations = self.durations(sample)
+        if not durations:
+            return self.timeout_for(sample)
+        return percentile(durations, 50)
+
+    def timeout_for(self, sample: CodeSample) -> float:
+        """
+        Explicit override from `sample_timeouts` wins. Otherwise p99 of
+        observed durations multiplied by a factor and clamped to the
+        configured bounds. Falls back to `sample_timeout` until there
+        is enough data
+        """
+        overrides = conf.sample_timeouts.get(sample.name, {})
+        if sample.http_method.value in overrides:
+            return float(overrides[sample.http_method.value])
+        durations = self.durations(sample)
+        if (not conf.adaptive_timeout
+                or len(durations) < conf.adaptive_timeout_min_samples):
+            return float(conf.sample_timeout)
+        timeout = percentile(durations, 99) * conf.adaptive_timeout_factor
+        return float(min(
+            max(timeout, conf.adaptive_timeout_min),
+            conf.adaptive_timeout_max,
+        ))
+
+
+class PhaseMetrics:
+    """Time spent in every phase of the sample runs of a session"""
+
+    def __init__(self):
+        self.counts: Dict[Phase, int] = {}
+        self.totals: Dict[Phase, float] = {}
+        self.maximums: Dict[Phase, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, phase: Phase, seconds: float):
+        with self._lock:
+            self.counts[phase] = self.counts.get(phase, 0) + 1
+            self.totals[phase] = self.totals.get(phase, 0.0) + seconds
+            self.maximums[phase] = max(self.maximums.get(phase, 0.0), seconds)
+
+    def add_result(self, test_result: ApiTestResult):
+        for phase, seconds in test_result.phases.items():
+            self.add(phase, seconds)
+
+    def mean(self, phase: Phase) -> float:
+        count = self.counts.get(phase, 0)
+        return self.totals[phase] / count if count else 0.0
+
+
+@dataclass
+class EndpointHttpSummary:
+    endpoint: str
+    runs_count: int
+    requests_count: int
+    # median seconds per HTTP phase
+    phases: Dict[str, float]
+    http: float
+    # the rest of the run: interpreter startup, the sample's own code
+    runtime: float
+
+
+def summarize_http_timings(
+        test_results: List[ApiTestResult]) -> List[EndpointHttpSummary]:
+    """Median HTTP phases and runtime overhead per sample"""
+    grouped: Dict[str, List[ApiTestResult]] = {}
+    for test_result in test_results:
+        if test_result.http is not None:
+            key = sample_key(test_result.sample)
+            grouped.setdefault(key, []).append(test_result)
+
+    summaries = []
+    for endpoint, results in grouped.items():
+        timings = [res.http for res in results if res.http is not None]
+        summaries.append(EndpointHttpSummary(
+            endpoint=endpoint,
+            runs_count=len(results),
+            requests_count=sum(item.requests for item in timings),
+            phases={
+                phase: percentile(
+                    [getattr(item, phase) for item in timings], 50,
+                )
+                for phase in HTTP_PHASES
+            },
+            http=percentile([item.total for item in timings], 50),
+            runtime=percentile([
+                max(0.0, res.duration - res.http.total)
+                for res in results if res.http is not None
+            ], 50),
+        ))
+    return summaries
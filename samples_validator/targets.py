@@ -0,0 +1,86 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, List
+
+from samples_validator.base import ApiTestResult, CodeSample
+from samples_validator.conf import conf
+from samples_validator.prerequisites.base import ResourceRegistry, api_url
+from samples_validator.reporter import Reporter
+from samples_validator.session import TestSession, make_runners
+from samples_validator.stats import LatencyStats, latency_stats_path
+from samples_validator.utils import collect_response_keys
+
+if TYPE_CHECKING:
+    from samples_validator.schema import Target  # noqa
+
+
+def target_substitutions(target: 'Target') -> Dict[str, str]:
+    """
+    Static substitutions pointing to the target instead of the configured
+    API. Substitutions are remapped when their value is the configured
+    `api_url` or `access_token`, explicit substitutions of the target win
+    """
+    substitutions = {}
+    for key, value in conf.substitutions.items():
+        if value == conf.api_url:
+            # keep the form of the replaced value: with or without scheme
+            value = api_url(target.api_url)
+            if '://' not in key:
+                value = value.split('://', 1)[1]
+        elif value == conf.access_token:
+            value = target.access_token
+        substitutions[key] = value
+    substitutions.update(target.substitutions)
+    return substitutions
+
+
+class TargetSession:
+    """
+    Run the same samples against several API environments simultaneously.
+    Samples are discovered and parsed once; every target has its own
+    session with its own results, prerequisites and latency history
+    """
+
+    def __init__(self, samples: List[CodeSample], targets: Dict[str, 'Target']):
+        self.samples = samples
+        self.targets = targets
+        response_keys = collect_response_keys(
+            samples, conf.resp_attr_replacements,
+        )
+        # environments are created here one by one, sessions only use them
+        self.sessions = {
+            name: TestSession(
+                samples,
+                runners=make_runners(
+                    target_substitutions(target), target.api_url,
+                ),
+                latency_stats=LatencyStats.load(latency_stats_path(name)),
+                response_keys=response_keys,
+                resource_registry=ResourceRegistry(
+                    target.api_url, target.access_token,
+                ),
+            )
+            for name, target in targets.items()
+        }
+        self.results: Dict[str, List[ApiTestResult]] = {}
+        self.test_results: List[ApiTestResult] = []
+
+    def run(self) -> int:
+        reporter = Reporter()
+        reporter.show_targets_run(list(self.targets))
+        with ThreadPoolExecutor(max_workers=len(self.sessions)) as executor:
+            futures = {
+                name: executor.submit(session.execute, False)
+                for name, session in self.sessions.items()
+            }
+            for name, future in futures.items():
+                self.results[name] = future.result()
+        for session in self.sessions.values():
+            session.save_latency_stats()
+
+        self.test_results = [
+            test_result
+            for results in self.results.values()
+            for test_result in results
+        ]
+        reporter.print_targets_report(self.results)
+        return sum(1 for res in self.test_results if res.failed)
@@ -96,3 +96,12 @@ def no_cleanup(monkeypatch):
         monkeypatch.setattr(
             f'samples_validator.runner.{name}._cleanup', MagicMock()
         )
+
+
+@pytest.fixture(autouse=True)
+def latency_stats_file(tmp_path, monkeypatch):
+    stats_path = tmp_path / 'latency-stats.json'
+    monkeypatch.setattr(
+        'samples_validator.session.latency_stats_path', lambda: stats_path
+    )
+    return stats_path
@@ -0,0 +1,100 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from samples_validator.checkpoint import Checkpoint
+from samples_validator.loader import load_code_samples
+from samples_validator.prerequisites.base import ResourceRegistry
+from samples_validator.session import TestSession
+
+
+@pytest.fixture
+def samples(temp_files_factory):
+    root_dir = temp_files_factory([
+        'api/user/POST/curl',
+        'api/user/{id}/GET/curl',
+        'api/user/{id}/DELETE/curl',
+        'api/group/POST/curl',
+        'api/group/{id}/DELETE/curl',
+    ])
+    return load_code_samples(root_dir)
+
+
+def interrupt_after(samples, journal_path, count):
+    session = TestSession(samples, checkpoint=Checkpoint(journal_path, samples))
+    results = session.iter_results()
+    for _ in range(count):
+        next(results)
+    # a killed process doesn't finish the journal
+    results.close()
+
+
+def test_resume(
+        run_sys_cmd, mocked_parse_stdout, samples, tmp_path, reporter,
+        no_cleanup):
+    mocked_parse_stdout.return_value = ({'id': 1}, 200)
+    journal_path = tmp_path / 'checkpoint.jsonl'
+    # the user subtree is finished, the group one is not
+    interrupt_after(samples, journal_path, 4)
+    assert journal_path.exists()
+    run_sys_cmd.reset_mock()
+
+    checkpoint = Checkpoint(journal_path, samples, resume=True)
+    assert len(checkpoint.restored) == 3
+    assert checkpoint.pending_removals == samples[-1:]
+    session = TestSession(samples, checkpoint=checkpoint)
+    assert session.run() == 0
+    # the group created before the interruption is removed, then the group
+    # subtree is run from its beginning
+    assert run_sys_cmd.call_count == 3
+    assert [result.sample for result in session.test_results] == samples
+    assert session.test_results[0].json_body == {'id': 1}
+    assert not journal_path.exists()
+
+
+def test_resume_adopts_leftover_resources(samples, tmp_path, monkeypatch):
+    delete_resource = MagicMock(return_value=200)
+    monkeypatch.setattr(
+        'samples_validator.prerequisites.resources._delete_resource',
+        delete_resource,
+    )
+    journal_path = tmp_path / 'checkpoint.jsonl'
+    Checkpoint(journal_path, samples).begin()
+    with journal_path.open('a') as journal:
+        for id_field, deleted in (('1', False), ('1', True), ('2', False)):
+            journal.write(json.dumps({
+                'type': 'resource', 'name': 'Identity',
+                'url': 'http://localhost/identities/v1', 'id': id_field,
+                'deleted': deleted,
+            }) + '\n')
+
+    checkpoint = Checkpoint(journal_path, samples, resume=True)
+    assert checkpoint.leftover_resources == [
+        ('Identity', 'http://localhost/identities/v1', '2'),
+    ]
+    session = TestSession([], checkpoint=checkpoint)
+    assert list(session.iter_results()) == []
+    assert delete_resource.call_count == 1
+    assert delete_resource.call_args[0][0] == (
+        'http://localhost/identities/v1/2'
+    )
+
+
+def test_failed_prerequisite_is_not_journaled(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        'samples_validator.prerequisites.resources._create_resource',
+        MagicMock(return_value=(500, None)),
+    )
+    checkpoint = MagicMock()
+    registry = ResourceRegistry('http://localhost', checkpoint=checkpoint)
+    assert registry.create('Identity', {'@id': 'identityId'}) == {}
+    assert registry.resources == []
+    assert not checkpoint.record_resource.called
+
+
+def test_resume_other_samples(samples, tmp_path):
+    journal_path = tmp_path / 'checkpoint.jsonl'
+    Checkpoint(journal_path, samples).begin()
+    with pytest.raises(ValueError, match='other samples'):
+        Checkpoint(journal_path, samples[1:], resume=True)
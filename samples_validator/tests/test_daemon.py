@@ -0,0 +1,100 @@
+import json
+import socket
+import sys
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from samples_validator.daemon import (
+    InotifyWatcher, PollingWatcher, ValidatorDaemon, samples_to_rerun,
+)
+from samples_validator.loader import load_code_samples
+
+SAMPLE_FILES = [
+    'api/a.raml/_users/POST/curl',
+    'api/a.raml/_users_{id}/GET/curl',
+    'api/a.raml/_users_{id}/DELETE/curl',
+    'api/a.raml/_groups/POST/curl',
+    'api/a.raml/_groups_{id}/DELETE/curl',
+]
+
+
+@pytest.fixture
+def samples_dir(temp_files_factory):
+    return temp_files_factory(SAMPLE_FILES)
+
+
+@pytest.mark.parametrize('watcher_class', [
+    PollingWatcher,
+    pytest.param(InotifyWatcher, marks=pytest.mark.skipif(
+        not sys.platform.startswith('linux'), reason='inotify is Linux only',
+    )),
+])
+def test_watcher(samples_dir, watcher_class):
+    watcher = watcher_class(samples_dir)
+    edn_path = samples_dir / 'api/a.raml/_users/POST/debug.edn'
+    try:
+        assert watcher.wait(0.01) == set()
+        edn_path.write_text('{:x 1}')
+        new_path = samples_dir / 'api/a.raml/_users/PUT/curl'
+        new_path.parent.mkdir()
+        new_path.write_text('curl')
+        changed = watcher.wait(0.1)
+        assert {edn_path, new_path} <= changed
+    finally:
+        watcher.close()
+
+
+def test_samples_to_rerun(samples_dir):
+    old_samples = load_code_samples(samples_dir)
+    changed = {samples_dir / 'api/a.raml/_users_{id}/GET/debug.edn'}
+
+    rerun = samples_to_rerun(old_samples, old_samples, changed)
+    assert [sample.name for sample in rerun] == [
+        'api/users', 'api/users/{id}', 'api/users/{id}',
+    ]
+
+    # children of a removed parent are run again
+    removed = samples_dir / 'api/a.raml/_groups/POST/curl'
+    removed.unlink()
+    new_samples = load_code_samples(samples_dir)
+    rerun = samples_to_rerun(old_samples, new_samples, {removed})
+    assert [sample.name for sample in rerun] == ['api/groups/{id}']
+
+
+def request(socket_path, message):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(str(socket_path))
+        client.sendall(json.dumps(message).encode() + b'\n')
+        return [json.loads(line) for line in client.makefile('rb')]
+
+
+def test_daemon_runs_by_request(
+        samples_dir, tmp_path, monkeypatch, run_sys_cmd, mocked_parse_stdout,
+        latency_stats_file, no_cleanup):
+    monkeypatch.setattr(
+        'samples_validator.daemon.latency_stats_path',
+        lambda: latency_stats_file,
+    )
+    monkeypatch.setattr('samples_validator.daemon.log', MagicMock())
+    mocked_parse_stdout.return_value = ({'id': 1}, 200)
+    socket_path = tmp_path / 'validator.sock'
+    daemon = ValidatorDaemon(samples_dir, socket_path, watch=False)
+    thread = threading.Thread(target=daemon.serve_forever)
+    thread.start()
+    try:
+        messages = request(socket_path, {'command': 'run', 'keyword': 'groups'})
+        assert [message['event'] for message in messages] == [
+            'result', 'result', 'finished',
+        ]
+        assert messages[0]['status'] == 'PASSED'
+        assert messages[0]['result']['sample']['name'] == 'api/groups'
+        assert messages[-1] == {'event': 'finished', 'total': 2, 'failed': 0}
+        assert request(socket_path, {'command': 'status'})[0]['runs'] == 1
+    finally:
+        assert request(socket_path, {'command': 'stop'}) == [
+            {'event': 'stopped'},
+        ]
+        thread.join()
+    assert not socket_path.exists()
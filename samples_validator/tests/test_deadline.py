@@ -0,0 +1,111 @@
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from samples_validator import errors
+from samples_validator.base import HttpMethod, run_shell_command
+from samples_validator.deadline import MIN_TIMEOUT, Deadline
+from samples_validator.loader import load_code_samples
+from samples_validator.progress import status_label
+from samples_validator.session import TestSession
+from samples_validator.stats import LatencyStats
+
+
+@pytest.fixture
+def samples(temp_files_factory):
+    root_dir = temp_files_factory([
+        'api/user/POST/curl',
+        'api/user/{id}/GET/curl',
+        'api/user/{id}/DELETE/curl',
+    ])
+    return load_code_samples(root_dir)
+
+
+@pytest.fixture
+def estimates(monkeypatch):
+    costs = {}
+    monkeypatch.setattr(
+        LatencyStats, 'estimate',
+        lambda self, sample: costs.get(sample.http_method, 0.1),
+    )
+    return costs
+
+
+def test_deadline_cap():
+    deadline = Deadline(10, margin=5)
+    assert 4 < deadline.remaining() <= 5
+    assert 9 < deadline.remaining(cleanup=True) <= 10
+    assert deadline.allows(4) and not deadline.allows(6)
+    assert deadline.allows(6, cleanup=True)
+    assert deadline.cap(1) == 1
+    assert deadline.cap(60) <= 5
+    assert Deadline(1, margin=5).cap(60) == MIN_TIMEOUT
+
+
+def test_created_resources_are_removed_within_margin(
+        run_sys_cmd, mocked_parse_stdout, samples, estimates, reporter,
+        no_cleanup):
+    mocked_parse_stdout.return_value = ({'id': 1}, 200)
+    estimates[HttpMethod.get] = 5
+    registry = MagicMock()
+    session = TestSession(
+        samples, resource_registry=registry, deadline=Deadline(3, margin=2),
+    )
+    assert session.run() == 1
+    labels = {
+        res.sample.http_method: status_label(res)
+        for res in session.test_results
+    }
+    assert labels == {
+        HttpMethod.post: 'PASSED',
+        HttpMethod.get: 'UNFINISHED',
+        HttpMethod.delete: 'PASSED',
+    }
+    assert run_sys_cmd.call_count == 2
+    assert registry.cleanup.called
+
+
+def test_same_path_delete_is_run_within_margin(
+        run_sys_cmd, mocked_parse_stdout, temp_files_factory, estimates,
+        reporter, no_cleanup):
+    mocked_parse_stdout.return_value = ({'id': 1}, 200)
+    root_dir = temp_files_factory([
+        'api/user/POST/curl',
+        'api/user/GET/curl',
+        'api/user/DELETE/curl',
+    ])
+    estimates[HttpMethod.get] = 5
+    session = TestSession(
+        load_code_samples(root_dir), deadline=Deadline(3, margin=2),
+    )
+    session.run()
+    assert [status_label(res) for res in session.test_results] == [
+        'PASSED', 'UNFINISHED', 'PASSED',
+    ]
+
+
+def test_nothing_to_remove_after_unfinished_post(
+        run_sys_cmd, samples, estimates, reporter, no_cleanup):
+    estimates[HttpMethod.post] = 5
+    session = TestSession(samples, deadline=Deadline(3, margin=2))
+    session.run()
+    assert all(res.unfinished for res in session.test_results)
+    assert not run_sys_cmd.called
+
+
+def test_timeout_cut_by_deadline(
+        run_sys_cmd, samples, estimates, reporter, no_cleanup):
+    run_sys_cmd.side_effect = errors.ExecutionTimeout
+    session = TestSession(samples[:1], deadline=Deadline(3, margin=2))
+    session.run()
+    test_result, = session.test_results
+    assert test_result.unfinished
+    assert test_result.timeout <= 1
+
+
+def test_timeout_kills_child_processes():
+    start_time = time.time()
+    with pytest.raises(errors.ExecutionTimeout):
+        run_shell_command(['/bin/bash', '-c', 'sleep 5; echo'], timeout=0.2)
+    assert time.time() - start_time < 2
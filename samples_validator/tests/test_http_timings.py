@@ -0,0 +1,105 @@
+import shutil
+import subprocess
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from samples_validator.base import HttpTimings, Language, SystemCmdResult
+from samples_validator.conf import conf
+from samples_validator.http_timings import (
+    MARKER, NODE_HOOK_PATH, curl_home, parse_http_timings,
+)
+from samples_validator.stats import summarize_http_timings
+
+CURL_LINE = (
+    f'{MARKER}{{"time_namelookup": 0.01, "time_connect": 0.03, '
+    f'"time_appconnect": 0.07, "time_pretransfer": 0.08, '
+    f'"time_starttransfer": 0.28, "time_total": 0.3}}\n'
+)
+HOOK_LINE = (
+    f'{MARKER}{{"dns": 0.01, "connect": 0.02, "tls": 0.0, "ttfb": 0.1, '
+    f'"transfer": 0.05, "total": 0.18}}\n'
+)
+
+
+def test_parse_http_timings():
+    timings, stderr = parse_http_timings(
+        f'warning\n{CURL_LINE}{HOOK_LINE}error\n',
+    )
+    assert stderr == 'warning\nerror\n'
+    assert timings.requests == 2
+    assert timings.dns == pytest.approx(0.02)
+    assert timings.connect == pytest.approx(0.04)
+    assert timings.tls == pytest.approx(0.04)
+    assert timings.ttfb == pytest.approx(0.3)
+    assert timings.transfer == pytest.approx(0.07)
+    assert timings.total == pytest.approx(0.48)
+
+
+def test_curl_home_of_the_process():
+    path = curl_home()
+    assert curl_home() == path
+    assert path.name != 'samples-validator-curl'
+    assert 'write-out' in (path / '.curlrc').read_text()
+
+
+def test_parse_without_timings():
+    assert parse_http_timings('error\n') == (None, 'error\n')
+
+
+def test_runner_attaches_http_timings(
+        runner_sample_factory, run_sys_cmd, mocked_parse_stdout, monkeypatch):
+    monkeypatch.setattr(conf, 'http_timings', True)
+    run_sys_cmd.return_value = SystemCmdResult(0, '', CURL_LINE)
+    mocked_parse_stdout.return_value = ({}, 200)
+    runner, sample = runner_sample_factory(Language.shell)
+    test_result = runner.run_sample(sample)
+
+    assert 'CURL_HOME' in run_sys_cmd.call_args[1]['env']
+    assert test_result.http.total == pytest.approx(0.3)
+    assert test_result.cmd_result.stderr == ''
+
+    test_result.duration = 0.5
+    summary, = summarize_http_timings([test_result])
+    assert summary.requests_count == 1
+    assert summary.phases['ttfb'] == pytest.approx(0.2)
+    assert summary.runtime == pytest.approx(0.2)
+
+
+def test_http_timings_sum():
+    timings = HttpTimings(dns=1, total=2) + HttpTimings(ttfb=1, total=1)
+    assert timings == HttpTimings(dns=1, ttfb=1, total=3, requests=2)
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node is missing')
+@pytest.mark.parametrize('call', ['request(url).end()', 'get(url)'])
+def test_node_hook_times_requests(call):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write(b'{}')
+
+        def log_message(self, format, *args):  # noqa: A002
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    script = (
+        f"const url = 'http://127.0.0.1:{server.server_port}/';"
+        f"require('http').{call}.on('response', (res) => res.resume());"
+    )
+    try:
+        proc = subprocess.run(
+            ['node', '-r', str(NODE_HOOK_PATH), '-e', script],
+            capture_output=True, text=True, timeout=10,
+        )
+    finally:
+        server.shutdown()
+        server.server_close()
+    timings, _ = parse_http_timings(proc.stderr)
+    assert timings is not None and timings.requests == 1
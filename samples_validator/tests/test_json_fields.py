@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+from samples_validator.json_fields import extract_fields, select_fields
+
+
+@pytest.mark.parametrize('text,keys,expected', [
+    ('{"@id": "1", "items": [{"a": "}"}], "n": 2}', {'@id'}, {'@id': '1'}),
+    (' { "a" : {"b": [1, 2]} , "c": null } ', {'a', 'c'},
+     {'a': {'b': [1, 2]}, 'c': None}),
+    ('{"a": 1}', set(), {}),
+    (r'{"b": [{"c": "\\\"]"}, "{"], "a": 1}', {'a'}, {'a': 1}),
+    ('{}', {'a'}, {}),
+    ('[{"a": 1}]', {'a'}, None),
+    ('{"a": 1}', None, {'a': 1}),
+])
+def test_extract_fields(text, keys, expected):
+    assert extract_fields(text, keys) == expected
+
+
+@pytest.mark.parametrize('text', [
+    '{"a": 1', '{"a": [1, 2}', '{"a" 1}', '{"a": 1}x', '{a: 1}', '',
+    '{"b": [1, 2}}', '{"b": ["x]}', '{"b": [[]',
+])
+def test_extract_fields_malformed(text):
+    with pytest.raises(json.JSONDecodeError):
+        extract_fields(text, {'a'})
+
+
+def test_select_fields():
+    assert select_fields({'a': 1, 'b': 2}, {'b'}) == {'b': 2}
+    assert select_fields([1], {'b'}) is None
+    assert select_fields([1]) == [1]
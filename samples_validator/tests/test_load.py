@@ -0,0 +1,110 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from samples_validator.base import ApiTestResult, Language
+from samples_validator.conf import conf
+from samples_validator.load import (
+    LoadSession, split_chains, summarize_load,
+)
+from samples_validator.loader import load_code_samples
+
+
+def test_load_session_repeats_whole_chain(
+        run_sys_cmd, mocked_parse_stdout, temp_files_factory, reporter,
+        monkeypatch):
+    monkeypatch.setattr('samples_validator.load.Reporter', MagicMock())
+    root_dir = temp_files_factory([
+        'api/user/POST/curl',
+        'api/user/{id}/GET/curl',
+        'api/user/{id}/DELETE/curl',
+    ])
+    samples = load_code_samples(root_dir)
+    mocked_parse_stdout.return_value = ({'id': 1}, 200)
+
+    session = LoadSession(samples, repeat=5)
+    assert session.run() == 0
+    assert len(session.test_results) == 15
+    methods = [res.sample.http_method.value for res in session.test_results]
+    assert methods.count('POST') == methods.count('DELETE') == 5
+    # every iteration creates the same user, they can't overlap
+    assert LoadSession(samples, repeat=5, concurrency=2).parallelism == 1
+
+
+def test_read_only_iterations_overlap(
+        run_sys_cmd, mocked_parse_stdout, temp_files_factory, reporter,
+        monkeypatch):
+    monkeypatch.setattr('samples_validator.load.Reporter', MagicMock())
+    mocked_parse_stdout.return_value = ({}, 200)
+    root_dir = temp_files_factory(['api/user/GET/curl', 'api/group/GET/curl'])
+    session = LoadSession(
+        load_code_samples(root_dir), repeat=4, concurrency=8,
+    )
+    assert session.parallelism == 8
+    assert session.run() == 0
+    assert len(session.test_results) == 8
+
+
+def test_split_chains(temp_files_factory, monkeypatch):
+    root_dir = temp_files_factory([
+        'api/user/POST/curl',
+        'api/user/POST/sample.py',
+        'api/user/{id}/DELETE/curl',
+        'api/group/POST/curl',
+        'api/message/POST/curl',
+    ])
+    monkeypatch.setattr(conf, 'before_sample', {
+        'api/group': [{'resource': 'Identity', 'method': 'POST'}],
+        'api/message': [{'resource': 'Identity', 'method': 'POST'}],
+    })
+    chains = split_chains(load_code_samples(root_dir))
+    assert sorted(
+        (chain.name, len(chain.samples)) for chain in chains
+    ) == [('api/group, api/message', 2), ('api/user', 3)]
+
+
+def test_crashed_iteration_is_reported(
+        run_sys_cmd, temp_files_factory, reporter, monkeypatch):
+    load_reporter = MagicMock()
+    monkeypatch.setattr(
+        'samples_validator.load.Reporter', lambda: load_reporter,
+    )
+    root_dir = temp_files_factory([
+        'api/user/POST/curl', 'api/group/POST/curl',
+    ])
+    session = LoadSession(
+        load_code_samples(root_dir), repeat=3, concurrency=2,
+    )
+    calls = []
+
+    def run_iteration(chain):
+        calls.append(chain.name)
+        if chain.name == 'api/group' and calls.count('api/group') == 2:
+            raise RuntimeError('crashed')
+        return [ApiTestResult(chain.samples[0], passed=True)]
+
+    monkeypatch.setattr(session, '_run_iteration', run_iteration)
+    assert session.run() == 1
+    # results of the iterations which didn't crash are kept
+    assert len(session.test_results) == 4
+    error, = session.errors
+    assert (error.chain.name, error.iteration) == ('api/group', 2)
+    load_reporter.print_load_errors.assert_called_once_with(session.errors, 3)
+
+
+def test_summarize_load(temp_files_factory):
+    root_dir = temp_files_factory(['api/user/GET/curl'])
+    sample = load_code_samples(root_dir)[0]
+    results = [
+        ApiTestResult(sample, passed=True, duration=duration)
+        for duration in (0.1, 0.2, 0.3, 0.4)
+    ]
+    results.append(ApiTestResult(sample, passed=False, duration=1.0))
+
+    summary, = summarize_load(results, wall_time=2.0)
+    assert summary.lang == Language.shell
+    assert summary.endpoint == 'GET api/user'
+    assert summary.requests_count == 5
+    assert summary.failed_count == 1
+    assert summary.throughput == 2.5
+    assert summary.p50 == 0.3
@@ -0,0 +1,70 @@
+from pathlib import Path
+
+from samples_validator import errors
+from samples_validator.base import ApiTestResult, CodeSample, HttpMethod
+from samples_validator.conf import conf
+from samples_validator.metrics import ValidatorMetrics
+
+
+def test_render():
+    python_sample = CodeSample(
+        Path('/tmp/sample.py'), 'api/users', HttpMethod.post,
+    )
+    curl_sample = CodeSample(
+        Path('/tmp/curl'), 'api/users/{id}', HttpMethod.get,
+    )
+    metrics = ValidatorMetrics()
+    metrics.add_session([
+        ApiTestResult(python_sample, passed=True, duration=0.2),
+        ApiTestResult(
+            curl_sample, passed=False, reason=errors.ExecutionTimeout,
+            duration=5.0,
+        ),
+    ], wall_time=7.5)
+    metrics.observe_resource('create', 'Identity', 0.3)
+    text = metrics.render()
+    lines = text.splitlines()
+    assert lines[-1] == '# EOF'
+    assert '# TYPE samples_validator_samples counter' in lines
+    assert (
+        'samples_validator_samples_total{lang="python",api="api",'
+        'status="passed"} 1'
+    ) in lines
+    assert (
+        'samples_validator_timeouts_total{lang="shell",api="api"} 1'
+    ) in lines
+    assert (
+        'samples_validator_prerequisite_duration_seconds_bucket{'
+        'operation="create",resource="Identity",le="0.5"} 1'
+    ) in lines
+    assert 'samples_validator_session_duration_seconds 7.5' in lines
+    sample_lines = [
+        line for line in lines
+        if line.startswith('samples_validator_sample_duration_seconds_')
+        and 'lang="python"' in line
+    ]
+    # cumulative buckets, +Inf, count and sum
+    assert sample_lines[0].endswith('le="0.05"} 0')
+    assert sample_lines[2].endswith('le="0.25"} 1')
+    assert sample_lines[-3].endswith('le="+Inf"} 1')
+    assert sample_lines[-1].endswith('} 0.2')
+
+
+def test_integer_buckets(monkeypatch):
+    monkeypatch.setattr(conf, 'metrics_buckets', [5, 1])
+    metrics = ValidatorMetrics()
+    metrics.observe_resource('create', 'Identity', 0.3)
+    lines = metrics.render().splitlines()
+    assert [line for line in lines if '_bucket{' in line] == [
+        'samples_validator_prerequisite_duration_seconds_bucket{'
+        f'operation="create",resource="Identity",le="{bound}"}} 1'
+        for bound in ('1.0', '5.0', '+Inf')
+    ]
+
+
+def test_write(tmp_path):
+    metrics = ValidatorMetrics()
+    path = tmp_path / 'validator.prom'
+    metrics.write(path)
+    assert path.read_text().endswith('# EOF\n')
+    assert [p.name for p in tmp_path.iterdir()] == ['validator.prom']
@@ -0,0 +1,107 @@
+import pytest
+
+from samples_validator.base import ApiTestResult
+from samples_validator.conf import conf
+from samples_validator.loader import load_code_samples
+from samples_validator.planner import ExecutionPlan, build_plan
+from samples_validator.stats import LatencyStats, sample_key
+
+
+@pytest.fixture
+def user_samples(temp_files_factory, monkeypatch):
+    monkeypatch.setattr(conf, 'substitutions', {'{version}': 'v1'})
+    root_dir = temp_files_factory([
+        'api/user/POST/curl',
+        'api/user/{id}/GET/curl',
+        'api/user/{id}/DELETE/curl',
+        'api/user/{id}/friend/POST/curl',
+        'api/user/{id}/friend/{fid}/GET/curl',
+        'api/user/{id}/friend/{fid}/DELETE/curl',
+        'api/status/GET/curl',
+    ])
+    samples = load_code_samples(root_dir)
+    for sample in samples:
+        sample.path.write_text(f'curl {{version}}/{sample.name}')
+    return {sample_key(sample): sample for sample in samples}
+
+
+def dependencies(plan: ExecutionPlan, key: str, samples: dict):
+    return {
+        (sample_key(dependency.producer), dependency.reason)
+        for dependency in plan.dependencies_of(samples[key])
+    }
+
+
+def test_build_plan(user_samples):
+    plan = build_plan(list(user_samples.values()))
+
+    assert dependencies(plan, 'shell GET api/user/{id}', user_samples) == {
+        ('shell POST api/user', '{id} from response'),
+    }
+    fid_sample = 'shell GET api/user/{id}/friend/{fid}'
+    assert dependencies(plan, fid_sample, user_samples) == {
+        ('shell POST api/user', '{id} from response'),
+        ('shell POST api/user/{id}/friend', '{fid} from response'),
+    }
+    assert dependencies(plan, 'shell DELETE api/user/{id}', user_samples) == {
+        ('shell POST api/user', '{id} from response'),
+        ('shell GET api/user/{id}', 'cleanup'),
+        ('shell POST api/user/{id}/friend', 'cleanup'),
+        ('shell GET api/user/{id}/friend/{fid}', 'cleanup'),
+        ('shell DELETE api/user/{id}/friend/{fid}', 'cleanup'),
+    }
+    assert not plan.unresolved
+    assert not plan.estimated
+    assert [sample_key(sample) for sample in plan.critical_path] == [
+        'shell POST api/user',
+        'shell POST api/user/{id}/friend',
+        'shell GET api/user/{id}/friend/{fid}',
+        'shell DELETE api/user/{id}/friend/{fid}',
+        'shell DELETE api/user/{id}',
+    ]
+    # POST api/user and GET api/status don't depend on anything
+    assert plan.max_parallelism == 2
+    assert len(plan.levels) == 5
+
+
+def test_build_plan_prerequisites_and_renamed_fields(
+        user_samples, monkeypatch):
+    monkeypatch.setattr(conf, 'before_sample', {
+        'api/user/{id}/friend': [
+            {'resource': 'Identity', 'method': 'POST', 'subs': {'@id': '{fid}'}},
+        ],
+    })
+    monkeypatch.setattr(
+        conf, 'resp_attr_replacements', {'api/user': [{'@id': 'id'}]},
+    )
+    plan = build_plan(list(user_samples.values()))
+
+    fid_sample = 'shell GET api/user/{id}/friend/{fid}'
+    assert dependencies(plan, fid_sample, user_samples) == {
+        ('shell POST api/user', '{id} from renamed field'),
+        ('shell POST api/user/{id}/friend', '{fid} from prerequisite'),
+    }
+    assert not plan.unresolved
+
+
+def test_build_plan_unresolved_placeholder(user_samples):
+    status_sample = user_samples['shell GET api/status']
+    status_sample.path.write_text('curl api/status/{token}')
+    plan = build_plan(list(user_samples.values()))
+    assert plan.unresolved == [(status_sample, 'token')]
+
+
+def test_critical_path_uses_latency_history(user_samples):
+    stats = LatencyStats()
+    for key, sample in user_samples.items():
+        duration = 5.0 if key == 'shell GET api/user/{id}' else 0.1
+        stats.record(ApiTestResult(sample, passed=True, duration=duration))
+    plan = build_plan(list(user_samples.values()), stats)
+
+    assert plan.estimated
+    assert [sample_key(sample) for sample in plan.critical_path] == [
+        'shell POST api/user',
+        'shell GET api/user/{id}',
+        'shell DELETE api/user/{id}',
+    ]
+    assert plan.critical_path_duration == pytest.approx(5.2)
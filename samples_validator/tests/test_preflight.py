@@ -0,0 +1,52 @@
+import shutil
+
+import pytest
+
+from samples_validator.base import Language
+from samples_validator.loader import load_code_samples
+from samples_validator.preflight import (
+    check_syntax, render_for_check, run_preflight,
+)
+
+
+@pytest.mark.parametrize('lang,valid,broken,message', [
+    (Language.python, 'print(1)', 'print(1', "'(' was never closed"),
+    pytest.param(
+        Language.js, 'let x = 1', 'let x = ;',
+        "[stdin]:1 SyntaxError: Unexpected token ';'",
+        marks=pytest.mark.skipif(
+            shutil.which('node') is None, reason='node is not installed',
+        ),
+    ),
+    (Language.shell, 'curl -X GET "http://x"', 'if curl; then',
+     'syntax error'),
+])
+def test_check_syntax(lang, valid, broken, message):
+    assert check_syntax(lang, valid) is None
+    assert message in check_syntax(lang, broken)
+
+
+def test_render_for_check(temp_files_factory):
+    root_dir = temp_files_factory(['api/user/{id}/GET/curl'])
+    sample, = load_code_samples(root_dir)
+    sample.path.write_text('curl "http://x/user/{id}" -d \'{"a": {data}}\'')
+    # only placeholders of the path are filled
+    assert render_for_check(sample) == (
+        'curl "http://x/user/1" -d \'{"a": {data}}\''
+    )
+
+
+def test_run_preflight(temp_files_factory):
+    root_dir = temp_files_factory([
+        'api/user/POST/curl',
+        'api/user/{id}/GET/curl',
+    ])
+    samples = load_code_samples(root_dir)
+    report = run_preflight(samples)
+    assert report.passed
+    assert report.checked == 2
+
+    samples[1].path.write_text('curl "http://x/user/{id}" | (')
+    report = run_preflight(samples)
+    assert not report.passed
+    assert [failure.sample for failure in report.failures] == [samples[1]]
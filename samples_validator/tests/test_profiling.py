@@ -0,0 +1,32 @@
+import sys
+
+from samples_validator.base import run_shell_command
+from samples_validator.profiling import Profiler, collapse_stack
+
+
+def test_profiler_reports(tmp_path):
+    output_dir = tmp_path / 'profile'
+    profiler = Profiler(output_dir, sampling_interval=0.005)
+    profiler.start()
+    run_shell_command([sys.executable, '-c', 'import time; time.sleep(0.1)'])
+    summary = profiler.stop()
+
+    assert sorted(path.name for path in output_dir.iterdir()) == [
+        'allocations.txt', 'profile.pstats', 'profile.txt', 'stacks.collapsed',
+    ]
+    command = sys.executable.rsplit('/', 1)[-1]
+    assert summary.child_waits[command][0] == 1
+    assert summary.child_wait >= 0.1
+    assert summary.overhead < summary.wall_time
+    assert summary.samples_count > 0
+    stacks = (output_dir / 'stacks.collapsed').read_text()
+    assert 'samples_validator.base:run_shell_command;[child process] ' in stacks
+
+
+def test_collapse_stack():
+    def inner():
+        return collapse_stack(sys._getframe())
+
+    stack = inner().split(';')
+    assert stack[-1] == f'{__name__}:inner'
+    assert stack[-2] == f'{__name__}:test_collapse_stack'
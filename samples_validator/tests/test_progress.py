@@ -0,0 +1,51 @@
+import io
+from unittest.mock import MagicMock
+
+from samples_validator.base import ApiTestResult
+from samples_validator.loader import load_code_samples
+from samples_validator.progress import LiveConsole
+
+
+def _results(temp_files_factory):
+    root_dir = temp_files_factory(['api/user/POST/curl', 'api/user/GET/curl'])
+    post, get = load_code_samples(root_dir)
+    return ApiTestResult(post, passed=True), ApiTestResult(get, passed=False)
+
+
+def test_plain_lines_are_batched(temp_files_factory):
+    passed, failed = _results(temp_files_factory)
+    stream = MagicMock()
+    console = LiveConsole(stream, tty=False, batch_size=2, flush_interval=60)
+    console.start_session(2)
+    for test_result in (passed, failed):
+        console.sample_started(test_result.sample)
+        console.sample_finished(test_result)
+    console.write('report\n')
+    console.stop()
+    writes = [call[0][0] for call in stream.write.call_args_list]
+    assert writes[0].startswith(
+        '  POST: api/user [PASSED]\n'
+        '   GET: api/user [FAILED]\n'
+    )
+    assert ''.join(writes).endswith('[FAILED]\nreport\n')
+
+
+def test_tty_status_line(temp_files_factory):
+    passed, failed = _results(temp_files_factory)
+    stream = io.StringIO()
+    console = LiveConsole(stream, tty=True)
+    console.start_session(3)
+    console.sample_started(passed.sample)
+    console.sample_finished(passed)
+    console.sample_started(failed.sample)
+    console.sample_finished(failed)
+    console.flush()
+    output = stream.getvalue()
+    assert '[PASSED]' not in output
+    assert 'shell    GET: api/user' in output
+    assert output.endswith('[2/3] in-flight 0, passed 1, failed 1, ETA 0s')
+
+    console.end_session()
+    console.write('report\n')
+    console.stop()
+    assert stream.getvalue().endswith('\r\x1b[Kreport\n')
@@ -0,0 +1,115 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+import requests
+
+from samples_validator.conf import conf
+from samples_validator.proxy import (
+    Cassette, Exchange, RecordingProxy, load_har, proxy_substitutions,
+)
+
+
+def make_exchange(method='GET', path='/api/users', body=b'{}'):
+    return Exchange(
+        method, f'http://localhost{path}', [('Authorization', 'Bearer x')],
+        b'', 200, 'OK', [('Content-Type', 'application/json')], body,
+    )
+
+
+@pytest.fixture
+def upstream():
+    calls = []
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_POST(self):
+            length = int(self.headers['Content-Length'])
+            calls.append((self.path, self.rfile.read(length)))
+            body = json.dumps({'id': len(calls)}).encode()
+            self.send_response(201)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):  # noqa: A002
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}/api', calls
+    server.shutdown()
+    server.server_close()
+
+
+def test_cassette_plays_in_order():
+    cassette = Cassette([
+        make_exchange(body=b'1'), make_exchange(body=b'2'),
+    ])
+    played = [cassette.play(('GET', '/api/users')) for _ in range(3)]
+    assert [exchange.response_body for exchange in played] == [
+        b'1', b'2', b'2',
+    ]
+    assert cassette.play(('GET', '/api/users?page=2')) is None
+    assert cassette.served == 3
+    assert cassette.missing == [('GET', '/api/users?page=2')]
+
+
+def test_har_redacts_secrets():
+    har = make_exchange().to_har()
+    assert har['request']['headers'] == [
+        {'name': 'Authorization', 'value': 'REDACTED'},
+    ]
+    assert Exchange.from_har(har).key == ('GET', '/api/users')
+
+
+def test_record_and_replay(tmp_path, upstream):
+    upstream_url, calls = upstream
+    har_path = tmp_path / 'session.har'
+
+    proxy = RecordingProxy(har_path, upstream=upstream_url)
+    proxy.start()
+    response = requests.post(f'{proxy.url}/users', json={'name': 'x'})
+    proxy.stop()
+    assert response.status_code == 201
+    assert calls == [('/api/users', b'{"name": "x"}')]
+    assert [exchange.key for exchange in load_har(har_path)] == [
+        ('POST', '/api/users'),
+    ]
+
+    proxy = RecordingProxy(har_path, replay=True, upstream=upstream_url)
+    proxy.start()
+    replayed = requests.post(f'{proxy.url}/users', json={'name': 'x'})
+    missing = requests.get(f'{proxy.url}/users')
+    proxy.stop()
+    assert replayed.json() == {'id': 1}
+    assert len(calls) == 1
+    assert missing.status_code == 404
+
+
+def test_upstream_error_is_bad_gateway(tmp_path):
+    har_path = tmp_path / 'session.har'
+    # nothing listens on the port
+    server = HTTPServer(('127.0.0.1', 0), BaseHTTPRequestHandler)
+    server.server_close()
+    proxy = RecordingProxy(
+        har_path, upstream=f'http://127.0.0.1:{server.server_port}/api',
+    )
+    proxy.start()
+    response = requests.get(f'{proxy.url}/users')
+    proxy.stop()
+    assert response.status_code == 502
+    assert 'Upstream request failed' in response.json()['error']
+    assert load_har(har_path) == []
+
+
+def test_proxy_substitutions(monkeypatch):
+    monkeypatch.setattr(conf, 'api_url', 'api.example.com')
+    monkeypatch.setattr(
+        conf, 'substitutions', {'api.example.com': 'api.example.com'},
+    )
+    substitutions = proxy_substitutions('http://127.0.0.1:1234')
+    assert substitutions['https://api.example.com'] == 'http://127.0.0.1:1234'
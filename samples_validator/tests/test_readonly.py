@@ -0,0 +1,80 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from samples_validator.loader import load_code_samples
+from samples_validator.base import HttpMethod
+from samples_validator.prerequisites.resources import Identity
+from samples_validator.readonly import (
+    Capture, capture_samples, load_capture, load_created, read_only_samples,
+)
+from samples_validator.session import TestSession, remove_created
+
+
+@pytest.fixture
+def samples(temp_files_factory):
+    root_dir = temp_files_factory([
+        'api/user/POST/curl',
+        'api/user/{id}/GET/curl',
+        'api/user/{id}/DELETE/curl',
+        'api/group/GET/curl',
+    ])
+    return load_code_samples(root_dir)
+
+
+def test_capture_and_read_only_run(
+        run_sys_cmd, mocked_parse_stdout, samples, tmp_path, reporter,
+        no_cleanup):
+    mocked_parse_stdout.return_value = ({'id': 1}, 200)
+    capture_path = tmp_path / 'capture.json'
+    capture = Capture()
+    registry = MagicMock(resources=[])
+    session = TestSession(
+        capture_samples(samples), resource_registry=registry,
+        capture=capture,
+    )
+    assert session.run() == 0
+    # DELETE isn't run, the user is left for read-only runs
+    assert run_sys_cmd.call_count == 3
+    assert not registry.cleanup.called
+    capture.save(capture_path, session.test_results, session.prerequisites)
+
+    captured = load_capture(capture_path)
+    assert captured == {
+        'shell GET api/user/{id}': {'{id}': 1},
+        'shell GET api/group': {},
+    }
+    run_sys_cmd.reset_mock()
+    selected, missing = read_only_samples(samples, captured)
+    assert [sample.name for sample in selected] == [
+        'api/user/{id}', 'api/group',
+    ]
+    assert missing == []
+    session = TestSession(selected, captured=captured)
+    assert session.run() == 0
+    assert run_sys_cmd.call_count == 2
+
+
+def test_next_capture_removes_created(
+        run_sys_cmd, mocked_parse_stdout, samples, tmp_path, reporter,
+        no_cleanup):
+    mocked_parse_stdout.return_value = ({'id': 1}, 200)
+    capture_path = tmp_path / 'capture.json'
+    removers = [
+        sample for sample in samples
+        if sample.http_method == HttpMethod.delete
+    ]
+    capture = Capture(removers)
+    session = TestSession(capture_samples(samples), capture=capture)
+    assert session.run() == 0
+    identity = Identity('http://localhost/identities/v1')
+    identity.restore('2')
+    capture.save(capture_path, session.test_results, [identity])
+
+    created, to_run, resources = load_created(capture_path, samples)
+    assert [result.json_body for result in created] == [{'id': 1}]
+    assert to_run == removers
+    assert resources == [('Identity', 'http://localhost/identities/v1', '2')]
+    run_sys_cmd.reset_mock()
+    assert remove_created(created, to_run) == []
+    assert run_sys_cmd.call_count == 1
@@ -0,0 +1,88 @@
+from unittest.mock import MagicMock
+
+import click
+import pytest
+
+from samples_validator.base import ApiTestResult, CodeSample, HttpMethod
+from samples_validator.cli import read_baseline
+from samples_validator.regression import (
+    collect_latencies, find_regressions, load_baseline, mann_whitney_u,
+    save_baseline, unjudged_endpoints,
+)
+
+
+def test_mann_whitney_detects_slowdown():
+    baseline = [0.10, 0.11, 0.12, 0.10, 0.13]
+    current = [0.30, 0.31, 0.29, 0.35, 0.32]
+    assert mann_whitney_u(baseline, current) < 0.01
+    assert mann_whitney_u(current, baseline) > 0.99
+
+
+def test_mann_whitney_identical_distributions():
+    assert mann_whitney_u([0.1, 0.1, 0.1], [0.1, 0.1, 0.1]) == 1.0
+    assert mann_whitney_u([], [0.1]) == 1.0
+
+
+@pytest.mark.parametrize('current,expected_count', [
+    ([0.30, 0.31, 0.29, 0.35, 0.32], 1),
+    # slower, but within the threshold
+    ([0.11, 0.12, 0.13, 0.12, 0.14], 0),
+    # too few observations to judge
+    ([0.9, 0.9], 0),
+])
+def test_find_regressions(current, expected_count):
+    baseline = {'GET api/user': [0.10, 0.11, 0.12, 0.10, 0.13]}
+    regressions = find_regressions(baseline, {'GET api/user': current})
+    assert len(regressions) == expected_count
+
+
+def test_baseline_roundtrip(tmp_path):
+    sample = CodeSample(
+        path=tmp_path / 'curl', name='api/user', http_method=HttpMethod.get,
+    )
+    results = [
+        ApiTestResult(sample, passed=True, duration=0.5),
+        ApiTestResult(sample, passed=True, duration=0.7),
+        ApiTestResult(sample, passed=False, duration=9.0),
+    ]
+    path = tmp_path / 'baseline.json'
+    save_baseline(path, results)
+    assert load_baseline(path) == {'shell GET api/user': [0.5, 0.7]}
+    assert collect_latencies(results) == load_baseline(path)
+
+
+def test_unjudged_endpoints():
+    baseline = {
+        'shell GET api/user': [0.1, 0.1, 0.1],
+        'python GET api/user': [0.5, 0.5, 0.5],
+    }
+    current = {
+        'shell GET api/user': [0.1, 0.1, 0.1],
+        'python GET api/user': [0.5],
+        'shell GET api/group': [0.1, 0.1, 0.1],
+    }
+    assert unjudged_endpoints(baseline, current) == [
+        'python GET api/user', 'shell GET api/group',
+    ]
+
+
+def test_load_baseline_errors(tmp_path):
+    with pytest.raises(ValueError):
+        load_baseline(tmp_path / 'missing.json')
+    path = tmp_path / 'baseline.json'
+    path.write_text('{')
+    with pytest.raises(ValueError):
+        load_baseline(path)
+
+
+def test_compare_needs_repeat(tmp_path, monkeypatch):
+    reporter = MagicMock()
+    monkeypatch.setattr('samples_validator.reporter.Reporter', reporter)
+    path = tmp_path / 'baseline.json'
+    path.write_text('{"shell GET api/user": [0.1, 0.1, 0.1]}')
+    with pytest.raises(click.UsageError, match='--repeat 3'):
+        read_baseline(path.as_posix(), 0, sharded=False)
+    assert read_baseline(path.as_posix(), 3, sharded=False)
+    # shards are balanced by the baseline anyway
+    assert read_baseline(path.as_posix(), 0, sharded=True)
+    reporter().show_not_comparable.assert_called_once_with(3)
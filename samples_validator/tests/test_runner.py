@@ -1,13 +1,18 @@
+import asyncio
+import sys
+import threading
+import time
 from unittest.mock import MagicMock
 
 import pytest
 
 from samples_validator import errors
 from samples_validator.base import SystemCmdResult, ALL_LANGUAGES, Language, \
-    HttpMethod, ApiTestResult
+    HttpMethod, ApiTestResult, Phase, run_shell_command
 from samples_validator.conf import conf
 from samples_validator.loader import load_code_samples
 from samples_validator.session import TestSession, TestExecutionResultMap
+from samples_validator.utils import collect_response_keys
 
 
 @pytest.mark.parametrize('lang', ALL_LANGUAGES)
@@ -161,11 +166,9 @@ def test_before_sample_replacements(
     sample.path.write_text(original_source_code)
 
     _post = MagicMock(status_code=200, json=lambda: {'@id': 'John'})
-    monkeypatch.setattr(
-        'samples_validator.prerequisites.base.requests', MagicMock(
-            post=MagicMock(return_value=_post)
-        )
-    )
+    monkeypatch.setitem(sys.modules, 'requests', MagicMock(
+        post=MagicMock(return_value=_post)
+    ))
     mocked_parse_stdout.return_value = ({}, 200)
 
     conf.before_sample = {
@@ -196,11 +199,9 @@ def test_before_sample_replacements_nested_path(
     samples[-1].path.write_text(original_source_code)
 
     _post = MagicMock(status_code=200, json=lambda: {'@id': 'John'})
-    monkeypatch.setattr(
-        'samples_validator.prerequisites.base.requests', MagicMock(
-            post=MagicMock(return_value=_post)
-        )
-    )
+    monkeypatch.setitem(sys.modules, 'requests', MagicMock(
+        post=MagicMock(return_value=_post)
+    ))
     mocked_parse_stdout.return_value = ({'stub': 'data'}, 200)
 
     conf.before_sample = {
@@ -215,3 +216,210 @@ def test_before_sample_replacements_nested_path(
     session.run()
     actual_code = session.runners[Language.shell].tmp_sample_path.read_text()
     assert actual_code == expected_source_code
+
+
+@pytest.mark.parametrize('method,keeps_body', [
+    (HttpMethod.post, True), (HttpMethod.get, False),
+])
+def test_compact_passed_result(method, keeps_body, python_sample):
+    python_sample.http_method = method
+    test_result = ApiTestResult(
+        python_sample, passed=True, json_body={'id': 1}, source_code='code',
+        cmd_result=SystemCmdResult(0, '{}', ''),
+    ).compact()
+    assert not hasattr(test_result, '__dict__')
+    assert python_sample.lang == Language.python
+    assert test_result.source_code is None
+    assert test_result.cmd_result is None
+    assert (test_result.json_body == {'id': 1}) is keeps_body
+
+
+def test_compact_keeps_failure_details(python_sample):
+    cmd_result = SystemCmdResult(1, '', 'error')
+    test_result = ApiTestResult(
+        python_sample, passed=False, cmd_result=cmd_result, source_code='code',
+    ).compact()
+    assert test_result.cmd_result is cmd_result
+    assert test_result.source_code == 'code'
+
+
+def test_collect_response_keys(temp_files_factory):
+    root_dir = temp_files_factory([
+        'api/user/POST/curl',
+        'api/user/{id}/GET/curl',
+        'api/user/{id}/friend/{fid}/GET/curl',
+    ])
+    samples = load_code_samples(root_dir)
+    samples[1].path.write_text('curl api/user/{id}')
+    samples[2].path.write_text('curl api/user/{id}/friend/{fid}')
+
+    response_keys = collect_response_keys(
+        samples, {'api/user': [{'@id': 'id'}]},
+    )
+    assert response_keys['api/user'] == {'id', 'fid', '@id'}
+    assert response_keys['api/user/{id}/friend'] == {'id', 'fid'}
+
+
+@pytest.mark.parametrize('lang,args', [
+    (Language.shell, ['/bin/bash', '-s']),
+    (Language.python, ['-']),
+    (Language.js, ['node', '-']),
+])
+def test_stdin_execution(lang, args, runner_sample_factory, run_sys_cmd,
+                         monkeypatch):
+    monkeypatch.setattr(conf, 'stdin_execution', True)
+    run_sys_cmd.return_value = SystemCmdResult(1, '', '')
+    runner, sample = runner_sample_factory(lang)
+    sample.path.write_text('echo {id}')
+    test_result = runner.run_sample(sample, {'{id}': '1'})
+
+    assert run_sys_cmd.call_args[0][0][-len(args):] == args
+    assert run_sys_cmd.call_args[1]['input'] == 'echo 1'
+    assert test_result.source_code == 'echo 1'
+    assert runner.tmp_sample_path is None
+
+
+def test_run_shell_command_input():
+    assert run_shell_command(['cat'], input='data').stdout == 'data'
+
+
+@pytest.fixture
+def user_session_samples(temp_files_factory):
+    root_dir = temp_files_factory([
+        'api/user/POST/curl',
+        'api/user/{id}/GET/curl',
+        'api/user/{id}/DELETE/curl',
+    ])
+    return load_code_samples(root_dir)
+
+
+def test_iter_results_cancel(
+        run_sys_cmd, mocked_parse_stdout, user_session_samples, monkeypatch):
+    mocked_parse_stdout.return_value = ({'id': 1}, 200)
+    session = TestSession(user_session_samples)
+    cleanup = MagicMock()
+    monkeypatch.setattr(session._resource_registry, 'cleanup', cleanup)
+
+    results = session.iter_results()
+    first_result = next(results)
+    assert first_result.sample == user_session_samples[0]
+    assert run_sys_cmd.call_count == 1
+    cleanup_count = cleanup.call_count
+    session.cancel()
+    assert list(results) == []
+    assert session.test_results == [first_result]
+    # resources of the interrupted language are removed
+    assert cleanup.call_count == cleanup_count + 1
+    assert session.metrics.counts[Phase.execute] == 1
+    assert Phase.parse in first_result.phases
+
+
+def test_aiter_results(
+        run_sys_cmd, mocked_parse_stdout, user_session_samples, monkeypatch):
+    mocked_parse_stdout.return_value = ({'id': 1}, 200)
+    session = TestSession(user_session_samples)
+    cleanup = MagicMock()
+    monkeypatch.setattr(session._resource_registry, 'cleanup', cleanup)
+
+    async def consume():
+        async for test_result in session.aiter_results():
+            if test_result.sample.http_method == HttpMethod.get:
+                break
+        return session.test_results
+
+    test_results = asyncio.run(consume())
+    assert [res.sample.http_method for res in test_results] == [
+        HttpMethod.post, HttpMethod.get,
+    ]
+    assert session.cancelled
+    assert run_sys_cmd.call_count == 2
+    assert cleanup.called
+
+
+def test_aiter_results_till_the_end(
+        run_sys_cmd, mocked_parse_stdout, user_session_samples, monkeypatch):
+    mocked_parse_stdout.return_value = ({'id': 1}, 200)
+    session = TestSession(user_session_samples)
+    monkeypatch.setattr(session._resource_registry, 'cleanup', MagicMock())
+
+    async def consume():
+        return [test_result async for test_result in session.aiter_results()]
+
+    assert len(asyncio.run(consume())) == 3
+    assert not session.cancelled
+
+
+def test_pipeline_waits_for_parent_response(
+        run_sys_cmd, mocked_parse_stdout, temp_files_factory, reporter,
+        no_cleanup, monkeypatch):
+    monkeypatch.setattr(conf, 'pipeline', True)
+    root_dir = temp_files_factory([
+        'api/user/POST/curl',
+        'api/user/{id}/GET/curl'
+    ])
+    samples = load_code_samples(root_dir)
+    samples[-1].path.write_text('curl website/api/user/{id}')
+
+    def parse_stdout(stdout, keys=None):
+        time.sleep(0.05)
+        return {'id': 1}, 200
+
+    mocked_parse_stdout.side_effect = parse_stdout
+    session = TestSession(samples)
+    assert session.run() == 0
+    actual_code = session.runners[Language.shell].tmp_sample_path.read_text()
+    assert actual_code == 'curl website/api/user/1'
+    assert [res.sample for res in session.test_results] == samples
+
+
+def test_pipeline_close(
+        run_sys_cmd, mocked_parse_stdout, user_session_samples, monkeypatch):
+    monkeypatch.setattr(conf, 'pipeline', True)
+    mocked_parse_stdout.return_value = ({'id': 1}, 200)
+    session = TestSession(user_session_samples)
+    cleanup = MagicMock()
+    monkeypatch.setattr(session._resource_registry, 'cleanup', cleanup)
+    threads_count = threading.active_count()
+
+    results = session.iter_results()
+    assert next(results).sample == user_session_samples[0]
+    cleanup_count = cleanup.call_count
+    results.close()
+    assert cleanup.call_count == cleanup_count + 1
+    assert threading.active_count() == threads_count
+
+
+@pytest.mark.parametrize('pipeline', [False, True])
+@pytest.mark.parametrize('fail_on_skipped,expected_failures', [
+    (False, 1),
+    (True, 3),
+])
+def test_skip_descendants_of_failed_post(
+        run_sys_cmd, mocked_parse_stdout, user_session_samples, monkeypatch,
+        reporter, pipeline, fail_on_skipped, expected_failures):
+    monkeypatch.setattr(conf, 'pipeline', pipeline)
+    monkeypatch.setattr(conf, 'fail_on_skipped', fail_on_skipped)
+    mocked_parse_stdout.return_value = ({'error': 'oops'}, 500)
+    session = TestSession(user_session_samples)
+    cleanup = MagicMock()
+    monkeypatch.setattr(session._resource_registry, 'cleanup', cleanup)
+
+    assert session.run() == expected_failures
+    assert run_sys_cmd.call_count == 1
+    post_result, get_result, delete_result = session.test_results
+    assert post_result.failed and not post_result.skipped
+    for test_result in (get_result, delete_result):
+        assert test_result.skipped
+        assert test_result.reason == errors.BlockedByFailure
+        assert test_result.blocked_by == user_session_samples[0]
+    assert cleanup.called
+
+
+def test_skip_blocked_disabled(
+        run_sys_cmd, mocked_parse_stdout, user_session_samples, monkeypatch,
+        reporter):
+    monkeypatch.setattr(conf, 'skip_blocked', False)
+    mocked_parse_stdout.return_value = ({}, 500)
+    session = TestSession(user_session_samples)
+    assert session.run() == 3
+    assert run_sys_cmd.call_count == 3
@@ -0,0 +1,85 @@
+from pathlib import Path
+
+import pytest
+
+from samples_validator.base import CodeSample, HttpMethod
+from samples_validator.loader import load_code_samples
+from samples_validator.selection import Selector, select_samples
+
+
+@pytest.fixture
+def samples(temp_files_factory):
+    root_dir = temp_files_factory([
+        'api/_parent/POST/curl',
+        'api/_parent/GET/curl',
+        'api/_parent_{id}/GET/curl',
+        'api/_parent_{id}/DELETE/curl',
+        'api/_parent_{id}_child/POST/curl',
+        'api/_parent_{id}_child_{childId}/GET/curl',
+        'api/_parent_{id}_child_{childId}/DELETE/curl',
+        'api/_other/POST/curl',
+    ])
+    return load_code_samples(root_dir)
+
+
+def names(samples):
+    return [(sample.name, sample.http_method.value) for sample in samples]
+
+
+def test_selector():
+    sample_names = ['api/parent', 'api/parent/{id}', 'api/parent/{id}/child']
+    glob = Selector('api/parent/*')
+    regex = Selector(r're:/\{id\}$')
+    for name, glob_matches, regex_matches in zip(
+            sample_names, [False, True, True], [False, True, False]):
+        sample = CodeSample(Path('/tmp/curl'), name, HttpMethod.get)
+        assert glob.matches(sample) is glob_matches
+        assert regex.matches(sample) is regex_matches
+    post_sample = CodeSample(Path('/tmp/curl'), 'api/parent', HttpMethod.post)
+    assert Selector('POST api/*').matches(post_sample)
+    assert not Selector('GET api/*').matches(post_sample)
+    with pytest.raises(ValueError):
+        Selector('re:(')
+
+
+def test_select_deep_endpoint(samples):
+    selection = select_samples(
+        samples, selectors=[Selector('GET */child/{childId}')],
+    )
+    assert names(selection.samples) == [
+        ('api/parent', 'POST'),
+        ('api/parent/{id}/child', 'POST'),
+        ('api/parent/{id}/child/{childId}', 'GET'),
+        ('api/parent/{id}/child/{childId}', 'DELETE'),
+        ('api/parent/{id}', 'DELETE'),
+    ]
+    added = {(sample.name, sample.http_method.value): reasons
+             for sample, reasons in selection.added}
+    assert added[('api/parent/{id}', 'DELETE')] == [
+        'removes what shell POST api/parent creates',
+    ]
+    assert added[('api/parent', 'POST')] == [
+        'creates the resource of shell GET api/parent/{id}/child/{childId}',
+    ]
+
+
+def test_select_by_keyword(samples):
+    selection = select_samples(samples, keyword='other')
+    assert names(selection.samples) == [('api/other', 'POST')]
+    assert selection.added == []
+    assert select_samples(samples).samples == samples
+
+
+def test_select_post_adds_its_removers(samples):
+    selection = select_samples(samples, selectors=[Selector('POST */child')])
+    assert names(selection.samples) == [
+        ('api/parent', 'POST'),
+        ('api/parent/{id}/child', 'POST'),
+        ('api/parent/{id}/child/{childId}', 'DELETE'),
+        ('api/parent/{id}', 'DELETE'),
+    ]
+    added = {(sample.name, sample.http_method.value): reasons
+             for sample, reasons in selection.added}
+    assert added[('api/parent/{id}/child/{childId}', 'DELETE')] == [
+        'removes what shell POST api/parent/{id}/child creates',
+    ]
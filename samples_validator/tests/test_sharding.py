@@ -0,0 +1,110 @@
+import pytest
+
+from samples_validator import errors
+from samples_validator.base import ApiTestResult, SystemCmdResult
+from samples_validator.conf import conf
+from samples_validator.loader import load_code_samples
+from samples_validator.sharding import (
+    Shard, load_report, merge_reports, plan_shards, save_report,
+)
+
+
+@pytest.fixture
+def samples(temp_files_factory):
+    root_dir = temp_files_factory([
+        'api/a.raml/_users/POST/curl',
+        'api/a.raml/_users_{id}/GET/curl',
+        'api/a.raml/_users_{id}/DELETE/curl',
+        'api/a.raml/_users_{id}_friends/POST/curl',
+        'api/a.raml/_users_{id}_friends_{fid}/DELETE/curl',
+        'api/a.raml/_groups/POST/curl',
+        'api/a.raml/_groups_{id}/DELETE/curl',
+        'api/a.raml/_status/GET/curl',
+        'api/a.raml/_status/GET/code.py',
+    ])
+    return load_code_samples(root_dir)
+
+
+@pytest.mark.parametrize('value', ['2', '0/2', '3/2', 'a/b'])
+def test_parse_invalid_shard(value):
+    with pytest.raises(ValueError):
+        Shard.parse(value)
+
+
+def test_shards_keep_subtrees(samples):
+    plans = [plan_shards(samples, Shard(index, 3)) for index in (1, 2, 3)]
+    shard_samples = [plan.samples for plan in plans]
+
+    assert sorted(len(part) for part in shard_samples) == [2, 2, 5]
+    assert sorted(map(id, sum(shard_samples, []))) == sorted(map(id, samples))
+    users = next(part for part in shard_samples if len(part) == 5)
+    # the order of the session is kept inside of the shard
+    assert users == [sample for sample in samples
+                     if sample.name.startswith('api/users')]
+    assert len({plan.digest for plan in plans}) == 1
+
+
+def test_shards_balanced_by_baseline(samples):
+    latencies = {
+        'shell POST api/users': [1.0, 3.0, 2.0],
+        'shell GET api/users/{id}': [1.0],
+        'shell POST api/users/{id}/friends': [1.0],
+        'shell GET api/status': [1.0],
+        'shell POST api/groups': [20.0],
+        'shell DELETE api/groups/{id}': [20.0],
+    }
+    plan = plan_shards(samples, Shard(1, 2), latencies)
+
+    assert plan.historical
+    # groups alone outweigh the rest, samples without history are typical
+    assert [unit.name for unit in plan.units[0]] == ['api/groups']
+    assert plan.cost_of(0) == 40
+    # users with two typical DELETEs, and status of both languages: the
+    # python one has no history either
+    assert plan.cost_of(1) == 2 + 1 + 1 + 1.5 * 2 + 1 + 1.5
+
+
+def test_units_share_no_resources(temp_files_factory, monkeypatch):
+    root_dir = temp_files_factory([
+        'api/product/POST/curl',
+        'api/product/POST/code.py',
+        'api/product/DELETE/curl',
+        'api/product/DELETE/code.py',
+        'api/message/POST/curl',
+        'api/calendar/POST/curl',
+    ])
+    monkeypatch.setattr(conf, 'before_sample', {
+        'api/message': [{'resource': 'Identity', 'method': 'POST'}],
+        'api/calendar': [{'resource': 'Identity', 'method': 'POST'}],
+    })
+    samples = load_code_samples(root_dir)
+    plans = [plan_shards(samples, Shard(index, 2)) for index in (1, 2)]
+    names = [[unit.name for unit in plan.units[index]]
+             for index, plan in enumerate(plans)]
+    # both languages of a product go to the same node, and so do the
+    # samples creating Identity prerequisites
+    assert sorted(names) == [['api/calendar, api/message'], ['api/product']]
+
+
+def test_merge_reports(samples, tmp_path):
+    report_paths = []
+    for index in (1, 2):
+        plan = plan_shards(samples, Shard(index, 2))
+        results = [
+            ApiTestResult(
+                sample, passed=False, reason=errors.NonZeroExitCode,
+                cmd_result=SystemCmdResult(1, '', 'error'),
+            )
+            for sample in plan.samples
+        ]
+        report_paths.append(tmp_path / f'{index}.json')
+        save_report(report_paths[-1], results, plan)
+
+    merged = merge_reports([load_report(path) for path in report_paths])
+    assert sorted(map(str, (result.sample for result in merged))) == sorted(
+        map(str, samples),
+    )
+    assert merged[0].reason is errors.NonZeroExitCode
+    assert merged[0].cmd_result.stderr == 'error'
+    with pytest.raises(ValueError, match='missing: \\[2\\]'):
+        merge_reports([load_report(report_paths[0])])
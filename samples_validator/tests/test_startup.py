@@ -0,0 +1,33 @@
+import subprocess
+import sys
+from typing import Dict
+
+# cumulative import time of the CLI module, click included, microseconds
+CLI_IMPORT_BUDGET_US = 300000
+HEAVY_MODULES = (
+    'virtualenv', 'requests', 'edn_format', 'pydantic', 'loguru', 'yaml',
+)
+
+
+def measure_import_time(*args: str) -> Dict[str, int]:
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', *args],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    import_times = {}
+    for line in proc.stderr.decode().splitlines():
+        if not line.startswith('import time:') or '[us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        import_times[name.strip()] = int(cumulative)
+    return import_times
+
+
+def test_cli_help_skips_heavy_imports():
+    import_times = measure_import_time('-m', 'samples_validator.cli', '--help')
+    assert not set(HEAVY_MODULES) & set(import_times)
+
+
+def test_cli_import_time_budget():
+    import_times = measure_import_time('-c', 'import samples_validator.cli')
+    assert import_times['samples_validator.cli'] < CLI_IMPORT_BUDGET_US
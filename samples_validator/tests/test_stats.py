@@ -0,0 +1,99 @@
+import pytest
+
+from samples_validator import errors
+from samples_validator.base import ApiTestResult
+from samples_validator.conf import conf
+from samples_validator.loader import load_code_samples
+from samples_validator.session import TestSession
+from samples_validator.stats import LatencyStats, percentile
+
+
+@pytest.mark.parametrize('values,percent,expected', [
+    ([], 99, 0.0),
+    ([1.0], 99, 1.0),
+    ([1.0, 2.0, 3.0, 4.0, 5.0], 50, 3.0),
+    ([5.0, 1.0, 3.0, 2.0, 4.0], 100, 5.0),
+    ([1.0, 2.0], 50, 1.5),
+])
+def test_percentile(values, percent, expected):
+    assert percentile(values, percent) == expected
+
+
+@pytest.fixture
+def curl_sample(temp_files_factory):
+    root_dir = temp_files_factory(['api/user/GET/curl'])
+    return load_code_samples(root_dir)[0]
+
+
+def test_timeout_falls_back_to_global_value(curl_sample, monkeypatch):
+    monkeypatch.setattr(conf, 'sample_timeout', 7)
+    stats = LatencyStats()
+    stats.record(ApiTestResult(curl_sample, passed=True, duration=0.1))
+    assert stats.timeout_for(curl_sample) == 7
+
+
+def test_adaptive_timeout_is_clamped(curl_sample, monkeypatch):
+    monkeypatch.setattr(conf, 'adaptive_timeout_min_samples', 2)
+    monkeypatch.setattr(conf, 'adaptive_timeout_factor', 2.0)
+    monkeypatch.setattr(conf, 'adaptive_timeout_min', 1.0)
+    monkeypatch.setattr(conf, 'adaptive_timeout_max', 10.0)
+    stats = LatencyStats()
+    for duration in (1.0, 2.0):
+        stats.record(
+            ApiTestResult(curl_sample, passed=True, duration=duration),
+        )
+    assert stats.timeout_for(curl_sample) == pytest.approx(3.98)
+
+    stats.record(ApiTestResult(curl_sample, passed=True, duration=30.0))
+    assert stats.timeout_for(curl_sample) == 10.0
+
+
+def test_adaptive_timeout_shortens_fast_samples(curl_sample, monkeypatch):
+    monkeypatch.setattr(conf, 'sample_timeout', 10)
+    monkeypatch.setattr(conf, 'adaptive_timeout_min_samples', 2)
+    stats = LatencyStats()
+    for duration in (0.3, 0.3):
+        stats.record(
+            ApiTestResult(curl_sample, passed=True, duration=duration),
+        )
+    # fast failures don't make the timeout shorter
+    stats.record(ApiTestResult(
+        curl_sample, passed=False, reason=errors.NonZeroExitCode,
+        duration=0.01,
+    ))
+    assert stats.durations(curl_sample) == [0.3, 0.3]
+    assert stats.timeout_for(curl_sample) == 1.0
+
+
+def test_explicit_timeout_override(curl_sample, monkeypatch):
+    monkeypatch.setattr(conf, 'sample_timeouts', {'api/user': {'GET': 42}})
+    assert LatencyStats().timeout_for(curl_sample) == 42
+
+
+def test_stats_are_persisted(curl_sample, tmp_path):
+    path = tmp_path / 'stats.json'
+    stats = LatencyStats(path)
+    stats.record(ApiTestResult(curl_sample, passed=True, duration=0.5))
+    stats.save()
+    assert LatencyStats.load(path).durations(curl_sample) == [0.5]
+    # the temporary file is renamed over the stats
+    assert list(tmp_path.glob('*stats.json*')) == [path]
+
+
+def test_session_applies_adaptive_timeout(
+        run_sys_cmd, mocked_parse_stdout, temp_files_factory, reporter,
+        latency_stats_file, monkeypatch):
+    root_dir = temp_files_factory(['api/user/GET/curl'])
+    samples = load_code_samples(root_dir)
+    monkeypatch.setattr(conf, 'adaptive_timeout_min_samples', 1)
+    monkeypatch.setattr(conf, 'adaptive_timeout_min', 2.5)
+    stats = LatencyStats(latency_stats_file)
+    stats.record(ApiTestResult(samples[0], passed=True, duration=0.1))
+    stats.save()
+
+    run_sys_cmd.side_effect = errors.ExecutionTimeout
+    session = TestSession(samples)
+    session.run()
+    assert run_sys_cmd.call_args[1]['timeout'] == 2.5
+    durations = LatencyStats.load(latency_stats_file).durations(samples[0])
+    assert durations == [0.1, 2.5]
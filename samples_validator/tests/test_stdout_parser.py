@@ -47,6 +47,22 @@ def test_curl_200(run_sys_cmd, runner_sample_factory):
     assert test_result.json_body == {}
 
 
+def test_curl_200_response_keys(run_sys_cmd, runner_sample_factory):
+    runner, sample = runner_sample_factory(Language.shell)
+    stdout = textwrap.dedent("""
+    HTTP/1.1 201 Created
+    Content-Type: application/json
+
+    {"@id": "1", "items": [{"name": "x"}]}
+    """)
+    run_sys_cmd.return_value = SystemCmdResult(
+        exit_code=0, stdout=stdout, stderr=''
+    )
+    test_result = runner.run_sample(sample, response_keys={'@id'})
+    assert test_result.passed
+    assert test_result.json_body == {'@id': '1'}
+
+
 def test_curl_200_rn_rn(run_sys_cmd, runner_sample_factory):
     runner, sample = runner_sample_factory(Language.shell)
     stdout = textwrap.dedent("""
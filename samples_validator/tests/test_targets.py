@@ -0,0 +1,61 @@
+from unittest.mock import MagicMock
+
+from samples_validator.base import Language
+from samples_validator.conf import conf
+from samples_validator.loader import load_code_samples
+from samples_validator.schema import Target
+from samples_validator.targets import TargetSession, target_substitutions
+
+
+def test_target_substitutions(monkeypatch):
+    monkeypatch.setattr(conf, 'api_url', 'api-sandbox.oftrust.net')
+    monkeypatch.setattr(conf, 'access_token', 'token')
+    monkeypatch.setattr(conf, 'substitutions', {
+        'https://api-sandbox.oftrust.net': 'api-sandbox.oftrust.net',
+        'api.oftrust.net': 'api-sandbox.oftrust.net',
+        '<ACCESS_TOKEN>': 'token',
+        '{version}': 'v1',
+    })
+    target = Target(
+        api_url='http://localhost:8888',
+        access_token='local-token',
+        substitutions={'{version}': 'v2'},
+    )
+    assert target_substitutions(target) == {
+        'https://api-sandbox.oftrust.net': 'http://localhost:8888',
+        'api.oftrust.net': 'localhost:8888',
+        '<ACCESS_TOKEN>': 'local-token',
+        '{version}': 'v2',
+    }
+
+
+def test_target_session(
+        run_sys_cmd, mocked_parse_stdout, temp_files_factory, monkeypatch):
+    monkeypatch.setattr('samples_validator.targets.Reporter', MagicMock())
+    monkeypatch.setattr(conf, 'api_url', 'api-sandbox.oftrust.net')
+    monkeypatch.setattr(conf, 'substitutions', {
+        'api-sandbox.oftrust.net': 'api-sandbox.oftrust.net',
+    })
+    root_dir = temp_files_factory([
+        'api/user/POST/curl',
+        'api/user/{id}/GET/curl',
+    ])
+    samples = load_code_samples(root_dir)
+    samples[-1].path.write_text('curl api-sandbox.oftrust.net/{id}')
+    monkeypatch.setattr(
+        'samples_validator.runner.CurlRunner._cleanup', MagicMock(),
+    )
+    mocked_parse_stdout.return_value = ({'id': 1}, 200)
+
+    session = TargetSession(samples, {
+        'sandbox': Target(api_url='api-sandbox.oftrust.net', access_token=''),
+        'local': Target(api_url='http://localhost:8888', access_token=''),
+    })
+    local_runner = session.sessions['local'].runners[Language.shell]
+    assert local_runner.substitutions == {
+        'api-sandbox.oftrust.net': 'localhost:8888',
+    }
+    assert session.run() == 0
+    assert sorted(session.results) == ['local', 'sandbox']
+    assert len(session.test_results) == 4
+    assert local_runner.tmp_sample_path.read_text() == 'curl localhost:8888/1'
@@ -0,0 +1,78 @@
+import pytest
+
+from samples_validator.base import Language
+from samples_validator.conf import conf
+from samples_validator.throttle import (
+    THROTTLE, HostLimiter, TokenBucket, host_of,
+)
+
+
+@pytest.mark.parametrize('url,expected', [
+    ('https://api.example.com/v1', 'api.example.com'),
+    ('http://localhost:8888', 'localhost:8888'),
+    ('api.example.com', 'api.example.com'),
+])
+def test_host_of(url, expected):
+    assert host_of(url) == expected
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=100, burst=2)
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == 0
+    assert bucket.acquire() > 0
+
+
+def test_aimd_limit():
+    limiter = HostLimiter(rate=1000, burst=10, max_concurrency=4)
+    for _ in range(10):
+        limiter.acquire()
+        limiter.release(0.1, overloaded=False, endpoint='GET a')
+    assert limiter.limit == 4
+
+    limiter.acquire()
+    limiter.release(0.1, overloaded=True, endpoint='GET a')
+    assert limiter.limit == 2
+    # much slower than usual for the endpoint
+    limiter._decreased_at = 0
+    limiter.acquire()
+    limiter.release(1.0, overloaded=False, endpoint='GET a')
+    assert limiter.limit == pytest.approx(1.8)
+    assert limiter.metrics.throttled == 1
+    assert limiter.metrics.decreases == 2
+    assert limiter.metrics.max_limit == 4
+
+
+def test_call_retries_when_overloaded():
+    limiter = HostLimiter(rate=1000, burst=10, max_concurrency=4)
+    responses = iter([429, 503, 200])
+    assert limiter.call(
+        lambda: next(responses), lambda code: code, retries=3, backoff=0,
+    ) == 200
+    assert limiter.metrics.retries == 2
+
+    responses = iter([429, 429, 200])
+    assert limiter.call(
+        lambda: next(responses), lambda code: code, retries=1, backoff=0,
+    ) == 429
+
+
+def test_runner_retries_throttled_sample(
+        runner_sample_factory, run_sys_cmd, mocked_parse_stdout, monkeypatch):
+    monkeypatch.setattr(conf, 'throttle', True)
+    monkeypatch.setattr(conf, 'throttle_backoff', 0)
+    THROTTLE.reset()
+    mocked_parse_stdout.side_effect = [
+        (None, 429),  # status of the first run
+        ({'id': 1}, 201),  # status of the second run
+        ({'id': 1}, 201),  # result
+    ]
+    runner, sample = runner_sample_factory(Language.shell)
+    test_result = runner.run_sample(sample)
+
+    assert test_result.passed
+    assert run_sys_cmd.call_count == 2
+    metrics = THROTTLE.metrics()[host_of(conf.api_url)]
+    assert metrics.retries == 1
+    assert metrics.throttled == 1
+    THROTTLE.reset()
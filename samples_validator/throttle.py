@@ -0,0 +1,254 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, TypeVar
+from urllib.parse import urlsplit
+
+from samples_validator.conf import conf
+
+R = TypeVar('R')
+
+# the API is overloaded, the request wasn't processed and can be repeated
+RETRY_STATUS_CODES = {429, 503}
+
+
+def host_of(url: str) -> str:
+    # the configured API url may go without scheme
+    return urlsplit(url if '://' in url else f'//{url}').netloc
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average and `burst` at once"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Take a token, waiting for it if needed
+
+        :return: Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst,
+                    self._tokens + (now - self._updated_at) * self.rate,
+                )
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+@dataclass
+class ThrottleMetrics:
+    requests: int = 0
+    # responses with one of RETRY_STATUS_CODES
+    throttled: int = 0
+    retries: int = 0
+    increases: int = 0
+    decreases: int = 0
+    # time spent waiting for a concurrency slot or a token
+    wait_time: float = 0.0
+    limit: float = 0.0
+    min_limit: float = 0.0
+    max_limit: float = 0.0
+
+
+class HostLimiter:
+    """
+    Limits requests to a single API host. The number of simultaneous requests
+    is adjusted by AIMD: every successful request raises the limit by
+    1/limit, i.e. by one per "round" of requests, and the limit is halved
+    when the host responds with 429/503. A request much slower than usual
+    for its endpoint is a sign of queueing on the host, the limit is
+    decreased slightly then. The rate of requests is limited by a token
+    bucket on top of it
+    """
+
+    # smoothing of the typical latency, small values react slowly
+    latency_smoothing = 0.05
+    # decrease when the host is overloaded and when it gets slow
+    overload_backoff = 0.5
+    latency_backoff = 0.9
+
+    def __init__(
+            self,
+            rate: float,
+            burst: int,
+            max_concurrency: int,
+            initial_concurrency: float = 2,
+            latency_tolerance: float = 2.0):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrency = max(1, max_concurrency)
+        self.latency_tolerance = latency_tolerance
+        self.limit = min(float(initial_concurrency), self.max_concurrency)
+        self.metrics = ThrottleMetrics(
+            limit=self.limit, min_limit=self.limit, max_limit=self.limit,
+        )
+        self._in_flight = 0
+        # smoothed latency per endpoint
+        self._typical_latency: Dict[str, float] = {}
+        self._decreased_at = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        start_time = time.monotonic()
+        with self._condition:
+            while self._in_flight >= int(self.limit):
+                self._condition.wait()
+            self._in_flight += 1
+        self.bucket.acquire()
+        with self._condition:
+            self.metrics.requests += 1
+            self.metrics.wait_time += time.monotonic() - start_time
+
+    def release(
+            self,
+            latency: Optional[float],
+            overloaded: bool,
+            endpoint: str = ''):
+        """
+        :param latency: Duration of the request, None if it timed out
+        :param overloaded: The host asked to slow down
+        :param endpoint: Requests of the same endpoint have similar latency
+        """
+        with self._condition:
+            self._in_flight -= 1
+            if overloaded:
+                self.metrics.throttled += 1
+                self._decrease(self.overload_backoff, latency)
+            elif latency is None or self._is_slow(endpoint, latency):
+                self._decrease(self.latency_backoff, latency)
+            elif self.limit < self.max_concurrency:
+                self.limit = min(
+                    self.max_concurrency, self.limit + 1 / self.limit,
+                )
+                self.metrics.increases += 1
+            if latency is not None:
+                self._update_latency(endpoint, latency)
+            self._update_metrics()
+            self._condition.notify_all()
+
+    def call(
+            self,
+            request: Callable[[], R],
+            status_of: Callable[[R], Optional[int]],
+            endpoint: str = '',
+            retries: int = 0,
+            backoff: float = 1.0) -> R:
+        """
+        Make the request within the limits. It's repeated up to `retries`
+        times, with exponential backoff, while the host is overloaded
+
+        :param status_of: HTTP status code of the request's result
+        """
+        attempt = 0
+        while True:
+            self.acquire()
+            start_time = time.monotonic()
+            try:
+                result = request()
+            except BaseException:
+                self.release(None, False, endpoint)
+                raise
+            overloaded = status_of(result) in RETRY_STATUS_CODES
+            self.release(time.monotonic() - start_time, overloaded, endpoint)
+            if not overloaded or attempt >= retries:
+                return result
+            with self._condition:
+                self.metrics.retries += 1
+            time.sleep(backoff * 2 ** attempt)
+            attempt += 1
+
+    def _is_slow(self, endpoint: str, latency: float) -> bool:
+        typical = self._typical_latency.get(endpoint)
+        if typical is None:
+            return False
+        return latency > typical * self.latency_tolerance
+
+    def _decrease(self, factor: float, latency: Optional[float]):
+        # requests running together report the same congestion, react once
+        now = time.monotonic()
+        if now - self._decreased_at < (latency or 0):
+            return
+        self._decreased_at = now
+        self.limit = max(1.0, self.limit * factor)
+        self.metrics.decreases += 1
+
+    def _update_latency(self, endpoint: str, latency: float):
+        typical = self._typical_latency.get(endpoint, latency)
+        self._typical_latency[endpoint] = (
+            typical + (latency - typical) * self.latency_smoothing
+        )
+
+    def _update_metrics(self):
+        self.metrics.limit = self.limit
+        self.metrics.min_limit = min(self.metrics.min_limit, self.limit)
+        self.metrics.max_limit = max(self.metrics.max_limit, self.limit)
+
+
+class Throttle:
+    """
+    Limiters of all API hosts, shared by the runners and the prerequisites.
+    Requests go unlimited unless `throttle` is enabled in the configuration
+    """
+
+    def __init__(self):
+        self._limiters: Dict[str, HostLimiter] = {}
+        self._lock = threading.Lock()
+
+    def limiter_for(self, url: str) -> HostLimiter:
+        host = host_of(url)
+        with self._lock:
+            limiter = self._limiters.get(host)
+            if limiter is None:
+                limiter = self._limiters[host] = HostLimiter(
+                    rate=conf.throttle_rate,
+                    burst=conf.throttle_burst,
+                    max_concurrency=conf.throttle_max_concurrency,
+                )
+            return limiter
+
+    def call(
+            self,
+            url: str,
+            request: Callable[[], R],
+            status_of: Callable[[R], Optional[int]],
+            endpoint: str = '') -> R:
+        """
+        Make the request within the limits of the url's host
+
+        :param status_of: HTTP status code of the request's result
+        :param endpoint: Requests of the same endpoint have similar latency
+        """
+        if not conf.throttle:
+            return request()
+        return self.limiter_for(url).call(
+            request, status_of, endpoint,
+            retries=conf.throttle_retries, backoff=conf.throttle_backoff,
+        )
+
+    def metrics(self) -> Dict[str, ThrottleMetrics]:
+        with self._lock:
+            return {
+                host: limiter.metrics
+                for host, limiter in self._limiters.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._limiters = {}
+
+
+THROTTLE = Throttle()
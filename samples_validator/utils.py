@@ -1,10 +1,14 @@
 import ast
+import re
 from collections import defaultdict
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Set
 
 from samples_validator.base import ApiTestResult, CodeSample, HttpMethod
 
+PLACEHOLDER_RE = re.compile(r'{([^{}]+)}')
+
 
 class TestExecutionResultMap:
     """
@@ -20,7 +24,10 @@ class TestExecutionResultMap:
             replace_keys: Optional[List[dict]] = None,
             extra: Optional[dict] = None):
         replace_keys = replace_keys or []
-        parent_body = test_result.json_body or {}
+        if test_result.json_body is None:
+            # keep prerequisite substitutions even for an empty response
+            test_result.json_body = {}
+        parent_body = test_result.json_body
         for replacement in replace_keys:
             for key_from, key_to in replacement.items():
                 if key_from in parent_body:
@@ -135,15 +142,55 @@ class CodeSamplesTree:
         self._tree = {}
 
     def put(self, sample: CodeSample):
-        self._put_code_sample(
-            self._tree, f'{sample.lang.value}{sample.name}', sample,
-        )
+        self._put_code_sample(self._tree, self._path_of(sample), sample)
 
     def list_sorted_samples(self) -> List[CodeSample]:
         sorted_samples: List[CodeSample] = []
         self._sort_samples(self._tree, sorted_samples)
         return sorted_samples
 
+    def get_producers(self, sample: CodeSample) -> List[CodeSample]:
+        """
+        POST samples up the path of the sample, from the root. Their
+        responses are the substitutions of the sample, see
+        `TestExecutionResultMap.get_parent_body`
+        """
+        producers = []
+        current_dict = self._tree
+        for path_part in self._path_of(sample).split('/')[:-1]:
+            current_dict = current_dict.get(path_part)
+            if not current_dict:
+                break
+            post_sample = current_dict.get('methods', {}).get(
+                HttpMethod.post,
+            )
+            if post_sample is not None:
+                producers.append(post_sample)
+        return producers
+
+    def get_removers(self, sample: CodeSample) -> List[CodeSample]:
+        """
+        DELETE samples of the resource the POST sample creates: of its own
+        path, or of a placeholder right under it, e.g. `users/{id}`
+        """
+        current_dict: Optional[dict] = self._tree
+        for path_part in self._path_of(sample).split('/'):
+            current_dict = (current_dict or {}).get(path_part)
+        if not current_dict:
+            return []
+        endpoints = [current_dict] + [
+            value for name, value in current_dict.items()
+            if name.startswith('{')
+        ]
+        return [
+            endpoint['methods'][HttpMethod.delete] for endpoint in endpoints
+            if HttpMethod.delete in endpoint.get('methods', {})
+        ]
+
+    @staticmethod
+    def _path_of(sample: CodeSample) -> str:
+        return f'{sample.lang.value}{sample.name}'
+
     def _put_code_sample(self,
                          current_dict: dict,
                          path: str,
@@ -208,6 +255,47 @@ class CodeSamplesTree:
             result_list.append(methods[HttpMethod.delete])
 
 
+def collect_response_keys(
+        samples: List[CodeSample],
+        replacements: Dict[str, List[dict]]) -> Dict[str, Set[str]]:
+    """
+    Find out which fields of POST responses are used by the other samples,
+    so the rest of a response doesn't need to be kept.
+    A response of POST sample is used for substitution of placeholders like
+    `{id}` in all the samples under its path. Fields which are renamed by
+    `resp_attr_replacements` are kept as well
+
+    :param samples: Samples of the session
+    :param replacements: Conversion rules for keys of responses per sample
+    :return: Mapping of sample name to the response fields its descendants
+        may reference
+    """
+    response_keys: Dict[str, Set[str]] = defaultdict(set)
+    for sample in samples:
+        placeholders = set(PLACEHOLDER_RE.findall(sample.path.read_text()))
+        path_parts = sample.name.split('/')
+        for depth in range(1, len(path_parts)):
+            response_keys['/'.join(path_parts[:depth])].update(placeholders)
+    for name, rules in replacements.items():
+        for rule in rules:
+            response_keys[name].update(rule)
+    return dict(response_keys)
+
+
+def load_spec_examples(path: Path) -> dict:
+    """
+    Cached `parse_edn_spec_file`, the spec is parsed once per session no
+    matter how many times (or against how many targets) a sample is run.
+    Modified file is parsed again
+    """
+    return _parse_edn_spec_file_cached(path, path.stat().st_mtime_ns)
+
+
+@lru_cache(maxsize=4096)
+def _parse_edn_spec_file_cached(path: Path, mtime_ns: int) -> dict:
+    return parse_edn_spec_file(path)
+
+
 def parse_edn_spec_file(path: Path) -> dict:
     """Find a possible API param examples in a debug .edn file.
     If the keyword has a 'type', 'example', and 'description' property